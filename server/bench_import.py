@@ -0,0 +1,60 @@
+"""
+Cold-start import benchmark for the server modules.
+
+Each module is imported in a fresh interpreter several times and the median
+import time is reported. Run from the server directory:
+
+    python bench_import.py [--runs 5] [--max-ms 500]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+MODULES = ["workout_llm", "cooking_LLM", "tracking_llm"]
+
+SNIPPET = (
+    "import time; t = time.perf_counter(); import {module}; "
+    "print((time.perf_counter() - t) * 1000)"
+)
+
+
+def time_import(module: str, runs: int) -> list:
+    here = os.path.dirname(os.path.abspath(__file__))
+    # No keys in the environment: importing must not need them
+    env = {k: v for k, v in os.environ.items() if "API_KEY" not in k}
+    samples = []
+    for _ in range(runs):
+        out = subprocess.run(
+            [sys.executable, "-c", SNIPPET.format(module=module)],
+            cwd=here,
+            env=env,
+            capture_output=True,
+            text=True,
+            check=True
+        )
+        samples.append(float(out.stdout.strip().splitlines()[-1]))
+    return samples
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--max-ms", type=float, default=None,
+                        help="Exit non-zero if any module's median exceeds this")
+    args = parser.parse_args()
+
+    failed = False
+    for module in MODULES:
+        samples = time_import(module, args.runs)
+        median = statistics.median(samples)
+        print(f"{module:<14} median {median:8.1f} ms   min {min(samples):8.1f} ms   max {max(samples):8.1f} ms")
+        if args.max_ms is not None and median > args.max_ms:
+            failed = True
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,19 +3,17 @@
 import re
 import json
 import os
-from typing import Dict, Any
+import threading
+from concurrent.futures import CancelledError
+from typing import Callable, Dict, Any, Optional
 
-from dotenv import load_dotenv
+from upstream import upstream_calls, make_flight_key, acquire_rate_limit, run_bounded
+from streaming_json import consume_json_stream, StreamAborted
+from llm_backend import get_llm_backend
 
-# Load the .env file
-load_dotenv()
-
-import google.generativeai as genai
-api_key = os.getenv("GEMINI_API_KEY2")
-if api_key is None:
-    raise ValueError("GEMINI_API_KEY not found in .env file")
-# Configure Gemini
-genai.configure(api_key=api_key)
+# LLM backend key (Gemini, or the offline stub with LLM_BACKEND=stub).
+# The backend and .env are loaded on first use, not at import.
+GEMINI_API_KEY_ENV = "GEMINI_API_KEY2"
 
 REQUIRED_FIELDS = [
     "date",
@@ -31,6 +29,23 @@ REQUIRED_FIELDS = [
     "calories_burnt"
 ]
 
+# Stream LLM responses and abort malformed ones early
+STREAM_RESPONSES = True
+
+# Meals of a day are generated concurrently; each gets its own timeout,
+# measured from when it starts running
+MEAL_MAX_WORKERS = 4
+MEAL_TIMEOUT_SECONDS = 90
+
+SEMANTIC_REQUIRED_KEYS = [
+    "workout_focus",
+    "intensity_level",
+    "recovery_priority",
+    "carb_requirement"
+]
+
+RECIPE_REQUIRED_KEYS = ["recipe_name", "ingredients", "steps"]
+
 
 
 NUTRITION_DB = {
@@ -160,9 +175,45 @@ Calories burned estimate: {normalized["workout"]["calories_burned"]}
 #             f"Extracted JSON:\n{json_text}"
 #         ) from e
 def call_semantic_llm(prompt: str, max_retries=3) -> Dict[str, Any]:
-    model = genai.GenerativeModel("gemini-2.5-flash")
+    # Classification is deterministic (temperature 0), so identical prompts
+    # in flight at the same time share one Gemini call.
+    return upstream_calls.do(
+        make_flight_key("gemini:semantic", prompt, max_retries),
+        _call_semantic_llm,
+        prompt,
+        max_retries
+    )
+
+def _call_semantic_llm(prompt: str, max_retries=3) -> Dict[str, Any]:
+    model = get_llm_backend(GEMINI_API_KEY_ENV).model("gemini-2.5-flash")
 
     for attempt in range(1, max_retries + 1):
+        acquire_rate_limit("gemini")
+
+        if STREAM_RESPONSES:
+            try:
+                _, semantics = consume_json_stream(
+                    model.generate_content(
+                        prompt,
+                        generation_config={
+                            "temperature": 0.0,
+                            "top_p": 1.0,
+                            "top_k": 1
+                        },
+                        stream=True
+                    ),
+                    SEMANTIC_REQUIRED_KEYS
+                )
+                return semantics
+            except StreamAborted as e:
+                if attempt == max_retries:
+                    raise RuntimeError(
+                        f"Failed after {max_retries} attempts.\n"
+                        f"Last error: {e.reason}\n"
+                        f"Last raw response:\n{e.partial_text}"
+                    )
+                continue
+
         response = model.generate_content(
             prompt,
             generation_config={
@@ -310,9 +361,33 @@ OUTPUT JSON SCHEMA:
 }}
 """
 
-def call_cooking_llm(prompt: str) -> dict:
-    model = genai.GenerativeModel("gemini-2.5-flash")
-
+def call_cooking_llm(prompt: str, max_retries=3) -> dict:
+    model = get_llm_backend(GEMINI_API_KEY_ENV).model("gemini-2.5-flash")
+
+    if STREAM_RESPONSES:
+        for attempt in range(1, max_retries + 1):
+            acquire_rate_limit("gemini")
+            try:
+                _, recipe = consume_json_stream(
+                    model.generate_content(
+                        prompt,
+                        generation_config={
+                            "temperature": 0.6,  # allow creativity now
+                            "top_p": 0.9
+                        },
+                        stream=True
+                    ),
+                    RECIPE_REQUIRED_KEYS
+                )
+                return recipe
+            except StreamAborted as e:
+                if attempt == max_retries:
+                    raise RuntimeError(
+                        f"Recipe generation failed after {max_retries} attempts: {e.reason}\n"
+                        f"{e.partial_text}"
+                    )
+
+    acquire_rate_limit("gemini")
     response = model.generate_content(
         prompt,
         generation_config={
@@ -359,9 +434,9 @@ def validate_recipe(actual, target, tolerance=0.10):
         and actual["protein"] >= target["protein_g"] * 0.9
     )
 
-import requests
-
 def search_open_food_facts(food_name: str):
+    import requests
+
     url = "https://world.openfoodfacts.org/cgi/search.pl"
     params = {
         "search_terms": food_name,
@@ -371,6 +446,7 @@ def search_open_food_facts(food_name: str):
         "page_size": 1
     }
 
+    acquire_rate_limit("openfoodfacts")
     response = requests.get(url, params=params, timeout=10)
     response.raise_for_status()
 
@@ -408,50 +484,79 @@ from pathlib import Path
 
 NUTRITION_DB_PATH = Path("nutrition_db.json")
 
+# Serializes read-modify-write of NUTRITION_DB_PATH across threads
+_nutrition_db_write_lock = threading.Lock()
+
 def load_nutrition_db():
     if NUTRITION_DB_PATH.exists():
         return json.loads(NUTRITION_DB_PATH.read_text())
     return {}
 
 def save_nutrition_db(db):
-    NUTRITION_DB_PATH.write_text(json.dumps(db, indent=2))
+    # Write-then-rename so the nutrition store never reads a partial file
+    tmp_path = NUTRITION_DB_PATH.with_suffix(".json.tmp")
+    tmp_path.write_text(json.dumps(db, indent=2))
+    os.replace(tmp_path, NUTRITION_DB_PATH)
 
 def get_food_macros(food_name: str):
-    db = load_nutrition_db()
+    from nutrition_engine import get_nutrition_store
+    from ingredient_resolver import resolver_for
 
     key = food_name.lower().strip()
+    store = get_nutrition_store(str(NUTRITION_DB_PATH), per_100g=True)
+
+    # Served from the shared in-memory store (no file I/O per lookup)
+    macros = store.per_100g(key)
+    if macros is not None:
+        return macros
+
+    # Spelling variants of known foods don't need a network lookup
+    resolved = resolver_for(store.matrix()).resolve(key)
+    if resolved is not None:
+        return store.per_100g(resolved)
+
+    # Concurrent lookups of the same missing food share one Open Food Facts
+    # request and one write to the nutrition DB.
+    return upstream_calls.do(
+        make_flight_key("openfoodfacts", key),
+        fetch_and_save_food_macros,
+        food_name
+    )
+
+def fetch_and_save_food_macros(food_name: str):
+    from nutrition_engine import get_nutrition_store
 
-    if key in db:
-        return db[key]["per_100g"]
+    key = food_name.lower().strip()
 
     product = search_open_food_facts(food_name)
     macros = extract_macros_from_off(product)
 
-    db[key] = {
-        "source": "Open Food Facts",
-        "product_name": product.get("product_name"),
-        "per_100g": macros
-    }
+    with _nutrition_db_write_lock:
+        db = load_nutrition_db()
+        db[key] = {
+            "source": "Open Food Facts",
+            "product_name": product.get("product_name"),
+            "per_100g": macros
+        }
 
-    save_nutrition_db(db)
+        save_nutrition_db(db)
+    get_nutrition_store(str(NUTRITION_DB_PATH), per_100g=True).invalidate()
     return macros
 
 
 def compute_recipe_macros(recipe: dict):
-    total = {"calories": 0, "protein": 0, "carbs": 0, "fats": 0}
+    # NumPy is imported on first use to keep module import cheap
+    from nutrition_engine import NutrientMatrix, nutrients_to_dict
 
-    for ing in recipe["ingredients"]:
-        food = ing["item"]
-        grams = ing["quantity_g"]
+    foods = [ing["item"] for ing in recipe["ingredients"]]
+    grams = [ing["quantity_g"] for ing in recipe["ingredients"]]
 
-        macros_100g = get_food_macros(food)
+    # One row per distinct food, then a single weights · matrix product
+    matrix = NutrientMatrix.from_per_100g({food: get_food_macros(food) for food in foods})
+    totals, _ = matrix.totals(foods, grams)
 
-        total["calories"] += macros_100g["calories"] * grams / 100
-        total["protein"] += macros_100g["protein"] * grams / 100
-        total["carbs"] += macros_100g["carbs"] * grams / 100
-        total["fats"] += macros_100g["fats"] * grams / 100
-
-    return total
+    total = nutrients_to_dict(totals, keys=("calories", "protein", "fats", "carbs"))
+    return {key: total[key] for key in ("calories", "protein", "carbs", "fats")}
 
 def sum_daily_macros(all_meals: dict):
     """
@@ -516,15 +621,81 @@ def generate_and_validate_meal(
         "attempts": 1
     }
 
+def generate_meals(
+    context: Dict[str, Any],
+    user_food_context: Dict[str, Any],
+    max_workers: Optional[int] = None,
+    timeout: Optional[float] = None,
+    cancel_event: Optional[threading.Event] = None
+) -> Dict[str, Any]:
+    """
+    Generate every meal of the day concurrently on a bounded thread pool.
+
+    Meals are independent once compute_meal_macros has split the day's
+    targets, so the day takes about as long as its slowest meal. A meal that
+    fails or runs past its timeout is reported with status "failed" and an
+    error instead of its recipe; the others are unaffected.
+
+    Args:
+        context: Pre-cooking context from build_pre_cooking_context
+        user_food_context: User food context JSON
+        max_workers: Pool size (defaults to MEAL_MAX_WORKERS)
+        timeout: Per-meal timeout in seconds (defaults to MEAL_TIMEOUT_SECONDS)
+        cancel_event: Set it to stop waiting; meals that haven't started are
+            cancelled and RuntimeError is raised
+
+    Returns:
+        Meal name -> meal result, in context["meals"] order
+    """
+    meals = list(context["meals"])
+    if max_workers is None:
+        max_workers = MEAL_MAX_WORKERS
+    if timeout is None:
+        timeout = MEAL_TIMEOUT_SECONDS
+
+    def generate(meal_name: str) -> Callable[[], Dict[str, Any]]:
+        return lambda: generate_and_validate_meal(
+            meal_name=meal_name,
+            meal_target=context["meal_macros"][meal_name],
+            user_food_context=user_food_context,
+            context=context
+        )
+
+    def failed(meal_name: str, reason: str) -> Dict[str, Any]:
+        error_msg = f"Meal '{meal_name}' {reason}"
+        print(f"⚠️ {error_msg}")
+        return {
+            "recipe": None,
+            "target_macros": context["meal_macros"][meal_name],
+            "actual_macros": None,
+            "status": "failed",
+            "error": error_msg,
+            "attempts": 1
+        }
+
+    try:
+        return run_bounded(
+            {meal_name: generate(meal_name) for meal_name in meals},
+            max_workers=max_workers,
+            timeout=timeout,
+            on_error=failed,
+            thread_name_prefix="meal",
+            cancel_event=cancel_event
+        )
+    except CancelledError:
+        raise RuntimeError("Meal plan generation cancelled")
+
 def generate_meal_plan(
     workout_plan: Dict[str, Any],
-    user_food_context: Dict[str, Any]
+    user_food_context: Dict[str, Any],
+    cancel_event: Optional[threading.Event] = None
 ) -> Dict[str, Any]:
     """
     Stage 2 entry point.
     Takes:
       - Stage 1 workout plan JSON
       - User food context JSON
+      - Optional event to cancel generation
     Returns:
       - Full daily meal plan with macros
     """
@@ -532,19 +703,12 @@ def generate_meal_plan(
     # Build context from Stage 1 output
     context = build_pre_cooking_context(workout_plan)
 
-    all_meal_outputs = {}
-
-    for meal_name in context["meals"]:
-        meal_target = context["meal_macros"][meal_name]
-
-        meal_result = generate_and_validate_meal(
-            meal_name=meal_name,
-            meal_target=meal_target,
-            user_food_context=user_food_context,
-            context=context
-        )
-
-        all_meal_outputs[meal_name] = meal_result
+    # Meals are generated concurrently but keep their context["meals"] order
+    all_meal_outputs = generate_meals(
+        context,
+        user_food_context,
+        cancel_event=cancel_event
+    )
 
     final_output = {
         "date": context["date"],
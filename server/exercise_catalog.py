@@ -0,0 +1,136 @@
+import json
+import os
+import threading
+from typing import Any, Dict, List, Optional, Set
+
+CATALOG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "exercise_catalog.json")
+
+# Free-text muscle names the agents use, mapped to catalog muscle names
+MUSCLE_ALIASES = {
+    "quadriceps": "quads",
+    "quad": "quads",
+    "hamstring": "hamstrings",
+    "glute": "glutes",
+    "calf": "calves",
+    "pecs": "chest",
+    "pectorals": "chest",
+    "lats": "back",
+    "upper back": "back",
+    "upper_back": "back",
+    "delts": "shoulders",
+    "deltoids": "shoulders",
+    "shoulder": "shoulders",
+    "bicep": "biceps",
+    "tricep": "triceps",
+    "arm": "arms",
+    "abs": "core",
+    "abdominals": "core",
+    "lower body": "legs",
+    "lower_body": "legs",
+    "leg": "legs",
+    "full body": "full_body",
+    "full-body": "full_body"
+}
+
+EXPERIENCE_LEVELS = ("beginner", "intermediate", "advanced")
+
+
+def normalize_muscle(muscle: str) -> str:
+    key = " ".join(str(muscle).lower().replace("_", " ").split())
+    return MUSCLE_ALIASES.get(key, key.replace(" ", "_"))
+
+
+class ExerciseCatalog:
+    """
+    In-process exercise catalog with inverted indexes on muscle, experience
+    level, training style and equipment.
+
+    Each index maps a value to the set of exercise ids carrying it, so a
+    query is a handful of set intersections with no network access.
+    """
+
+    def __init__(self, exercises: List[Dict[str, Any]]):
+        self.exercises = exercises
+        self.by_muscle: Dict[str, Set[int]] = {}
+        self.by_level: Dict[str, Set[int]] = {}
+        self.by_style: Dict[str, Set[int]] = {}
+        self.by_equipment: Dict[str, Set[int]] = {}
+
+        for idx, exercise in enumerate(exercises):
+            for muscle in exercise.get("muscles", []):
+                self.by_muscle.setdefault(normalize_muscle(muscle), set()).add(idx)
+            for level in exercise.get("levels", []):
+                self.by_level.setdefault(level, set()).add(idx)
+            for style in exercise.get("styles", []):
+                self.by_style.setdefault(style, set()).add(idx)
+            for equipment in exercise.get("equipment", []):
+                self.by_equipment.setdefault(equipment, set()).add(idx)
+
+    def query(
+        self,
+        muscle: str,
+        experience: Optional[str] = None,
+        training_style: Optional[str] = None,
+        equipment: Optional[List[str]] = None,
+        compound_only: bool = False,
+        limit: int = 5
+    ) -> List[Dict[str, Any]]:
+        """
+        Find candidate exercises for a muscle.
+
+        Filters on values the catalog doesn't know (e.g. an unusual training
+        style) are ignored rather than emptying the result.
+
+        Args:
+            muscle: Target muscle (free text, aliases accepted)
+            experience: beginner / intermediate / advanced
+            training_style: hypertrophy / strength / endurance / motor_learning
+            equipment: Available equipment; exercises needing none of it are dropped
+            compound_only: Only return compound movements
+            limit: Maximum number of exercises
+
+        Returns:
+            Matching exercises, compound movements first
+        """
+        muscle_key = normalize_muscle(muscle)
+        if muscle_key == "full_body":
+            candidates = {i for i, ex in enumerate(self.exercises) if ex.get("compound")}
+        else:
+            candidates = set(self.by_muscle.get(muscle_key, set()))
+
+        if experience:
+            level = experience.lower()
+            if level in self.by_level:
+                candidates &= self.by_level[level]
+        if training_style:
+            style = training_style.lower()
+            if style in self.by_style:
+                candidates &= self.by_style[style]
+        if equipment:
+            available: Set[int] = set()
+            for item in equipment:
+                available |= self.by_equipment.get(item.lower(), set())
+            candidates &= available
+        if compound_only:
+            candidates = {i for i in candidates if self.exercises[i].get("compound")}
+
+        ranked = sorted(
+            candidates,
+            key=lambda i: (not self.exercises[i].get("compound"), self.exercises[i]["name"])
+        )
+        return [self.exercises[i] for i in ranked[:limit]]
+
+
+_catalog: Optional[ExerciseCatalog] = None
+_catalog_lock = threading.Lock()
+
+
+def load_exercise_catalog(path: str = CATALOG_PATH) -> ExerciseCatalog:
+    """Load the bundled catalog once per process"""
+    global _catalog
+    if _catalog is None:
+        with _catalog_lock:
+            if _catalog is None:
+                with open(path, "r", encoding="utf-8") as f:
+                    _catalog = ExerciseCatalog(json.load(f))
+    return _catalog
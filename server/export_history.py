@@ -0,0 +1,424 @@
+"""
+Export plans, exercises and tracking history to columnar files for analytics.
+
+Each table is streamed out of the database in batches and written as Parquet
+(or Arrow IPC) files partitioned by plan month:
+
+    <out>/<table>/month=YYYY-MM/part-<run>-<n>.parquet
+
+A watermark of the last exported row per table is kept in
+<out>/_watermark.json, so the next run only appends rows added or changed
+since. Plans, exercises and tracking results are watermarked on their
+row_version (bumped by triggers on every insert and update, and on every
+re-score for tracking results): an edited row is exported again with a
+higher row_version, so readers keep the latest row_version per id.
+Deleted rows are exported to `deletions` as (table, id, row_version)
+tombstones; a row is gone when its latest version is a tombstone. Set
+events are otherwise append-only and watermarked on id. --full replaces
+every partition instead of appending. Needs pyarrow (pip install pyarrow). Run
+from the server directory:
+
+    python export_history.py [--db fitness.db] [--out export] [--format parquet] [--full]
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import time
+from collections import OrderedDict
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from fitness_db import DEFAULT_DB_NAME, get_pool
+from threshold_engine import THRESHOLD_METRICS
+
+WATERMARK_FILE = "_watermark.json"
+# Bumped when watermark columns change; older watermark files force a full export
+WATERMARK_FORMAT = 2
+
+FORMAT_EXTENSIONS = {"parquet": ".parquet", "arrow": ".arrow"}
+
+# table -> (query, watermark columns, initial watermark, [(column, arrow type)])
+# Every query selects a day number first (the partition key, not exported:
+# the plan's day_number, or the day of the delete for deletions), then the
+# columns; rows must come out in watermark order.
+EXPORTS: Dict[str, Tuple[str, Sequence[str], Sequence[Any], List[Tuple[str, str]]]] = {
+    "daily_plans": (
+        """
+        SELECT p.day_number, p.id, p.user_id, p.date, p.day_number, p.user_goal,
+               p.calories, p.protein_g, p.carbs_g, p.fats_g, p.workout_split,
+               p.time_required_minutes, p.current_weight, p.workout_intensity,
+               p.calories_to_burn, p.diet_rationale, p.workout_rationale, p.row_version
+        FROM daily_plans p
+        WHERE p.row_version > ?
+        ORDER BY p.row_version
+        """,
+        ("row_version",),
+        (-1,),
+        [
+            ("id", "int64"), ("user_id", "string"), ("date", "string"), ("day_number", "int64"),
+            ("user_goal", "string"), ("calories", "float64"), ("protein_g", "float64"),
+            ("carbs_g", "float64"), ("fats_g", "float64"), ("workout_split", "string"),
+            ("time_required_minutes", "int64"), ("current_weight", "float64"),
+            ("workout_intensity", "string"), ("calories_to_burn", "float64"),
+            ("diet_rationale", "string"), ("workout_rationale", "string"),
+            ("row_version", "int64")
+        ]
+    ),
+    "exercises": (
+        """
+        SELECT p.day_number, e.id, e.daily_plan_id, p.user_id, e.name, e.exercise_type,
+               e.sets, e.reps, e.reps_low, e.reps_high, e.planned_reps, e.hold_seconds,
+               e.distance_km, e.time_minutes, e.row_version
+        FROM exercises e
+        JOIN daily_plans p ON p.id = e.daily_plan_id
+        WHERE e.row_version > ?
+        ORDER BY e.row_version
+        """,
+        ("row_version",),
+        (-1,),
+        [
+            ("id", "int64"), ("daily_plan_id", "int64"), ("user_id", "string"),
+            ("name", "string"), ("exercise_type", "string"), ("sets", "int64"),
+            ("reps", "string"), ("reps_low", "int64"), ("reps_high", "int64"),
+            ("planned_reps", "int64"), ("hold_seconds", "int64"),
+            ("distance_km", "float64"), ("time_minutes", "string"),
+            ("row_version", "int64")
+        ]
+    ),
+    "tracking_results": (
+        f"""
+        SELECT p.day_number, m.plan_id, p.user_id, p.day_number, p.user_goal,
+               {", ".join(f"m.{name}" for name in THRESHOLD_METRICS)}, m.recorded_at,
+               r.rules_version, r.status, r.flags_mask, r.positives_mask, m.row_version
+        FROM daily_metrics m
+        JOIN daily_plans p ON p.id = m.plan_id
+        LEFT JOIN threshold_results r ON r.plan_id = m.plan_id
+        WHERE m.row_version > ?
+        ORDER BY m.row_version
+        """,
+        ("row_version",),
+        (-1,),
+        [
+            ("plan_id", "int64"), ("user_id", "string"), ("day_number", "int64"),
+            ("user_goal", "string"),
+            *((name, "float64") for name in THRESHOLD_METRICS),
+            ("recorded_at", "float64"), ("rules_version", "string"), ("status", "string"),
+            ("flags_mask", "int64"), ("positives_mask", "int64"),
+            ("row_version", "int64")
+        ]
+    ),
+    "set_events": (
+        """
+        SELECT p.day_number, s.id, s.exercise_id, e.daily_plan_id, p.user_id,
+               s.reps, s.distance_km, s.duration_seconds, s.recorded_at
+        FROM set_events s
+        JOIN exercises e ON e.id = s.exercise_id
+        JOIN daily_plans p ON p.id = e.daily_plan_id
+        WHERE (s.id) > (?)
+        ORDER BY s.id
+        """,
+        ("id",),
+        (-1,),
+        [
+            ("id", "int64"), ("exercise_id", "int64"), ("daily_plan_id", "int64"),
+            ("user_id", "string"), ("reps", "int64"), ("distance_km", "float64"),
+            ("duration_seconds", "float64"), ("recorded_at", "float64")
+        ]
+    ),
+    # Tombstones, partitioned by the day of the delete (unix days + ordinal of 1970-01-01)
+    "deletions": (
+        """
+        SELECT CAST(d.deleted_at / 86400 AS INTEGER) + 719163, d.row_version,
+               CASE d.table_name WHEN 'daily_metrics' THEN 'tracking_results'
+                                 ELSE d.table_name END,
+               d.row_id, d.deleted_at
+        FROM row_deletions d
+        WHERE d.row_version > ?
+        ORDER BY d.row_version
+        """,
+        ("row_version",),
+        (-1,),
+        [
+            ("row_version", "int64"), ("table", "string"), ("id", "int64"),
+            ("deleted_at", "float64")
+        ]
+    )
+}
+
+
+def _load_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError("export_history needs pyarrow: pip install pyarrow")
+    return pyarrow
+
+
+def load_watermarks(out_dir: str) -> Optional[Dict[str, List[Any]]]:
+    """
+    Last exported watermark per table, {} before the first export, or None
+    if the watermarks were written by an older export format
+    """
+    path = os.path.join(out_dir, WATERMARK_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        saved = json.load(f)
+    if saved.get("format") != WATERMARK_FORMAT:
+        return None
+    return saved.get("tables", {})
+
+
+def save_watermarks(out_dir: str, watermarks: Dict[str, List[Any]]) -> None:
+    path = os.path.join(out_dir, WATERMARK_FILE)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(
+            {"format": WATERMARK_FORMAT, "exported_at": time.time(), "tables": watermarks},
+            f,
+            indent=2
+        )
+    os.replace(tmp_path, path)
+
+
+def clear_partitions(out_dir: str, keep: Sequence[str]) -> int:
+    """
+    Remove every exported file of the EXPORTS tables except `keep`, and the
+    month directories left empty.
+
+    Returns:
+        Number of files removed
+    """
+    keep = {os.path.abspath(path) for path in keep}
+    removed = 0
+    for table in EXPORTS:
+        table_dir = os.path.join(out_dir, table)
+        if not os.path.isdir(table_dir):
+            continue
+        for partition in os.listdir(table_dir):
+            partition_dir = os.path.join(table_dir, partition)
+            for name in os.listdir(partition_dir):
+                path = os.path.join(partition_dir, name)
+                if os.path.abspath(path) not in keep:
+                    os.remove(path)
+                    removed += 1
+            if not os.listdir(partition_dir):
+                shutil.rmtree(partition_dir)
+    return removed
+
+
+def _column(pa, values: Sequence[Any], field) -> Any:
+    try:
+        return pa.array(values, type=field.type)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        if not (pa.types.is_integer(field.type) or pa.types.is_floating(field.type)):
+            raise
+    # Free-text numbers stored by the plan upsert ("3-4" sets) export as NULL
+    cast = int if pa.types.is_integer(field.type) else float
+    coerced = []
+    for value in values:
+        try:
+            coerced.append(None if value is None or isinstance(value, bool) else cast(float(value)))
+        except (TypeError, ValueError, OverflowError):
+            coerced.append(None)
+    return pa.array(coerced, type=field.type)
+
+
+def _month(day: Optional[int], cache: Dict[Optional[int], str]) -> str:
+    month = cache.get(day)
+    if month is None:
+        month = date.fromordinal(day).strftime("%Y-%m") if day else "unknown"
+        cache[day] = month
+    return month
+
+
+def export_table(
+    conn,
+    table: str,
+    out_dir: str,
+    watermark: Sequence[Any],
+    run_id: str,
+    file_format: str = "parquet",
+    batch_size: int = 5000,
+    max_open_files: int = 16
+) -> Tuple[int, List[Any], List[str]]:
+    """
+    Stream one table's rows past `watermark` into month partitions.
+
+    Only `batch_size` rows are held in memory at a time; each batch is
+    appended to the open file of every month it touches. At most
+    `max_open_files` month files stay open (least recently written closed
+    first; a month seen again gets another part file). Files are written
+    under a temporary name and renamed by the caller once every table has
+    exported, so a failed run leaves no partial output behind.
+
+    Args:
+        conn: Read connection (one snapshot for the whole export)
+        table: Key of EXPORTS
+        out_dir: Export root directory
+        watermark: Watermark values of the last exported row
+        run_id: Suffix that keeps this run's files apart from earlier runs
+        file_format: "parquet" or "arrow" (Arrow IPC file)
+        batch_size: Rows fetched and written per batch
+        max_open_files: Month files kept open at once
+
+    Returns:
+        (rows exported, new watermark, temporary file paths)
+    """
+    pa = _load_pyarrow()
+    query, watermark_columns, _, columns = EXPORTS[table]
+    schema = pa.schema([(name, getattr(pa, arrow_type)()) for name, arrow_type in columns])
+    names = [name for name, _ in columns]
+    watermark_index = [names.index(column) for column in watermark_columns]
+
+    writers: "OrderedDict[str, Any]" = OrderedDict()
+    parts: Dict[str, int] = {}
+    paths: List[str] = []
+    months: Dict[Optional[int], str] = {}
+    exported = 0
+    watermark = list(watermark)
+
+    cursor = conn.execute(query, tuple(watermark))
+    try:
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+
+            by_month: Dict[str, List[tuple]] = {}
+            for row in rows:
+                by_month.setdefault(_month(row[0], months), []).append(row[1:])
+
+            for month, month_rows in by_month.items():
+                writer = writers.get(month)
+                if writer is None:
+                    if len(writers) >= max_open_files:
+                        writers.popitem(last=False)[1].close()
+                    parts[month] = parts.get(month, -1) + 1
+                    partition = os.path.join(out_dir, table, f"month={month}")
+                    os.makedirs(partition, exist_ok=True)
+                    path = os.path.join(
+                        partition,
+                        f"part-{run_id}-{parts[month]}{FORMAT_EXTENSIONS[file_format]}.tmp"
+                    )
+                    if file_format == "parquet":
+                        writer = pa.parquet.ParquetWriter(path, schema)
+                    else:
+                        writer = pa.ipc.new_file(path, schema)
+                    writers[month] = writer
+                    paths.append(path)
+                else:
+                    writers.move_to_end(month)
+
+                arrays = [
+                    _column(pa, values, field)
+                    for values, field in zip(zip(*month_rows), schema)
+                ]
+                writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+
+            exported += len(rows)
+            last = rows[-1][1:]
+            watermark = [last[index] for index in watermark_index]
+    finally:
+        for writer in writers.values():
+            writer.close()
+
+    return exported, watermark, paths
+
+
+def export_history(
+    db_name: str = DEFAULT_DB_NAME,
+    out_dir: str = "export",
+    file_format: str = "parquet",
+    batch_size: int = 5000,
+    full: bool = False
+) -> Dict[str, Any]:
+    """
+    Export every table in EXPORTS, appending only rows past the stored
+    watermarks. With `full` (or watermarks from an older export format)
+    every row is exported and the previous partitions are replaced.
+
+    Returns:
+        Summary with rows exported per table and elapsed seconds
+    """
+    if file_format not in FORMAT_EXTENSIONS:
+        raise ValueError(f"Unknown export format: {file_format}")
+    _load_pyarrow()
+
+    os.makedirs(out_dir, exist_ok=True)
+    watermarks = {} if full else load_watermarks(out_dir)
+    if watermarks is None:
+        print("⚠️ Export watermarks are from an older format, re-exporting everything")
+        watermarks, full = {}, True
+    run_id = datetime.now().strftime("%Y%m%dT%H%M%S%f")
+    started = time.monotonic()
+
+    exported: Dict[str, int] = {}
+    pending: List[str] = []
+    try:
+        with get_pool(db_name).read() as conn:
+            # A single read transaction so every table comes from one snapshot
+            conn.execute("BEGIN")
+            try:
+                for table, (_, _, initial, _) in EXPORTS.items():
+                    count, watermarks[table], paths = export_table(
+                        conn,
+                        table,
+                        out_dir,
+                        watermarks.get(table, initial),
+                        run_id,
+                        file_format=file_format,
+                        batch_size=batch_size
+                    )
+                    exported[table] = count
+                    pending.extend(paths)
+            finally:
+                conn.rollback()
+    except BaseException:
+        for path in pending:
+            if os.path.exists(path):
+                os.remove(path)
+        raise
+
+    if full:
+        # Only once every table exported, so a failed run keeps the old export
+        clear_partitions(out_dir, keep=pending)
+    for path in pending:
+        os.replace(path, path[:-len(".tmp")])
+    save_watermarks(out_dir, watermarks)
+
+    summary = {
+        "rows": exported,
+        "files": len(pending),
+        "elapsed_seconds": round(time.monotonic() - started, 3)
+    }
+    print(f"✓ History export: {summary}")
+    return summary
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--db", default=DEFAULT_DB_NAME)
+    parser.add_argument("--out", default="export")
+    parser.add_argument("--format", choices=sorted(FORMAT_EXTENSIONS), default="parquet")
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--full", action="store_true",
+                        help="Ignore the watermark and replace the export with every row")
+    args = parser.parse_args()
+
+    export_history(
+        db_name=args.db,
+        out_dir=args.out,
+        file_format=args.format,
+        batch_size=args.batch_size,
+        full=args.full
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
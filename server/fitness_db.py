@@ -0,0 +1,992 @@
+import argparse
+import os
+import queue
+import re
+import sys
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date, datetime
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Mapping, Optional, Union
+
+DEFAULT_DB_NAME = "fitness.db"
+DEFAULT_USER_ID = "default"
+
+
+# ============================================================================
+# CONNECTION POOL
+# ============================================================================
+class ConnectionPool:
+    """
+    Pooled SQLite connections for one database file.
+
+    The database runs in WAL mode so readers never block the writer (or each
+    other). Reads borrow one of up to `max_readers` query-only connections;
+    writes go through a single writer connection serialized by a lock, and
+    are committed (or rolled back) when the `write()` block exits.
+    Connections are long-lived, so each keeps its prepared-statement cache.
+    """
+
+    def __init__(
+        self,
+        db_name: str = DEFAULT_DB_NAME,
+        max_readers: int = 8,
+        busy_timeout_ms: int = 5000,
+        cache_size_kib: int = 20000
+    ):
+        self.db_name = db_name
+        self.max_readers = max_readers
+        self.busy_timeout_ms = busy_timeout_ms
+        self.cache_size_kib = cache_size_kib
+
+        self._readers: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._readers_opened = 0
+        self._readers_lock = threading.Lock()
+        self._writer: Optional[sqlite3.Connection] = None
+        self._writer_lock = threading.RLock()
+
+    def _open(self, read_only: bool) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            self.db_name,
+            timeout=self.busy_timeout_ms / 1000,
+            check_same_thread=False,
+            cached_statements=256
+        )
+        conn.execute(f"PRAGMA busy_timeout = {int(self.busy_timeout_ms)};")
+        conn.execute("PRAGMA journal_mode = WAL;")
+        # In WAL mode NORMAL is durable across application crashes and
+        # avoids an fsync per commit
+        conn.execute("PRAGMA synchronous = NORMAL;")
+        conn.execute(f"PRAGMA cache_size = -{int(self.cache_size_kib)};")
+        conn.execute("PRAGMA temp_store = MEMORY;")
+        conn.execute("PRAGMA foreign_keys = ON;")
+        if read_only:
+            conn.execute("PRAGMA query_only = ON;")
+        return conn
+
+    @contextmanager
+    def read(self) -> Iterator[sqlite3.Connection]:
+        """Borrow a read-only connection"""
+        try:
+            conn = self._readers.get_nowait()
+        except queue.Empty:
+            with self._readers_lock:
+                can_open = self._readers_opened < self.max_readers
+                if can_open:
+                    self._readers_opened += 1
+            conn = self._open(read_only=True) if can_open else self._readers.get()
+
+        try:
+            yield conn
+        finally:
+            self._readers.put(conn)
+
+    @contextmanager
+    def write(self) -> Iterator[sqlite3.Connection]:
+        """Use the writer connection; commits on success, rolls back on error"""
+        with self._writer_lock:
+            if self._writer is None:
+                self._writer = self._open(read_only=False)
+            conn = self._writer
+            try:
+                yield conn
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+
+    def close(self) -> None:
+        with self._writer_lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+        while True:
+            try:
+                self._readers.get_nowait().close()
+            except queue.Empty:
+                break
+        with self._readers_lock:
+            self._readers_opened = 0
+
+
+_pools: Dict[str, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def _shared_pool(db_name: str) -> ConnectionPool:
+    pool = _pools.get(db_name)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.setdefault(db_name, ConnectionPool(db_name))
+    return pool
+
+
+def schema_version(db_name: str = DEFAULT_DB_NAME) -> int:
+    """Schema version recorded in `db_name` (0 if the file doesn't exist yet)"""
+    if not os.path.exists(db_name):
+        return 0
+    conn = sqlite3.connect(db_name)
+    try:
+        return conn.execute("PRAGMA user_version").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def get_pool(db_name: str = DEFAULT_DB_NAME) -> ConnectionPool:
+    """
+    Return the shared pool for `db_name`, creating it on first use.
+
+    Opening a pool never changes the schema: a database that is missing or
+    behind SCHEMA_VERSION raises RuntimeError until ensure_schema() (or
+    `python fitness_db.py`) has migrated it.
+    """
+    pool = _pools.get(db_name)
+    if pool is None:
+        version = schema_version(db_name)
+        if version < SCHEMA_VERSION:
+            raise RuntimeError(
+                f"{db_name} is at schema version {version}, expected {SCHEMA_VERSION}; "
+                f"run `python fitness_db.py --db {db_name}` to migrate it"
+            )
+        pool = _shared_pool(db_name)
+    return pool
+
+
+def ensure_schema(db_name: str = DEFAULT_DB_NAME) -> int:
+    """Create or migrate `db_name` to the latest schema version and return it"""
+    with _shared_pool(db_name).write() as conn:
+        return migrate(conn)
+
+
+# ============================================================================
+# PLAN DATES
+# ============================================================================
+# The tracker writes %d/%m/%y, the workout generator %d/%m/%Y
+PLAN_DATE_FORMATS = ("%d/%m/%y", "%d/%m/%Y", "%Y-%m-%d")
+
+
+def parse_plan_date(date_str: str) -> Optional[date]:
+    """Parse a daily_plans.date value in any of the formats the modules write"""
+    for fmt in PLAN_DATE_FORMATS:
+        try:
+            return datetime.strptime(str(date_str).strip(), fmt).date()
+        except ValueError:
+            continue
+    return None
+
+
+def day_number(value: Union[str, date, None] = None) -> Optional[int]:
+    """
+    Sortable day key stored in daily_plans.day_number.
+
+    Args:
+        value: Plan date string, a date, or None for today
+
+    Returns:
+        Proleptic Gregorian ordinal of the day, or None if unparseable
+    """
+    if value is None:
+        return date.today().toordinal()
+    if isinstance(value, date):
+        return value.toordinal()
+    parsed = parse_plan_date(value)
+    return parsed.toordinal() if parsed else None
+
+
+def today_str() -> str:
+    """Date key the tracker uses for daily_plans rows"""
+    return datetime.now().strftime("%d/%m/%y")
+
+
+# ============================================================================
+# REP SCHEMES
+# ============================================================================
+_REP_NUMBER = re.compile(r"\d+(?:\.\d+)?")
+_REP_RANGE = re.compile(r"(\d+)\s*(?:-|–|—|to)\s*(\d+)")
+_SETS_PREFIX = re.compile(r"^\s*\d+\s*[x×]\s*")
+_PER_SIDE = re.compile(r"\b(?:each|per|/)\s*(?:side|leg|arm)s?\b")
+_SECONDS = re.compile(r"\b(?:s|sec|secs|seconds?)\b|\d\s*s\b")
+_MINUTES = re.compile(r"\b(?:min|mins|minutes?)\b")
+
+
+def parse_reps_spec(reps: Any, sets: Any = None) -> Dict[str, Optional[int]]:
+    """
+    Parse a prescribed reps value into numeric columns.
+
+    Handles "10", 10, "8-10" / "8 to 10", "3x10", "10, 8, 6", "12 each side",
+    "AMRAP" / "AMRAP (8-12)", and timed holds like "30s", "30-45 sec" or
+    "1 min". Per-side counts are doubled in the planned total. AMRAP / max /
+    to-failure sets only get numbers when a range is written with them;
+    holds and unparseable values have no planned reps.
+
+    Args:
+        reps: Reps as written in the plan
+        sets: Number of sets, used for planned_reps
+
+    Returns:
+        {"reps_low", "reps_high", "planned_reps", "hold_seconds"}; planned_reps
+        is sets x midpoint reps (the per-exercise total), or None
+    """
+    spec = {"reps_low": None, "reps_high": None, "planned_reps": None, "hold_seconds": None}
+
+    if isinstance(reps, bool) or reps is None:
+        return spec
+    if isinstance(reps, (int, float)):
+        text = str(int(reps))
+    else:
+        text = _SETS_PREFIX.sub("", str(reps).strip().lower())
+
+    match = _REP_RANGE.search(text)
+    if match:
+        values = [int(match.group(1)), int(match.group(2))]
+    else:
+        values = [int(float(number)) for number in _REP_NUMBER.findall(text)]
+    if not values:
+        return spec
+
+    low, high = min(values), max(values)
+
+    if _MINUTES.search(text) or _SECONDS.search(text):
+        scale = 60 if _MINUTES.search(text) else 1
+        spec["hold_seconds"] = int((low + high) / 2 * scale)
+        return spec
+
+    spec["reps_low"], spec["reps_high"] = low, high
+    # Same midpoint rounding the tracker has always used for "N-M"
+    per_set = int((low + high) / 2) if match or len(values) <= 2 else int(sum(values) / len(values))
+    if _PER_SIDE.search(text):
+        per_set *= 2
+
+    try:
+        spec["planned_reps"] = int(sets) * per_set
+    except (TypeError, ValueError):
+        spec["planned_reps"] = None
+    return spec
+
+
+# ============================================================================
+# SCHEMA MIGRATIONS
+# ============================================================================
+def _migration_1_base_tables(conn: sqlite3.Connection) -> None:
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS daily_plans (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        date TEXT NOT NULL UNIQUE,
+        user_goal TEXT,
+        calories REAL,
+        protein_g REAL,
+        carbs_g REAL,
+        fats_g REAL,
+        workout_split TEXT,
+        time_required_minutes INTEGER,
+        diet_rationale TEXT,
+        workout_rationale TEXT,
+        current_weight REAL,
+        workout_intensity TEXT,
+        calories_to_burn REAL
+    )
+    """)
+
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS exercises (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        daily_plan_id INTEGER,
+        name TEXT NOT NULL,
+        exercise_type TEXT NOT NULL,   -- 'strength' or 'cardio'
+
+        -- strength fields
+        sets INTEGER,
+        reps TEXT,
+
+        -- cardio fields
+        distance_km REAL,
+        time_minutes TEXT,
+
+        FOREIGN KEY (daily_plan_id)
+            REFERENCES daily_plans(id)
+            ON DELETE CASCADE
+    )
+    """)
+
+
+def _migration_2_day_number(conn: sqlite3.Connection) -> None:
+    conn.execute("ALTER TABLE daily_plans ADD COLUMN day_number INTEGER")
+
+    rows = conn.execute("SELECT id, date FROM daily_plans").fetchall()
+    conn.executemany(
+        "UPDATE daily_plans SET day_number = ? WHERE id = ?",
+        [(day_number(plan_date), plan_id) for plan_id, plan_date in rows]
+    )
+
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_daily_plans_day_number ON daily_plans(day_number)")
+
+
+def _migration_3_user_partitioning(conn: sqlite3.Connection) -> None:
+    # SQLite can't drop a UNIQUE constraint in place, so rebuild daily_plans
+    # with plans unique per (user_id, day_number) instead of per date
+    conn.execute("""
+    CREATE TABLE daily_plans_v3 (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id TEXT NOT NULL DEFAULT 'default',
+        date TEXT NOT NULL,
+        user_goal TEXT,
+        calories REAL,
+        protein_g REAL,
+        carbs_g REAL,
+        fats_g REAL,
+        workout_split TEXT,
+        time_required_minutes INTEGER,
+        diet_rationale TEXT,
+        workout_rationale TEXT,
+        current_weight REAL,
+        workout_intensity TEXT,
+        calories_to_burn REAL,
+        day_number INTEGER,
+        UNIQUE (user_id, day_number)
+    )
+    """)
+
+    columns = """
+        id, date, user_goal, calories, protein_g, carbs_g, fats_g,
+        workout_split, time_required_minutes, diet_rationale,
+        workout_rationale, current_weight, workout_intensity,
+        calories_to_burn, day_number
+    """
+    # Dates stored in both formats can collide on day_number; the most
+    # recently inserted plan for a day wins
+    conn.execute(f"""
+    INSERT OR REPLACE INTO daily_plans_v3 ({columns})
+    SELECT {columns} FROM daily_plans ORDER BY id
+    """)
+
+    conn.execute("DROP TABLE daily_plans")
+    conn.execute("ALTER TABLE daily_plans_v3 RENAME TO daily_plans")
+    conn.execute("DELETE FROM exercises WHERE daily_plan_id NOT IN (SELECT id FROM daily_plans)")
+
+    # Covers the tracking-context join, including its ORDER BY e.id
+    conn.execute("""
+    CREATE INDEX IF NOT EXISTS idx_exercises_daily_plan
+    ON exercises(daily_plan_id, id, name, exercise_type, sets, reps, distance_km, time_minutes)
+    """)
+
+
+def _migration_4_threshold_history(conn: sqlite3.Connection) -> None:
+    # One row of tracker metrics per plan day, and its scored result as
+    # bitmasks over the goal's flag / positive vocabulary (threshold_engine)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS daily_metrics (
+        plan_id INTEGER PRIMARY KEY REFERENCES daily_plans(id) ON DELETE CASCADE,
+        calorie_deficit REAL,
+        protein_deficit REAL,
+        strength_completion_pct REAL,
+        cardio_completion_pct REAL,
+        intensity_multiplier REAL,
+        effort_score REAL,
+        recorded_at REAL NOT NULL
+    )
+    """)
+
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS threshold_results (
+        plan_id INTEGER PRIMARY KEY REFERENCES daily_plans(id) ON DELETE CASCADE,
+        rules_version TEXT NOT NULL,
+        status TEXT NOT NULL,
+        flags_mask INTEGER NOT NULL,
+        positives_mask INTEGER NOT NULL
+    )
+    """)
+
+
+def _migration_5_rep_schemes(conn: sqlite3.Connection) -> None:
+    # Reps are free text ("8-10", "AMRAP", "30s"); store the parsed numbers
+    # so planned volume is a plain SUM instead of re-parsing on every read
+    for column in ("reps_low", "reps_high", "planned_reps", "hold_seconds"):
+        conn.execute(f"ALTER TABLE exercises ADD COLUMN {column} INTEGER")
+
+    rows = conn.execute(
+        "SELECT id, sets, reps FROM exercises WHERE exercise_type = 'strength'"
+    ).fetchall()
+    updates = []
+    for exercise_id, sets, reps in rows:
+        spec = parse_reps_spec(reps, sets)
+        updates.append((
+            spec["reps_low"], spec["reps_high"], spec["planned_reps"],
+            spec["hold_seconds"], exercise_id
+        ))
+    conn.executemany("""
+    UPDATE exercises
+    SET reps_low = ?, reps_high = ?, planned_reps = ?, hold_seconds = ?
+    WHERE id = ?
+    """, updates)
+
+    # Rebuild the covering index so the tracking join and volume sums stay index-only
+    conn.execute("DROP INDEX IF EXISTS idx_exercises_daily_plan")
+    conn.execute("""
+    CREATE INDEX idx_exercises_daily_plan
+    ON exercises(
+        daily_plan_id, id, name, exercise_type, sets, reps, distance_km, time_minutes,
+        reps_low, reps_high, planned_reps, hold_seconds
+    )
+    """)
+
+
+# Cardio completion of one exercise, capped like calculate_cardio_completion
+_CARDIO_RATIO_SQL = """
+    CASE WHEN {row}.planned_distance_km > 0
+         THEN MIN({row}.distance_km / {row}.planned_distance_km, 1.2)
+         ELSE 0 END
+"""
+
+
+def _migration_6_set_events(conn: sqlite3.Connection) -> None:
+    # Append-only log of sets / cardio bouts streamed in during a session
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS set_events (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        exercise_id INTEGER NOT NULL REFERENCES exercises(id) ON DELETE CASCADE,
+        reps INTEGER,
+        distance_km REAL,
+        duration_seconds REAL,
+        recorded_at REAL NOT NULL
+    )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_set_events_exercise ON set_events(exercise_id, id)")
+    conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS set_events_append_only
+    BEFORE UPDATE ON set_events
+    BEGIN
+        SELECT RAISE(ABORT, 'set_events is append-only');
+    END
+    """)
+
+    # Running totals per exercise and per plan, kept current by the triggers
+    # below so reading a day's progress is a single primary-key lookup.
+    # Replacing a plan's exercises cascades through exercise_progress and
+    # the delete trigger takes their totals back out of workout_progress
+    # (dropping the plan's row once nothing logged is left).
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS exercise_progress (
+        exercise_id INTEGER PRIMARY KEY REFERENCES exercises(id) ON DELETE CASCADE,
+        plan_id INTEGER NOT NULL,
+        planned_distance_km REAL,
+        sets_logged INTEGER NOT NULL,
+        completed_reps INTEGER NOT NULL,
+        distance_km REAL NOT NULL,
+        active_seconds REAL NOT NULL
+    )
+    """)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS workout_progress (
+        plan_id INTEGER PRIMARY KEY REFERENCES daily_plans(id) ON DELETE CASCADE,
+        sets_logged INTEGER NOT NULL,
+        completed_reps INTEGER NOT NULL,
+        distance_km REAL NOT NULL,
+        cardio_ratio_sum REAL NOT NULL,
+        active_seconds REAL NOT NULL,
+        first_event_at REAL,
+        last_event_at REAL
+    )
+    """)
+
+    conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS set_events_progress
+    AFTER INSERT ON set_events
+    BEGIN
+        INSERT INTO exercise_progress (
+            exercise_id, plan_id, planned_distance_km,
+            sets_logged, completed_reps, distance_km, active_seconds
+        )
+        SELECT e.id, e.daily_plan_id, e.distance_km, 1,
+               COALESCE(NEW.reps, 0), COALESCE(NEW.distance_km, 0), COALESCE(NEW.duration_seconds, 0)
+        FROM exercises e
+        WHERE e.id = NEW.exercise_id
+        ON CONFLICT (exercise_id) DO UPDATE SET
+            sets_logged = sets_logged + 1,
+            completed_reps = completed_reps + excluded.completed_reps,
+            distance_km = distance_km + excluded.distance_km,
+            active_seconds = active_seconds + excluded.active_seconds;
+
+        UPDATE workout_progress
+        SET first_event_at = MIN(COALESCE(first_event_at, NEW.recorded_at), NEW.recorded_at),
+            last_event_at = MAX(COALESCE(last_event_at, NEW.recorded_at), NEW.recorded_at)
+        WHERE plan_id = (SELECT daily_plan_id FROM exercises WHERE id = NEW.exercise_id);
+    END
+    """)
+
+    conn.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS exercise_progress_insert
+    AFTER INSERT ON exercise_progress
+    BEGIN
+        INSERT INTO workout_progress (
+            plan_id, sets_logged, completed_reps, distance_km, cardio_ratio_sum, active_seconds
+        )
+        VALUES (
+            NEW.plan_id, NEW.sets_logged, NEW.completed_reps, NEW.distance_km,
+            {_CARDIO_RATIO_SQL.format(row="NEW")}, NEW.active_seconds
+        )
+        ON CONFLICT (plan_id) DO UPDATE SET
+            sets_logged = sets_logged + excluded.sets_logged,
+            completed_reps = completed_reps + excluded.completed_reps,
+            distance_km = distance_km + excluded.distance_km,
+            cardio_ratio_sum = cardio_ratio_sum + excluded.cardio_ratio_sum,
+            active_seconds = active_seconds + excluded.active_seconds;
+    END
+    """)
+
+    conn.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS exercise_progress_update
+    AFTER UPDATE ON exercise_progress
+    BEGIN
+        UPDATE workout_progress SET
+            sets_logged = sets_logged + NEW.sets_logged - OLD.sets_logged,
+            completed_reps = completed_reps + NEW.completed_reps - OLD.completed_reps,
+            distance_km = distance_km + NEW.distance_km - OLD.distance_km,
+            cardio_ratio_sum = cardio_ratio_sum
+                + {_CARDIO_RATIO_SQL.format(row="NEW")}
+                - {_CARDIO_RATIO_SQL.format(row="OLD")},
+            active_seconds = active_seconds + NEW.active_seconds - OLD.active_seconds
+        WHERE plan_id = NEW.plan_id;
+    END
+    """)
+
+    conn.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS exercise_progress_delete
+    AFTER DELETE ON exercise_progress
+    BEGIN
+        DELETE FROM workout_progress
+        WHERE plan_id = OLD.plan_id AND sets_logged = OLD.sets_logged;
+
+        UPDATE workout_progress SET
+            sets_logged = sets_logged - OLD.sets_logged,
+            completed_reps = completed_reps - OLD.completed_reps,
+            distance_km = distance_km - OLD.distance_km,
+            cardio_ratio_sum = cardio_ratio_sum - {_CARDIO_RATIO_SQL.format(row="OLD")},
+            active_seconds = active_seconds - OLD.active_seconds
+        WHERE plan_id = OLD.plan_id;
+    END
+    """)
+
+
+# Tables whose rows carry a row_version, bumped on every insert and update
+VERSIONED_TABLES = ("daily_plans", "exercises", "daily_metrics")
+
+
+def _migration_7_row_versions(conn: sqlite3.Connection) -> None:
+    # One database-wide counter, so a row's version orders every change made
+    # before it (writers are serialized) and exports can watermark on it
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS row_versions (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        value INTEGER NOT NULL
+    )
+    """)
+    conn.execute("INSERT OR IGNORE INTO row_versions (id, value) VALUES (1, 0)")
+
+    for table in VERSIONED_TABLES:
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN row_version INTEGER")
+        conn.execute(f"""
+        UPDATE {table}
+        SET row_version = rowid + (SELECT value FROM row_versions)
+        """)
+        conn.execute(f"""
+        UPDATE row_versions
+        SET value = COALESCE((SELECT MAX(row_version) FROM {table}), value)
+        """)
+        conn.execute(
+            f"CREATE INDEX IF NOT EXISTS idx_{table}_row_version ON {table}(row_version)"
+        )
+
+        # The WHEN guard skips the trigger's own write (and explicit version updates)
+        for event, guard in (("INSERT", ""), ("UPDATE", "WHEN NEW.row_version IS OLD.row_version")):
+            conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {table}_version_{event.lower()}
+            AFTER {event} ON {table}
+            {guard}
+            BEGIN
+                UPDATE row_versions SET value = value + 1;
+                UPDATE {table}
+                SET row_version = (SELECT value FROM row_versions)
+                WHERE rowid = NEW.rowid;
+            END
+            """)
+
+    # A (re-)scored threshold result changes the exported tracking row
+    for event in ("INSERT", "UPDATE"):
+        conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS threshold_results_version_{event.lower()}
+        AFTER {event} ON threshold_results
+        BEGIN
+            UPDATE row_versions SET value = value + 1;
+            UPDATE daily_metrics
+            SET row_version = (SELECT value FROM row_versions)
+            WHERE plan_id = NEW.plan_id;
+        END
+        """)
+
+
+# Tables whose deletes are recorded in row_deletions
+DELETION_LOGGED_TABLES = VERSIONED_TABLES + ("set_events",)
+
+
+def _migration_8_row_deletions(conn: sqlite3.Connection) -> None:
+    # Tombstones for exports: a deleted row gets a row_version past every
+    # version the row had, so readers can tell it is gone
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS row_deletions (
+        row_version INTEGER PRIMARY KEY,
+        table_name TEXT NOT NULL,
+        row_id INTEGER NOT NULL,
+        deleted_at REAL NOT NULL
+    )
+    """)
+
+    for table in DELETION_LOGGED_TABLES:
+        conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {table}_deletion_log
+        AFTER DELETE ON {table}
+        BEGIN
+            UPDATE row_versions SET value = value + 1;
+            INSERT INTO row_deletions (row_version, table_name, row_id, deleted_at)
+            VALUES (
+                (SELECT value FROM row_versions), '{table}', OLD.rowid,
+                (julianday('now') - 2440587.5) * 86400.0
+            );
+        END
+        """)
+
+
+# Append only: the schema version of a database is the number of steps applied
+MIGRATIONS: List[Callable[[sqlite3.Connection], None]] = [
+    _migration_1_base_tables,
+    _migration_2_day_number,
+    _migration_3_user_partitioning,
+    _migration_4_threshold_history,
+    _migration_5_rep_schemes,
+    _migration_6_set_events,
+    _migration_7_row_versions,
+    _migration_8_row_deletions,
+]
+
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def migrate(conn: sqlite3.Connection) -> int:
+    """
+    Apply pending migrations, tracked in PRAGMA user_version.
+
+    Each step runs in its own IMMEDIATE transaction together with the
+    version bump, so a failed step leaves the database at the previous
+    version and concurrent processes never apply a step twice. Foreign
+    keys are off while migrating so table rebuilds don't cascade deletes.
+
+    Args:
+        conn: Writable connection
+
+    Returns:
+        Schema version after migrating
+    """
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if version >= SCHEMA_VERSION:
+        return version
+
+    conn.commit()
+    conn.execute("PRAGMA foreign_keys = OFF;")
+    try:
+        for target, step in enumerate(MIGRATIONS, start=1):
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                version = conn.execute("PRAGMA user_version").fetchone()[0]
+                if version < target:
+                    step(conn)
+                    if conn.execute("PRAGMA foreign_key_check").fetchone():
+                        raise sqlite3.IntegrityError(f"Migration {target} left dangling foreign keys")
+                    conn.execute(f"PRAGMA user_version = {target}")
+                    print(f"  🗄 [Database] Applied migration {target}: {step.__name__}")
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+    finally:
+        conn.execute("PRAGMA foreign_keys = ON;")
+
+    return SCHEMA_VERSION
+
+
+# ============================================================================
+# TRACKING CONTEXT
+# ============================================================================
+# workout_progress columns returned with the tracking context
+WORKOUT_PROGRESS_FIELDS = (
+    "sets_logged",
+    "completed_reps",
+    "distance_km",
+    "cardio_ratio_sum",
+    "active_seconds",
+    "first_event_at",
+    "last_event_at"
+)
+
+TRACKING_CONTEXT_SQL = """
+    SELECT
+        p.id,
+        p.user_goal,
+        p.calories,
+        p.protein_g,
+        p.carbs_g,
+        p.fats_g,
+        p.calories_to_burn,
+        p.time_required_minutes,
+        p.workout_intensity,
+        w.sets_logged,
+        w.completed_reps,
+        w.distance_km,
+        w.cardio_ratio_sum,
+        w.active_seconds,
+        w.first_event_at,
+        w.last_event_at,
+        e.id,
+        e.name,
+        e.exercise_type,
+        e.sets,
+        e.reps,
+        e.distance_km,
+        e.time_minutes,
+        e.reps_low,
+        e.reps_high,
+        e.planned_reps,
+        e.hold_seconds,
+        ep.completed_reps
+    FROM daily_plans p
+    LEFT JOIN workout_progress w ON w.plan_id = p.id
+    LEFT JOIN exercises e ON e.daily_plan_id = p.id
+    LEFT JOIN exercise_progress ep ON ep.exercise_id = e.id
+    WHERE p.user_id = ? AND p.day_number = ?
+    ORDER BY e.id
+"""
+
+
+def fetch_tracking_context(
+    date_str: Optional[str] = None,
+    db_name: str = DEFAULT_DB_NAME,
+    user_id: str = DEFAULT_USER_ID
+) -> Optional[Dict[str, Any]]:
+    """
+    Load everything stage 3 needs for one day in a single query.
+
+    Args:
+        date_str: Plan date in any PLAN_DATE_FORMATS (defaults to today)
+        db_name: Database filename
+        user_id: Owner of the plan
+
+    Returns:
+        {"plan_id", "goal", "targets", "workout", "progress"} where targets
+        and workout match fetch_targets_for_today / fetch_workout_for_today
+        and progress holds the logged-set totals (None before the first
+        set; strength exercises also carry their own logged
+        completed_reps), or None if there is no plan for that day
+    """
+    day = day_number(date_str)
+    if day is None:
+        return None
+
+    with get_pool(db_name).read() as conn:
+        rows = conn.execute(TRACKING_CONTEXT_SQL, (user_id, day)).fetchall()
+    if not rows:
+        return None
+
+    (plan_id, user_goal, calories, protein_g, carbs_g, fats_g,
+     calories_to_burn, time_required_minutes, workout_intensity) = rows[0][:9]
+
+    progress = None
+    if rows[0][9] is not None:
+        progress = dict(zip(WORKOUT_PROGRESS_FIELDS, rows[0][9:16]))
+
+    exercises = []
+    for (exercise_id, name, ex_type, sets, reps, dist, minutes,
+         reps_low, reps_high, planned_reps, hold_seconds, completed_reps) in (row[16:] for row in rows):
+        if ex_type == "strength":
+            exercises.append({
+                "exercise_id": exercise_id,
+                "name": name,
+                "exercise_type": "strength",
+                "sets": sets,
+                "reps": reps,
+                "reps_low": reps_low,
+                "reps_high": reps_high,
+                "planned_reps": planned_reps,
+                "hold_seconds": hold_seconds,
+                "completed_reps": completed_reps or 0
+            })
+        elif ex_type == "cardio":
+            exercises.append({
+                "exercise_id": exercise_id,
+                "name": name,
+                "exercise_type": "cardio",
+                "distance_km": dist,
+                "time_minutes": minutes
+            })
+
+    return {
+        "plan_id": plan_id,
+        "goal": user_goal,
+        "targets": {
+            "required_macros": {
+                "calories": calories,
+                "protein": protein_g,
+                "carbs": carbs_g,
+                "fat": fats_g
+            },
+            "workout": {
+                "calories_burnt": calories_to_burn,
+                "time_required_minutes": time_required_minutes,
+                "intensity": workout_intensity
+            }
+        },
+        "workout": {
+            "planned_time": time_required_minutes,
+            "planned_intensity": workout_intensity,
+            "calories_burnt": calories_to_burn,
+            "exercises": exercises
+        },
+        "progress": progress
+    }
+
+
+# ============================================================================
+# SET EVENTS
+# ============================================================================
+def log_sets(events: Iterable[Mapping[str, Any]], db_name: str = DEFAULT_DB_NAME) -> int:
+    """
+    Append logged sets / cardio bouts for exercises in the tracker.
+
+    Every event updates the exercise's and the plan's running totals in
+    the same transaction (see _migration_6_set_events), so clients can
+    stream sets in as they finish them.
+
+    Args:
+        events: {"exercise_id", "reps", "distance_km", "duration_seconds",
+            "recorded_at"}; everything except exercise_id is optional and
+            recorded_at defaults to now
+        db_name: Database filename
+
+    Returns:
+        Number of events written
+    """
+    now = time.time()
+    rows = [
+        (
+            int(event["exercise_id"]),
+            event.get("reps"),
+            event.get("distance_km"),
+            event.get("duration_seconds"),
+            event.get("recorded_at", now)
+        )
+        for event in events
+    ]
+    if not rows:
+        return 0
+
+    with get_pool(db_name).write() as conn:
+        conn.executemany("""
+        INSERT INTO set_events (exercise_id, reps, distance_km, duration_seconds, recorded_at)
+        VALUES (?, ?, ?, ?, ?)
+        """, rows)
+    return len(rows)
+
+
+def log_set(
+    exercise_id: int,
+    reps: Optional[int] = None,
+    distance_km: Optional[float] = None,
+    duration_seconds: Optional[float] = None,
+    db_name: str = DEFAULT_DB_NAME
+) -> None:
+    """Append one set (strength) or bout (cardio) for an exercise"""
+    log_sets([{
+        "exercise_id": exercise_id,
+        "reps": reps,
+        "distance_km": distance_km,
+        "duration_seconds": duration_seconds
+    }], db_name=db_name)
+
+
+# ============================================================================
+# PLANNED VOLUME
+# ============================================================================
+def week_start(day: int) -> int:
+    """day_number of the Monday starting the week that contains `day`"""
+    return day - (day - 1) % 7
+
+
+def fetch_planned_volume(
+    start: Union[str, date, None] = None,
+    end: Union[str, date, None] = None,
+    period: str = "day",
+    db_name: str = DEFAULT_DB_NAME,
+    user_id: str = DEFAULT_USER_ID
+) -> List[Dict[str, Any]]:
+    """
+    Planned strength volume between two dates, summed in SQL.
+
+    Args:
+        start: First date (inclusive); defaults to the earliest plan
+        end: Last date (inclusive); defaults to the latest plan
+        period: "day" for one row per plan, "week" for one row per
+            Monday-starting week
+        db_name: Database filename
+        user_id: Owner of the plans
+
+    Returns:
+        [{"date" / "week_start", "planned_reps", "hold_seconds", "sets"}]
+        in date order
+    """
+    if period not in ("day", "week"):
+        raise ValueError(f"Unknown volume period: {period}")
+
+    bucket = "p.day_number" if period == "day" else "p.day_number - (p.day_number - 1) % 7"
+    first = day_number(start) if start is not None else None
+    last = day_number(end) if end is not None else None
+    if (start is not None and first is None) or (end is not None and last is None):
+        raise ValueError(f"Invalid date range: {start!r} to {end!r}")
+
+    with get_pool(db_name).read() as conn:
+        rows = conn.execute(f"""
+            SELECT
+                {bucket} AS bucket,
+                COALESCE(SUM(e.planned_reps), 0),
+                COALESCE(SUM(e.hold_seconds * e.sets), 0),
+                COALESCE(SUM(e.sets), 0)
+            FROM daily_plans p
+            JOIN exercises e ON e.daily_plan_id = p.id AND e.exercise_type = 'strength'
+            WHERE p.user_id = ?
+              AND p.day_number >= COALESCE(?, p.day_number)
+              AND p.day_number <= COALESCE(?, p.day_number)
+            GROUP BY bucket
+            ORDER BY bucket
+        """, (user_id, first, last)).fetchall()
+
+    label = "date" if period == "day" else "week_start"
+    return [
+        {
+            label: date.fromordinal(bucket).isoformat(),
+            "planned_reps": planned_reps,
+            "hold_seconds": hold_seconds,
+            "sets": sets
+        }
+        for bucket, planned_reps, hold_seconds, sets in rows
+    ]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Create or migrate the fitness database")
+    parser.add_argument("--db", default=DEFAULT_DB_NAME)
+    args = parser.parse_args()
+
+    version = ensure_schema(args.db)
+    print(f"🗄 [Database] {args.db} is at schema version {version}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
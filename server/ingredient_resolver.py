@@ -0,0 +1,187 @@
+import re
+import threading
+from typing import Dict, Iterable, List, Mapping, Optional, Set, Tuple
+
+# Free-text ingredient names mapped to nutrition table rows
+INGREDIENT_ALIASES = {
+    "chicken": "raw_chicken",
+    "chicken raw": "raw_chicken",
+    "egg": "egg_whole",
+    "whole egg": "egg_whole",
+    "rice": "rice_raw",
+    "uncooked rice": "rice_raw",
+    "fish": "raw_fish",
+    "oil": "oil_generic",
+    "cooking oil": "oil_generic",
+    "vegetable oil": "oil_generic",
+    "milk": "milk_full_fat",
+    "whole milk": "milk_full_fat",
+    "full fat milk": "milk_full_fat",
+    "bread": "bread_white",
+    "white bread": "bread_white",
+    "cottage cheese indian": "paneer"
+}
+
+# Minimum trigram similarity for a fuzzy match
+DEFAULT_MIN_SIMILARITY = 0.6
+
+# Minimum similarity between a query word and its closest word in a fuzzy
+# match; every query word must clear it ("potato chips" is not "potato")
+DEFAULT_MIN_WORD_SIMILARITY = 0.5
+
+_NON_WORD = re.compile(r"[^a-z0-9]+")
+
+
+def normalize_ingredient(name: str) -> str:
+    """Lowercase, unify separators and strip simple plurals ("Tomatoes" -> "tomato")"""
+    words = []
+    for word in _NON_WORD.sub(" ", str(name).lower()).split():
+        if len(word) > 3 and word.endswith("oes"):
+            word = word[:-2]
+        elif len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        words.append(word)
+    return " ".join(words)
+
+
+def trigrams(normalized: str) -> Set[str]:
+    """Padded per-word trigrams, so word order doesn't matter"""
+    grams: Set[str] = set()
+    for word in normalized.split():
+        padded = f" {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class IngredientResolver:
+    """
+    Maps free-text ingredient names to rows of the nutrition table.
+
+    Resolution order: exact row name, normalized row name, alias table,
+    then the closest row by trigram Jaccard similarity if it clears
+    `min_similarity` and every query word has a counterpart in the row name
+    (similarity >= `min_word_similarity`), so an extra qualifier like
+    "chips" or "powder" never resolves to the plain food. Results are
+    memoized, so repeat lookups are a dict hit.
+    """
+
+    def __init__(
+        self,
+        names: Iterable[str],
+        aliases: Mapping[str, str] = INGREDIENT_ALIASES,
+        min_similarity: float = DEFAULT_MIN_SIMILARITY,
+        min_word_similarity: float = DEFAULT_MIN_WORD_SIMILARITY,
+        memo_entries: int = 4096
+    ):
+        self.names: List[str] = list(names)
+        self.min_similarity = min_similarity
+        self.min_word_similarity = min_word_similarity
+        self.memo_entries = memo_entries
+
+        self.by_normalized: Dict[str, str] = {}
+        self.grams: Dict[str, Set[str]] = {}
+        self.word_grams: Dict[str, List[Set[str]]] = {}
+        self.by_gram: Dict[str, Set[str]] = {}
+        for name in self.names:
+            normalized = normalize_ingredient(name)
+            self.by_normalized.setdefault(normalized, name)
+            self.grams[name] = trigrams(normalized)
+            self.word_grams[name] = [trigrams(word) for word in normalized.split()]
+            for gram in self.grams[name]:
+                self.by_gram.setdefault(gram, set()).add(name)
+
+        # Aliases only count if their target is actually in the table
+        known = set(self.names)
+        self.aliases: Dict[str, str] = {
+            normalize_ingredient(alias): target
+            for alias, target in aliases.items()
+            if target in known
+        }
+
+        self._memo: Dict[str, Tuple[Optional[str], float]] = {}
+        self._memo_lock = threading.Lock()
+
+    def match(self, name: str) -> Tuple[Optional[str], float]:
+        """
+        Best row for `name` and its confidence.
+
+        Returns:
+            (row name, similarity in [0, 1]) or (None, best similarity seen)
+            when nothing clears the threshold
+        """
+        memoized = self._memo.get(name)
+        if memoized is not None:
+            return memoized
+
+        result = self._match(name)
+        with self._memo_lock:
+            if len(self._memo) >= self.memo_entries:
+                self._memo.clear()
+            self._memo[name] = result
+        return result
+
+    def resolve(self, name: str) -> Optional[str]:
+        """Row name for `name`, or None if there's no confident match"""
+        return self.match(name)[0]
+
+    def _match(self, name: str) -> Tuple[Optional[str], float]:
+        if name in self.grams:
+            return name, 1.0
+
+        normalized = normalize_ingredient(name)
+        if normalized in self.by_normalized:
+            return self.by_normalized[normalized], 1.0
+        if normalized in self.aliases:
+            return self.aliases[normalized], 1.0
+
+        query = trigrams(normalized)
+        if not query:
+            return None, 0.0
+
+        shared: Dict[str, int] = {}
+        for gram in query:
+            for candidate in self.by_gram.get(gram, ()):
+                shared[candidate] = shared.get(candidate, 0) + 1
+
+        query_words = [trigrams(word) for word in normalized.split()]
+
+        best, best_score = None, 0.0
+        for candidate, count in shared.items():
+            score = count / (len(query) + len(self.grams[candidate]) - count)
+            if score < self.min_similarity or not self._covers(query_words, candidate):
+                continue
+            if score > best_score or (score == best_score and best is not None and candidate < best):
+                best, best_score = candidate, score
+
+        if best is not None:
+            return best, best_score
+        return None, max(
+            (count / (len(query) + len(self.grams[candidate]) - count) for candidate, count in shared.items()),
+            default=0.0
+        )
+
+    def _covers(self, query_words: List[Set[str]], candidate: str) -> bool:
+        """Whether every query word has a similar word in `candidate`"""
+        for word in query_words:
+            if not any(
+                len(word & other) / len(word | other) >= self.min_word_similarity
+                for other in self.word_grams[candidate]
+            ):
+                return False
+        return True
+
+
+_resolver_cache: Dict[str, object] = {"source": None, "resolver": None}
+_resolver_cache_lock = threading.Lock()
+
+
+def resolver_for(matrix) -> IngredientResolver:
+    """
+    Resolver over a NutrientMatrix's row names, rebuilt only when a
+    different matrix (e.g. a reloaded nutrition store) is passed in.
+    """
+    with _resolver_cache_lock:
+        if _resolver_cache["source"] is not matrix:
+            _resolver_cache["resolver"] = IngredientResolver(matrix.names)
+            _resolver_cache["source"] = matrix
+        return _resolver_cache["resolver"]
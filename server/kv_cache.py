@@ -0,0 +1,237 @@
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+
+class PersistentCache:
+    """
+    Disk-backed key/value cache for JSON-serializable values.
+
+    Entries live in a SQLite table and expire after `ttl_seconds`. The table
+    is capped at `max_entries` rows, evicting the least recently used first.
+    A small in-process LRU sits in front of the table so repeat lookups in
+    the same worker don't touch the disk at all. Values are kept serialized
+    and decoded on every hit, so callers always get their own copy.
+
+    last_access (the eviction order) is only rewritten once it is older
+    than `access_refresh_fraction` of the TTL, so most hits stay read-only.
+    Hits served from memory queue their access time and it is written
+    through in batches (at the latest before the next eviction), so keys
+    kept hot in memory are not the first evicted from disk.
+    """
+
+    def __init__(
+        self,
+        db_name: str,
+        table: str = "cache",
+        ttl_seconds: float = 7 * 24 * 3600,
+        max_entries: int = 5000,
+        memory_entries: int = 256,
+        access_refresh_fraction: float = 0.1,
+        access_flush_batch: int = 64
+    ):
+        self.db_name = db_name
+        self.table = table
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.memory_entries = memory_entries
+        self.access_refresh_seconds = ttl_seconds * access_refresh_fraction
+        self.access_flush_batch = access_flush_batch
+
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+
+        # key -> (raw value, created_at, last_access on disk)
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        # key -> access time not yet written to last_access
+        self._pending_access: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._initialized = False
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_name, timeout=10)
+            self._local.conn = conn
+
+        if not self._initialized:
+            with self._lock:
+                if not self._initialized:
+                    conn.execute(f"""
+                        CREATE TABLE IF NOT EXISTS {self.table} (
+                            key TEXT PRIMARY KEY,
+                            value TEXT NOT NULL,
+                            created_at REAL NOT NULL,
+                            last_access REAL NOT NULL
+                        )
+                    """)
+                    conn.execute(f"""
+                        CREATE INDEX IF NOT EXISTS idx_{self.table}_last_access
+                        ON {self.table} (last_access)
+                    """)
+                    conn.commit()
+                    self._initialized = True
+        return conn
+
+    def _remember(self, key: str, raw_value: str, created_at: float, last_access: float) -> None:
+        with self._lock:
+            self._memory[key] = (raw_value, created_at, last_access)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_entries:
+                self._memory.popitem(last=False)
+
+    def get(self, key: str) -> Optional[Any]:
+        """
+        Look up a cached value.
+
+        Args:
+            key: Cache key
+
+        Returns:
+            A fresh copy of the cached value, or None on a miss or expired entry
+        """
+        now = time.time()
+
+        flush = False
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                raw_value, created_at, last_access = entry
+                if now - created_at < self.ttl_seconds:
+                    self._memory.move_to_end(key)
+                    if now - last_access >= self.access_refresh_seconds:
+                        self._memory[key] = (raw_value, created_at, now)
+                        self._pending_access[key] = now
+                        flush = len(self._pending_access) >= self.access_flush_batch
+                    self.hits += 1
+                else:
+                    del self._memory[key]
+                    entry = None
+        if entry is not None:
+            if flush:
+                self.flush_access_times()
+            return json.loads(raw_value)
+
+        conn = self._connect()
+        row = conn.execute(
+            f"SELECT value, created_at, last_access FROM {self.table} WHERE key = ?",
+            (key,)
+        ).fetchone()
+
+        if row is None:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        raw_value, created_at, last_access = row
+        if now - created_at >= self.ttl_seconds:
+            conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+            conn.commit()
+            with self._lock:
+                self.expired += 1
+                self.misses += 1
+            return None
+
+        if now - last_access >= self.access_refresh_seconds:
+            conn.execute(
+                f"UPDATE {self.table} SET last_access = ? WHERE key = ?",
+                (now, key)
+            )
+            conn.commit()
+            last_access = now
+
+        self._remember(key, raw_value, created_at, last_access)
+        with self._lock:
+            self.hits += 1
+        return json.loads(raw_value)
+
+    def set(self, key: str, value: Any) -> None:
+        """
+        Store a value, evicting least recently used entries past the size cap.
+
+        Args:
+            key: Cache key
+            value: JSON-serializable value
+        """
+        now = time.time()
+        raw_value = json.dumps(value)
+        # Eviction below must see the access times of memory hits
+        self.flush_access_times()
+        conn = self._connect()
+        conn.execute(
+            f"""
+            INSERT INTO {self.table} (key, value, created_at, last_access)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT(key) DO UPDATE SET
+                value = excluded.value,
+                created_at = excluded.created_at,
+                last_access = excluded.last_access
+            """,
+            (key, raw_value, now, now)
+        )
+
+        (count,) = conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()
+        overflow = count - self.max_entries
+        if overflow > 0:
+            conn.execute(
+                f"""
+                DELETE FROM {self.table} WHERE key IN (
+                    SELECT key FROM {self.table} ORDER BY last_access ASC LIMIT ?
+                )
+                """,
+                (overflow,)
+            )
+            with self._lock:
+                self.evictions += overflow
+        conn.commit()
+
+        self._remember(key, raw_value, now, now)
+
+    def flush_access_times(self) -> None:
+        """Write the queued access times of memory hits to last_access."""
+        with self._lock:
+            if not self._pending_access:
+                return
+            pending, self._pending_access = self._pending_access, {}
+        conn = self._connect()
+        conn.executemany(
+            f"UPDATE {self.table} SET last_access = MAX(last_access, ?) WHERE key = ?",
+            [(accessed_at, key) for key, accessed_at in pending.items()]
+        )
+        conn.commit()
+
+    def delete(self, key: str) -> None:
+        """Remove a single entry."""
+        conn = self._connect()
+        conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+        conn.commit()
+        with self._lock:
+            self._memory.pop(key, None)
+            self._pending_access.pop(key, None)
+
+    def clear(self) -> None:
+        """Remove every entry."""
+        conn = self._connect()
+        conn.execute(f"DELETE FROM {self.table}")
+        conn.commit()
+        with self._lock:
+            self._memory.clear()
+            self._pending_access.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters and the hit rate."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "expired": self.expired,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0
+            }
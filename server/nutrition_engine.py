@@ -0,0 +1,243 @@
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Column order of every nutrient matrix / result vector
+NUTRIENTS = ("calories", "protein", "fat", "carbs")
+
+# Per-gram keys used by nutrition_db2.json
+PER_GRAM_KEYS = ("calories_per_gram", "protein_g_per_gram", "fat_g_per_gram", "carbs_g_per_gram")
+
+# Per-100g keys used by nutrition_db.json (Open Food Facts cache), in NUTRIENTS order
+PER_100G_KEYS = ("calories", "protein", "fats", "carbs")
+
+# Source files, relative to the working directory like the modules that write them
+PER_GRAM_DB_PATH = "nutrition_db2.json"
+PER_100G_DB_PATH = "nutrition_db.json"
+
+
+class NutrientMatrix:
+    """
+    Columnar nutrient table: one row per food, one column per NUTRIENTS
+    entry, values per gram.
+
+    A food log is a weight vector over the rows, so totals are a single
+    matrix-vector product and many logs (meals, users) are a single
+    matrix-matrix product.
+    """
+
+    def __init__(self, names: Sequence[str], per_gram: np.ndarray):
+        per_gram = np.asarray(per_gram, dtype=np.float64).reshape(len(names), len(NUTRIENTS))
+        self.names: List[str] = list(names)
+        self.values = per_gram
+        self.index: Dict[str, int] = {name: row for row, name in enumerate(self.names)}
+
+    @classmethod
+    def from_per_gram_db(cls, db: Mapping[str, Mapping[str, float]]) -> "NutrientMatrix":
+        """Build from {name: {"calories_per_gram", "protein_g_per_gram", ...}}"""
+        names = list(db)
+        values = [[float(db[name].get(key, 0.0)) for key in PER_GRAM_KEYS] for name in names]
+        return cls(names, np.array(values).reshape(len(names), len(NUTRIENTS)))
+
+    @classmethod
+    def from_per_100g(cls, foods: Mapping[str, Mapping[str, float]]) -> "NutrientMatrix":
+        """Build from {name: {"calories", "protein", "fats", "carbs"}} per 100 g"""
+        names = list(foods)
+        values = [[float(foods[name].get(key, 0.0)) for key in PER_100G_KEYS] for name in names]
+        return cls(names, np.array(values).reshape(len(names), len(NUTRIENTS)) / 100.0)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.index
+
+    def rows(self, names: Sequence[str]) -> np.ndarray:
+        """Row numbers for `names`; raises ValueError for unknown foods"""
+        try:
+            return np.fromiter((self.index[name] for name in names), dtype=np.intp, count=len(names))
+        except KeyError as e:
+            raise ValueError(f"No nutrition data for {e.args[0]}")
+
+    def totals(self, names: Sequence[str], grams: Sequence[float]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Nutrients for one food log.
+
+        Args:
+            names: Food names (must all be in the matrix)
+            grams: Weight of each food in grams
+
+        Returns:
+            (totals, per_item): totals is shape (4,), per_item is
+            shape (len(names), 4), both in NUTRIENTS order
+        """
+        rows = self.values[self.rows(names)]
+        weights = np.asarray(grams, dtype=np.float64)
+        return weights @ rows, rows * weights[:, None]
+
+    def weight_matrix(self, logs: Sequence[Mapping[str, float]]) -> np.ndarray:
+        """Dense (len(logs), len(self)) grams matrix for many food logs"""
+        width = len(self.names)
+        cells: List[int] = []
+        grams: List[float] = []
+        try:
+            for log_id, log in enumerate(logs):
+                offset = log_id * width
+                for name, weight in log.items():
+                    cells.append(offset + self.index[name])
+                    grams.append(weight)
+        except KeyError as e:
+            raise ValueError(f"No nutrition data for {e.args[0]}")
+
+        # bincount sums repeated (log, food) cells, like += would
+        flat = np.bincount(
+            np.asarray(cells, dtype=np.intp),
+            weights=np.asarray(grams, dtype=np.float64),
+            minlength=len(logs) * width
+        )
+        return flat.reshape(len(logs), width)
+
+    def totals_batch(self, logs: Sequence[Mapping[str, float]]) -> np.ndarray:
+        """
+        Nutrient totals for many food logs at once.
+
+        Args:
+            logs: One {food name: grams} mapping per meal / user
+
+        Returns:
+            Array of shape (len(logs), 4) in NUTRIENTS order
+        """
+        return self.weight_matrix(logs) @ self.values
+
+
+def nutrients_to_dict(vector: np.ndarray, keys: Sequence[str] = NUTRIENTS) -> Dict[str, float]:
+    """Plain-float dict for one NUTRIENTS-ordered vector (optionally renamed)"""
+    return {key: float(value) for key, value in zip(keys, vector)}
+
+
+_matrix_cache: Dict[str, Any] = {"source": None, "matrix": None}
+_matrix_cache_lock = threading.Lock()
+
+
+def matrix_for_per_gram_db(db: Mapping[str, Mapping[str, float]]) -> NutrientMatrix:
+    """
+    Matrix for a per-gram nutrition DB dict, rebuilt only when a different
+    dict is passed in.
+    """
+    with _matrix_cache_lock:
+        if _matrix_cache["source"] is not db:
+            _matrix_cache["matrix"] = NutrientMatrix.from_per_gram_db(db)
+            _matrix_cache["source"] = db
+        return _matrix_cache["matrix"]
+
+
+class NutritionStore:
+    """
+    Process-wide nutrient table for one nutrition file.
+
+    Each consumer keeps its own source, as before the store existed: the
+    tracker reads nutrition_db2.json (per gram) and the cooking module
+    nutrition_db.json (per 100 g, the Open Food Facts cache it writes).
+    The file is loaded into a read-only per-gram NutrientMatrix that is
+    replaced wholesale, so readers never see a half-updated table. It is
+    stat'ed at most every `check_interval_seconds` and only re-read when
+    its mtime changes.
+    """
+
+    def __init__(self, path: str, per_100g: bool, check_interval_seconds: float = 1.0):
+        self.path = path
+        self.per_100g_source = per_100g
+        self.check_interval_seconds = check_interval_seconds
+
+        self._lock = threading.Lock()
+        self._matrix: Optional[NutrientMatrix] = None
+        self._mtime: Optional[int] = None
+        self._next_check = 0.0
+
+    def _source_mtime(self) -> Optional[int]:
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def _load(self) -> NutrientMatrix:
+        rows: Dict[str, List[float]] = {}
+
+        if os.path.exists(self.path):
+            with open(self.path, "r", encoding="utf-8") as f:
+                entries = json.load(f)
+            for name, entry in entries.items():
+                if self.per_100g_source:
+                    per_100g = entry.get("per_100g")
+                    if isinstance(per_100g, dict):
+                        rows[name] = [float(per_100g.get(key) or 0.0) / 100.0 for key in PER_100G_KEYS]
+                else:
+                    rows[name] = [float(entry.get(key) or 0.0) for key in PER_GRAM_KEYS]
+
+        values = np.array(list(rows.values()), dtype=np.float64).reshape(len(rows), len(NUTRIENTS))
+        values.setflags(write=False)
+        return NutrientMatrix(list(rows), values)
+
+    def matrix(self) -> NutrientMatrix:
+        """Current nutrient table, reloaded first if the source file changed"""
+        if self._matrix is not None and time.monotonic() < self._next_check:
+            return self._matrix
+
+        with self._lock:
+            if self._matrix is None or time.monotonic() >= self._next_check:
+                mtime = self._source_mtime()
+                if mtime != self._mtime:
+                    try:
+                        self._matrix = self._load()
+                        self._mtime = mtime
+                        print(f"Nutrition store loaded {self.path} ({len(self._matrix)} foods)")
+                    except json.JSONDecodeError as e:
+                        if self._matrix is None:
+                            raise ValueError(f"Nutrition DB JSON error: {e}")
+                        # Keep serving the previous table; retry on the next check
+                        print(f"⚠️ Nutrition DB reload failed, keeping previous data: {e}")
+                self._next_check = time.monotonic() + self.check_interval_seconds
+            return self._matrix
+
+    def invalidate(self) -> None:
+        """Check the source file on the next lookup (e.g. right after writing it)"""
+        self._next_check = 0.0
+
+    def per_gram(self, name: str) -> Optional[Dict[str, float]]:
+        """{"calories", "protein", "fat", "carbs"} per gram, or None if unknown"""
+        matrix = self.matrix()
+        row = matrix.index.get(name)
+        return None if row is None else nutrients_to_dict(matrix.values[row])
+
+    def per_100g(self, name: str) -> Optional[Dict[str, float]]:
+        """{"calories", "protein", "carbs", "fats"} per 100 g, or None if unknown"""
+        matrix = self.matrix()
+        row = matrix.index.get(name)
+        if row is None:
+            return None
+        # Rounded so per-gram sources don't surface float noise (0.9 -> 0.8999...)
+        per_100g = nutrients_to_dict(np.round(matrix.values[row] * 100.0, 6), keys=PER_100G_KEYS)
+        return {key: per_100g[key] for key in ("calories", "protein", "carbs", "fats")}
+
+
+_stores: Dict[str, NutritionStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_nutrition_store(path: str = PER_GRAM_DB_PATH, per_100g: bool = False) -> NutritionStore:
+    """
+    Shared store for one nutrition file: PER_GRAM_DB_PATH for tracking,
+    PER_100G_DB_PATH (with `per_100g`) for cooking.
+    """
+    store = _stores.get(path)
+    if store is None:
+        with _stores_lock:
+            store = _stores.get(path)
+            if store is None:
+                store = NutritionStore(path, per_100g=per_100g)
+                _stores[path] = store
+    return store
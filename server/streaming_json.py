@@ -0,0 +1,170 @@
+import json
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Characters that may appear outside strings in a JSON document
+_STRUCTURAL = set("{}[]:,")
+_SCALAR = set("0123456789-+.eE") | set("truefalsn")
+_WHITESPACE = set(" \t\r\n")
+_CLOSERS = {"}": "{", "]": "["}
+
+
+class StreamAborted(ValueError):
+    """Raised as soon as a streamed LLM response can no longer yield usable JSON."""
+
+    def __init__(self, reason: str, partial_text: str = ""):
+        super().__init__(reason)
+        self.reason = reason
+        self.partial_text = partial_text
+
+
+class IncrementalJSONChecker:
+    """
+    Incrementally scan streamed LLM output for a single JSON object.
+
+    Chunks are fed as they arrive. The checker tracks string/escape state and
+    bracket nesting, remembers the top-level keys it has seen, and raises
+    StreamAborted as soon as the output is structurally broken, has too much
+    prose before the object, or is missing a required key.
+
+    `required_keys` are expected in the order the prompt's schema lists
+    them, so a required key is reported missing as soon as a later required
+    key arrives without it (or, at the latest, when the object closes).
+    Once the top-level object closes, `complete` is True and the caller can
+    stop reading the stream.
+    """
+
+    def __init__(self, required_keys: Sequence[str] = (), max_preamble_chars: int = 200):
+        self.required_keys = list(required_keys)
+        self._required_position = {key: i for i, key in enumerate(self.required_keys)}
+        self.max_preamble_chars = max_preamble_chars
+
+        self.buffer: List[str] = []
+        self.length = 0
+        self.start: Optional[int] = None
+        self.end: Optional[int] = None
+        self.keys_seen: List[str] = []
+
+        self._stack: List[str] = []
+        self._in_string = False
+        self._escape = False
+        self._expect_key = False
+        self._string_is_key = False
+        self._current_string: List[str] = []
+        self._preamble_chars = 0
+
+    @property
+    def complete(self) -> bool:
+        return self.end is not None
+
+    @property
+    def text(self) -> str:
+        return "".join(self.buffer)
+
+    def _abort(self, reason: str) -> None:
+        raise StreamAborted(reason, self.text)
+
+    def feed(self, chunk: str) -> None:
+        if self.complete or not chunk:
+            return
+
+        base = self.length
+        self.buffer.append(chunk)
+        self.length += len(chunk)
+
+        for offset, ch in enumerate(chunk):
+            if self.start is None:
+                if ch == "{":
+                    self.start = base + offset
+                    self._stack.append("{")
+                    self._expect_key = True
+                elif ch not in _WHITESPACE:
+                    self._preamble_chars += 1
+                    if self._preamble_chars > self.max_preamble_chars:
+                        self._abort("No JSON object found in the first "
+                                    f"{self.max_preamble_chars} characters")
+                continue
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if self._string_is_key:
+                        key = "".join(self._current_string)
+                        self.keys_seen.append(key)
+                        self._expect_key = False
+                        if key in self._required_position:
+                            self._check_required_keys(self._required_position[key])
+                elif self._string_is_key:
+                    self._current_string.append(ch)
+                continue
+
+            if ch == '"':
+                self._in_string = True
+                self._string_is_key = self._expect_key and len(self._stack) == 1
+                self._current_string = []
+            elif ch in "{[":
+                self._stack.append(ch)
+            elif ch in "}]":
+                if not self._stack or self._stack[-1] != _CLOSERS[ch]:
+                    self._abort(f"Mismatched '{ch}' at position {base + offset}")
+                self._stack.pop()
+                if not self._stack:
+                    self.end = base + offset + 1
+                    self._check_required_keys()
+                    return
+            elif ch == ",":
+                self._expect_key = len(self._stack) == 1
+            elif ch in _STRUCTURAL or ch in _WHITESPACE or ch in _SCALAR:
+                continue
+            else:
+                self._abort(f"Unexpected character {ch!r} at position {base + offset}")
+
+    def _check_required_keys(self, before: Optional[int] = None) -> None:
+        """Abort if a required key (the first `before` of them, or all) hasn't been seen"""
+        expected = self.required_keys if before is None else self.required_keys[:before]
+        missing = [k for k in expected if k not in self.keys_seen]
+        if missing:
+            where = "" if before is None else f" before '{self.required_keys[before]}'"
+            self._abort(f"Missing required keys{where}: {', '.join(missing)}")
+
+    def result(self) -> Dict[str, Any]:
+        """Parse the completed JSON object."""
+        if not self.complete:
+            self._abort("Response ended before the JSON object was closed")
+        text = self.text
+        try:
+            return json.loads(text[self.start:self.end])
+        except json.JSONDecodeError as e:
+            raise StreamAborted(f"Invalid JSON: {e}", text) from e
+
+
+def consume_json_stream(
+    chunks: Iterable[Any],
+    required_keys: Sequence[str] = (),
+    max_preamble_chars: int = 200
+) -> Tuple[str, Dict[str, Any]]:
+    """
+    Read a streamed LLM response until its JSON object is complete.
+
+    Args:
+        chunks: Streamed response (chunks with a `.text` attribute, or strings)
+        required_keys: Top-level keys the object must contain
+        max_preamble_chars: Non-whitespace characters tolerated before the object
+
+    Returns:
+        Tuple of (text received so far, parsed JSON object)
+
+    Raises:
+        StreamAborted: as soon as the response is known to be unusable
+    """
+    checker = IncrementalJSONChecker(required_keys, max_preamble_chars)
+
+    for chunk in chunks:
+        checker.feed(chunk if isinstance(chunk, str) else chunk.text)
+        if checker.complete:
+            break
+
+    return checker.text, checker.result()
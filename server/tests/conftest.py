@@ -0,0 +1,17 @@
+import os
+import sys
+
+import pytest
+
+# The server modules import each other as top-level modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fitness_db import ensure_schema  # noqa: E402
+
+
+@pytest.fixture
+def db_name(tmp_path):
+    """Fresh fitness database migrated to the latest schema"""
+    path = str(tmp_path / "fitness.db")
+    ensure_schema(path)
+    return path
@@ -0,0 +1,90 @@
+import tracking_llm
+from kv_cache import PersistentCache
+from tracking_llm import adjustment_signature, make_adjustment_template, render_adjustment_template
+
+METRICS = {"cardio_min": 12, "calorie_deficit": 312.5}
+
+DECISION = {
+    "goal": "fat_loss",
+    "status": "needs_adjustment",
+    "Negatives": ["low_protein", "low_cardio"],
+    "Positives": ["strength_on_track"],
+    "Intensity": "moderate",
+    "Metrics": {
+        "calorie_deficit": 312.5,
+        "protein_deficit": 41.2,
+        "strength_completion_pct": 92.3,
+        "cardio_completion_pct": 48.0,
+        "intensity_multiplier": 1.04,
+        "effort_score": 0.87
+    }
+}
+
+
+def _decision(**metrics):
+    return {**DECISION, "Metrics": {**DECISION["Metrics"], **metrics}}
+
+
+def test_metric_fields_are_refilled_by_name():
+    report = {
+        "report_id": "adj_old",
+        "metrics_reference": {"cardio_min": 12, "Calorie_Deficit": 312.5},
+        "notes": ["Do 10-11 reps", "Reviewed on 2026-10-12"]
+    }
+    template = make_adjustment_template(report, METRICS)
+    assert template["metrics_reference"]["Calorie_Deficit"] == {"$metric": "calorie_deficit"}
+
+    rendered = render_adjustment_template(template, {"cardio_min": 14, "calorie_deficit": 300.0})
+    assert rendered["metrics_reference"] == {"cardio_min": 14, "Calorie_Deficit": 300.0}
+    assert rendered["notes"] == report["notes"]
+    assert rendered["report_id"] != "adj_old"
+
+
+def test_reports_repeating_a_metric_value_elsewhere_are_not_cached():
+    # An unrelated field that happens to equal a metric must not be templated
+    assert make_adjustment_template({"nutrition": {"calories": 12}}, METRICS) is None
+    # Prose quoting a metric, however it is rounded or padded
+    for text in ("Your 312.5 kcal deficit is low", "Deficit: 313 kcal", "312.50 kcal", "12 minutes of cardio"):
+        assert make_adjustment_template({"summary": text}, METRICS) is None, text
+    # Small counts, ranges and dates are not read as metrics
+    assert make_adjustment_template({"summary": "3 sets of 10-12 from 2026-10-12"}, METRICS) is not None
+
+
+def test_nearby_metrics_share_a_signature():
+    signature = adjustment_signature(DECISION)
+
+    assert adjustment_signature(_decision(calorie_deficit=280.0, effort_score=0.82)) == signature
+    assert adjustment_signature(_decision(calorie_deficit=640.0)) != signature
+    # Order of flags and metrics doesn't matter; unknown metrics aren't part of the key
+    reordered = {**DECISION, "Negatives": ["low_cardio", "low_protein"],
+                 "Metrics": dict(reversed(list(DECISION["Metrics"].items())))}
+    assert adjustment_signature(reordered) == signature
+    assert adjustment_signature(_decision(cardio_min=12)) == signature
+    # Missing data gets its own bucket
+    assert adjustment_signature(_decision(effort_score=float("nan"))) == adjustment_signature(_decision(effort_score=None))
+    assert adjustment_signature(_decision(effort_score=None)) != signature
+
+
+def test_cached_report_is_served_with_the_current_metrics(tmp_path, monkeypatch):
+    monkeypatch.setattr(tracking_llm, "adjustment_cache", PersistentCache(str(tmp_path / "cache.db")))
+    calls = []
+
+    def fake_llm(decision):
+        calls.append(decision)
+        return {
+            "report_id": "adj_llm",
+            "adjustments": {"volume": "Keep strength volume, add one cardio block"},
+            "metrics_reference": dict(decision["Metrics"])
+        }
+
+    monkeypatch.setattr(tracking_llm, "_run_workout_adjustment_llm", fake_llm)
+
+    first = tracking_llm.run_workout_adjustment_llm(DECISION)
+    second = tracking_llm.run_workout_adjustment_llm(_decision(calorie_deficit=280.0, effort_score=0.82))
+
+    assert len(calls) == 1
+    assert first["metrics_reference"]["calorie_deficit"] == 312.5
+    assert second["metrics_reference"]["calorie_deficit"] == 280.0
+    assert second["metrics_reference"]["effort_score"] == 0.82
+    assert second["adjustments"] == first["adjustments"]
+    assert second["report_id"] != first["report_id"]
@@ -0,0 +1,98 @@
+import copy
+import glob
+import os
+
+import pytest
+
+from fitness_db import get_pool
+from threshold_engine import THRESHOLD_METRICS, backfill_threshold_results, record_daily_evaluation
+from tracking_llm import insert_daily_plan
+
+from test_plan_upsert import PLAN
+
+pytest.importorskip("pyarrow")
+import pyarrow.dataset  # noqa: E402
+
+from export_history import export_history  # noqa: E402
+
+
+def _rows(out_dir, table):
+    dataset = pyarrow.dataset.dataset(
+        os.path.join(out_dir, table), format="parquet", partitioning="hive"
+    )
+    return dataset.to_table().to_pylist()
+
+
+def test_changed_rows_are_exported_again(tmp_path, db_name):
+    out_dir = str(tmp_path / "export")
+    insert_daily_plan(PLAN, db_name=db_name)
+    with get_pool(db_name).read() as conn:
+        plan_id = conn.execute("SELECT id FROM daily_plans").fetchone()[0]
+    record_daily_evaluation(plan_id, {name: 1.0 for name in THRESHOLD_METRICS}, db_name=db_name)
+    export_history(db_name=db_name, out_dir=out_dir)
+
+    regenerated = copy.deepcopy(PLAN)
+    regenerated["exercises"][0]["sets"] = 5
+    insert_daily_plan(regenerated, db_name=db_name)
+    with get_pool(db_name).write() as conn:
+        conn.execute("UPDATE threshold_results SET rules_version = 'old'")
+    backfill_threshold_results(db_name=db_name)
+
+    summary = export_history(db_name=db_name, out_dir=out_dir)
+    assert summary["rows"]["exercises"] == 3
+    assert summary["rows"]["tracking_results"] == 1
+
+    latest = {}
+    for row in _rows(out_dir, "exercises"):
+        if row["id"] not in latest or row["row_version"] > latest[row["id"]]["row_version"]:
+            latest[row["id"]] = row
+    assert len(latest) == 3
+    assert sorted(row["sets"] for row in latest.values() if row["name"] == "Squat") == [5]
+
+    assert export_history(db_name=db_name, out_dir=out_dir)["rows"]["exercises"] == 0
+
+
+def test_full_export_replaces_partitions(tmp_path, db_name):
+    out_dir = str(tmp_path / "export")
+    insert_daily_plan(PLAN, db_name=db_name)
+    export_history(db_name=db_name, out_dir=out_dir)
+    export_history(db_name=db_name, out_dir=out_dir, full=True)
+
+    assert len(_rows(out_dir, "daily_plans")) == 1
+    assert len(_rows(out_dir, "exercises")) == 3
+    assert not glob.glob(os.path.join(out_dir, "**", "*.tmp"), recursive=True)
+
+
+def test_free_text_sets_export_as_null(tmp_path, db_name):
+    out_dir = str(tmp_path / "export")
+    plan = copy.deepcopy(PLAN)
+    plan["exercises"][0]["sets"] = "3-4"
+    insert_daily_plan(plan, db_name=db_name)
+
+    export_history(db_name=db_name, out_dir=out_dir)
+    sets = {row["name"]: row["sets"] for row in _rows(out_dir, "exercises")}
+    assert sets == {"Squat": None, "Lunge": 3, "Run": None}
+
+    # The watermark moved past the row, so the next run has nothing to redo
+    assert export_history(db_name=db_name, out_dir=out_dir)["rows"]["exercises"] == 0
+
+
+def test_deleted_exercises_are_exported_as_tombstones(tmp_path, db_name):
+    out_dir = str(tmp_path / "export")
+    insert_daily_plan(PLAN, db_name=db_name)
+    export_history(db_name=db_name, out_dir=out_dir)
+
+    trimmed = copy.deepcopy(PLAN)
+    trimmed["exercises"] = trimmed["exercises"][:1]
+    insert_daily_plan(trimmed, db_name=db_name)
+    export_history(db_name=db_name, out_dir=out_dir)
+
+    latest = {}
+    for row in _rows(out_dir, "exercises") + [
+        dict(row, deleted=True)
+        for row in _rows(out_dir, "deletions") if row["table"] == "exercises"
+    ]:
+        if row["id"] not in latest or row["row_version"] > latest[row["id"]]["row_version"]:
+            latest[row["id"]] = row
+    live = [row["name"] for row in latest.values() if not row.get("deleted")]
+    assert live == ["Squat"]
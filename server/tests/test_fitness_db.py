@@ -0,0 +1,102 @@
+import sqlite3
+from datetime import date
+
+import pytest
+
+from fitness_db import (
+    SCHEMA_VERSION, _migration_1_base_tables, ensure_schema, get_pool, parse_plan_date,
+    parse_reps_spec, schema_version
+)
+
+
+def _legacy_database(path):
+    """Database as the original tracker created it: base tables, user_version 0"""
+    conn = sqlite3.connect(path)
+    _migration_1_base_tables(conn)
+    conn.execute("INSERT INTO daily_plans (date, user_goal) VALUES ('05/03/24', 'old')")
+    conn.execute("INSERT INTO daily_plans (date, user_goal) VALUES ('05/03/2024', 'new')")
+    conn.execute("INSERT INTO daily_plans (date, user_goal) VALUES ('06/03/24', 'next')")
+    conn.executemany(
+        "INSERT INTO exercises (daily_plan_id, name, exercise_type, sets, reps) VALUES (?, ?, ?, ?, ?)",
+        [(2, "Squat", "strength", 3, "8-10"), (3, "Plank", "strength", 3, "30s")]
+    )
+    conn.commit()
+    conn.close()
+
+
+def test_fresh_database_is_created_at_the_latest_version(tmp_path):
+    path = str(tmp_path / "fitness.db")
+    assert schema_version(path) == 0
+    assert ensure_schema(path) == SCHEMA_VERSION
+    assert ensure_schema(path) == SCHEMA_VERSION
+    assert schema_version(path) == SCHEMA_VERSION
+
+
+def test_opening_a_pool_never_migrates(tmp_path):
+    path = str(tmp_path / "fitness.db")
+    with pytest.raises(RuntimeError, match="schema version 0"):
+        get_pool(path)
+
+    _legacy_database(path)
+    with open(path, "rb") as f:
+        before = f.read()
+    with pytest.raises(RuntimeError, match="python fitness_db.py"):
+        get_pool(path)
+    with open(path, "rb") as f:
+        assert f.read() == before
+
+
+def test_legacy_database_is_upgraded_in_place(tmp_path):
+    path = str(tmp_path / "fitness.db")
+    _legacy_database(path)
+
+    assert ensure_schema(path) == SCHEMA_VERSION
+    with get_pool(path).read() as conn:
+        plans = conn.execute(
+            "SELECT id, user_id, user_goal, day_number FROM daily_plans ORDER BY day_number"
+        ).fetchall()
+        exercises = conn.execute(
+            "SELECT name, reps_low, reps_high, planned_reps, hold_seconds FROM exercises ORDER BY id"
+        ).fetchall()
+
+    # Both spellings of 5 March collapse to one day; the later plan wins
+    assert plans == [
+        (2, "default", "new", date(2024, 3, 5).toordinal()),
+        (3, "default", "next", date(2024, 3, 6).toordinal())
+    ]
+    assert exercises == [("Squat", 8, 10, 27, None), ("Plank", None, None, None, 30)]
+
+
+@pytest.mark.parametrize("reps, sets, expected", [
+    ("10", 3, (10, 10, 30, None)),
+    (10, 3, (10, 10, 30, None)),
+    ("8-10", 3, (8, 10, 27, None)),
+    ("8 to 10", 3, (8, 10, 27, None)),
+    ("3x10", 3, (10, 10, 30, None)),
+    ("10, 8, 6", 3, (6, 10, 24, None)),
+    ("12 each side", 3, (12, 12, 72, None)),
+    ("AMRAP", 3, (None, None, None, None)),
+    ("AMRAP (8-12)", 3, (8, 12, 30, None)),
+    ("30s", 3, (None, None, None, 30)),
+    ("30-45 sec", 3, (None, None, None, 37)),
+    ("1 min", 2, (None, None, None, 60)),
+    ("10", "three", (10, 10, None, None)),
+    (None, 3, (None, None, None, None)),
+    (True, 3, (None, None, None, None)),
+])
+def test_parse_reps_spec(reps, sets, expected):
+    spec = parse_reps_spec(reps, sets)
+    assert (spec["reps_low"], spec["reps_high"], spec["planned_reps"], spec["hold_seconds"]) == expected
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("05/03/24", date(2024, 3, 5)),
+    ("05/03/2024", date(2024, 3, 5)),
+    ("2024-03-05", date(2024, 3, 5)),
+    (" 2024-03-05 ", date(2024, 3, 5)),
+    ("31/02/24", None),
+    ("March 5", None),
+    ("", None),
+])
+def test_parse_plan_date(value, expected):
+    assert parse_plan_date(value) == expected
@@ -0,0 +1,16 @@
+from ingredient_resolver import IngredientResolver
+
+NAMES = ["potato", "tomato", "raw_chicken", "white rice raw", "olive oil", "banana"]
+
+
+def test_extra_qualifier_does_not_resolve_to_plain_food():
+    resolver = IngredientResolver(NAMES)
+    assert resolver.match("potato chips")[0] is None
+    assert resolver.resolve("onion powder") is None
+
+
+def test_plurals_typos_and_partial_names_still_resolve():
+    resolver = IngredientResolver(NAMES)
+    assert resolver.resolve("Potatoes") == "potato"
+    assert resolver.resolve("bananna") == "banana"
+    assert resolver.resolve("white rice") == "white rice raw"
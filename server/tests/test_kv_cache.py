@@ -0,0 +1,67 @@
+import kv_cache
+from kv_cache import PersistentCache
+
+
+class _Clock:
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+
+def _cache(tmp_path, monkeypatch, **kwargs):
+    clock = _Clock()
+    monkeypatch.setattr(kv_cache, "time", clock)
+    return PersistentCache(str(tmp_path / "cache.db"), **kwargs), clock
+
+
+def test_entries_expire_after_the_ttl(tmp_path, monkeypatch):
+    cache, clock = _cache(tmp_path, monkeypatch, ttl_seconds=60)
+    cache.set("k", {"v": 1})
+
+    clock.now += 59
+    assert cache.get("k") == {"v": 1}
+
+    clock.now += 2
+    assert cache.get("k") is None
+    # Also gone from disk, not just from the memory tier
+    assert PersistentCache(cache.db_name).get("k") is None
+    assert cache.stats()["expired"] == 1
+
+
+def test_hits_return_independent_copies(tmp_path, monkeypatch):
+    cache, _ = _cache(tmp_path, monkeypatch)
+    cache.set("k", {"items": [1]})
+    cache.get("k")["items"].append(2)
+    assert cache.get("k") == {"items": [1]}
+
+
+def test_memory_hits_keep_keys_from_being_evicted(tmp_path, monkeypatch):
+    cache, clock = _cache(
+        tmp_path, monkeypatch, ttl_seconds=3600, max_entries=3, access_refresh_fraction=0.0
+    )
+    for key in ("hot", "b", "c"):
+        cache.set(key, key)
+        clock.now += 1
+
+    # Only ever served from memory, never re-read from disk
+    clock.now += 1
+    assert cache.get("hot") == "hot"
+
+    clock.now += 1
+    cache.set("d", "d")
+
+    reopened = PersistentCache(cache.db_name)
+    assert reopened.get("hot") == "hot"
+    assert reopened.get("b") is None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_values_survive_reopening(tmp_path, monkeypatch):
+    cache, _ = _cache(tmp_path, monkeypatch)
+    cache.set("plan", {"exercises": ["Squat"]})
+
+    reopened = PersistentCache(cache.db_name)
+    assert reopened.get("plan") == {"exercises": ["Squat"]}
+    assert reopened.stats()["hits"] == 1
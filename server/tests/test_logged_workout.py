@@ -0,0 +1,63 @@
+from fitness_db import fetch_tracking_context, log_sets
+from tracking_llm import (
+    calculate_workout_effort_with_cardio,
+    insert_daily_plan,
+    summarize_logged_workout
+)
+
+from test_plan_upsert import PLAN
+
+
+def _effort(db_name):
+    context = fetch_tracking_context(PLAN["date"], db_name=db_name)
+    logged = summarize_logged_workout(context["workout"], context["progress"])
+    effort = calculate_workout_effort_with_cardio(
+        strength_planned_reps=logged["planned_reps"],
+        strength_completed_reps=logged["completed_reps"],
+        planned_time=context["workout"]["planned_time"],
+        actual_time=logged["actual_time"],
+        cardio_completion=logged["cardio_completion"]
+    )
+    return logged, effort
+
+
+def test_actual_time_spans_the_session_including_rest(db_name):
+    insert_daily_plan(PLAN, db_name=db_name)
+    exercises = {
+        ex["name"]: ex["exercise_id"]
+        for ex in fetch_tracking_context(PLAN["date"], db_name=db_name)["workout"]["exercises"]
+    }
+
+    # 60s sets with 3 minutes of rest, over 60 minutes
+    started = 1_000_000.0
+    events = [
+        {"exercise_id": exercises["Squat"], "reps": 9, "duration_seconds": 60,
+         "recorded_at": started + i * 240}
+        for i in range(4)
+    ] + [
+        {"exercise_id": exercises["Lunge"], "reps": 24, "duration_seconds": 60,
+         "recorded_at": started + 960 + i * 240}
+        for i in range(3)
+    ] + [
+        {"exercise_id": exercises["Run"], "reps": 100, "distance_km": 3,
+         "duration_seconds": 1200, "recorded_at": started + 3600}
+    ]
+    log_sets(events, db_name=db_name)
+
+    logged, effort = _effort(db_name)
+    assert logged["actual_time"] == 60
+    # Reps logged against the run aren't strength reps
+    assert logged["completed_reps"] == 4 * 9 + 3 * 24
+    assert effort["intensity_multiplier"] == 1.0
+    assert effort["effort_score"] == 1.0
+
+
+def test_unknown_planned_time_is_neutral():
+    effort = calculate_workout_effort_with_cardio(
+        strength_planned_reps=10,
+        strength_completed_reps=10,
+        planned_time=None,
+        actual_time=30,
+        cardio_completion=1.0
+    )
+    assert effort["intensity_multiplier"] == 1.0
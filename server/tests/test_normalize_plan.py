@@ -0,0 +1,120 @@
+import copy
+
+import pytest
+
+import llm_backend
+import tracking_llm
+from tracking_llm import normalize_plan, normalize_plan_with_llm, store_workout_plan
+
+EXECUTOR_PLAN = {
+    "date": "05/03/2024",
+    "user_goal": "muscle_gain",
+    "daily_macros": {"calories": 2800, "protein": 170, "carbs": 320, "fat": 80},
+    "workout_split": {
+        "name": "Upper Body",
+        "style": "hypertrophy",
+        "cardio": {"type": "Cycling", "distance_km": 8.0, "duration_minutes": 20}
+    },
+    "exercises": [
+        {"name": "Bench Press", "sets": 4, "reps": "8-10", "time_minutes": 12},
+        {"name": "Pull Up", "sets": 3, "reps": "AMRAP"},
+        {"name": "Plank", "sets": 3, "reps": "30-45 sec"},
+        {"name": "Curl", "sets": 3, "reps": 12}
+    ],
+    "time_required_minutes": 60,
+    "diet_rationale": "Surplus for growth",
+    "workout_rationale": "Push/pull balance",
+    "current_weight": 72.5,
+    "workout_intensity": "moderate",
+    "calories_burnt": 420
+}
+
+
+@pytest.fixture
+def stub_llm(monkeypatch):
+    """Offline stub backend, without reading the developer's .env"""
+    monkeypatch.setenv("LLM_BACKEND", "stub")
+    monkeypatch.setattr(llm_backend, "_environment_loaded", True)
+
+
+def test_executor_plan_is_mapped_without_changing_values():
+    normalized = normalize_plan(copy.deepcopy(EXECUTOR_PLAN))
+
+    expected = {
+        "date": "05/03/2024",
+        "user_goal": "muscle_gain",
+        "daily_macros": {"calories": 2800, "protein_g": 170, "carbs_g": 320, "fats_g": 80},
+        "workout_split": "Upper Body",
+        "exercises": [
+            {"name": "Bench Press", "sets": 4, "reps": "8-10"},
+            {"name": "Pull Up", "sets": 3, "reps": "AMRAP"},
+            {"name": "Plank", "sets": 3, "reps": "30-45 sec"},
+            {"name": "Curl", "sets": 3, "reps": 12},
+            {"name": "Cycling", "distance_km": 8.0, "duration_mins": 20}
+        ],
+        "time_required_minutes": 60,
+        "diet_rationale": "Surplus for growth",
+        "workout_rationale": "Push/pull balance",
+        "Current_weight": 72.5,
+        "Workout_Intensity": "moderate",
+        "calories_burnt": 420
+    }
+    assert normalized == expected
+    assert list(normalized) == list(expected)
+
+
+@pytest.mark.parametrize("exercise, error", [
+    ({"name": "Row", "sets": "3-4", "reps": "10"}, "expected a number"),
+    ({"name": "Row", "sets": "three", "reps": "10"}, "expected a number"),
+    ({"name": "Row", "sets": 3, "reps": None}, "expected a number"),
+    ({"name": "Row", "sets": 3}, "cannot classify exercise 'Row'"),
+    ({"name": "Row", "reps": "10"}, "cannot classify exercise 'Row'"),
+])
+def test_unmappable_sets_and_reps_are_rejected(exercise, error):
+    plan = copy.deepcopy(EXECUTOR_PLAN)
+    plan["exercises"].append(exercise)
+
+    with pytest.raises(ValueError, match=error):
+        normalize_plan(plan)
+
+
+def test_missing_weight_is_allowed_but_missing_required_fields_are_not():
+    plan = copy.deepcopy(EXECUTOR_PLAN)
+    del plan["current_weight"]
+    assert normalize_plan(plan)["Current_weight"] is None
+
+    del plan["calories_burnt"]
+    with pytest.raises(ValueError, match="missing calories_burnt"):
+        normalize_plan(plan)
+
+
+def test_llm_fallback_normalizes_ranged_sets(stub_llm):
+    plan = copy.deepcopy(EXECUTOR_PLAN)
+    plan["exercises"][0]["sets"] = "3-4"
+
+    normalized = normalize_plan_with_llm(plan)
+
+    assert normalized["workout_split"] == "Upper Body"
+    assert normalized["Current_weight"] == 72.5
+    assert normalized["exercises"][0] == {"name": "Bench Press", "sets": "3-4", "reps": "8-10"}
+    assert normalized["exercises"][-1] == {"name": "Cycling", "distance_km": 8.0, "duration_mins": 20}
+    for key in tracking_llm.NORMALIZED_PLAN_REQUIRED_KEYS:
+        assert key in normalized
+
+
+def test_store_workout_plan_only_falls_back_when_mapping_fails(monkeypatch, stub_llm):
+    stored, llm_calls = [], []
+    monkeypatch.setattr(tracking_llm, "insert_daily_plan", lambda plan, user_id: stored.append(plan))
+    monkeypatch.setattr(
+        tracking_llm, "normalize_plan_with_llm",
+        lambda plan: llm_calls.append(plan) or normalize_plan_with_llm(plan)
+    )
+
+    store_workout_plan(copy.deepcopy(EXECUTOR_PLAN))
+    assert llm_calls == []
+
+    plan = copy.deepcopy(EXECUTOR_PLAN)
+    del plan["exercises"][1]["reps"]
+    store_workout_plan(plan)
+    assert len(llm_calls) == 1
+    assert stored[-1]["exercises"][1] == {"name": "Pull Up", "sets": 3, "reps": None}
@@ -0,0 +1,44 @@
+import json
+import os
+
+from nutrition_engine import NutritionStore
+
+
+def _write(path, data):
+    path.write_text(json.dumps(data))
+    return str(path)
+
+
+def test_each_store_reads_only_its_own_file(tmp_path):
+    per_100g_path = _write(tmp_path / "nutrition_db.json", {
+        "onion": {"source": "Open Food Facts",
+                  "per_100g": {"calories": 537, "protein": 6.67, "carbs": 51.5, "fats": 33.3}}
+    })
+    per_gram_path = _write(tmp_path / "nutrition_db2.json", {
+        "onion": {"calories_per_gram": 0.4, "protein_g_per_gram": 0.011,
+                  "fat_g_per_gram": 0.001, "carbs_g_per_gram": 0.09},
+        "rice": {"calories_per_gram": 1.3, "protein_g_per_gram": 0.027,
+                 "fat_g_per_gram": 0.003, "carbs_g_per_gram": 0.28}
+    })
+
+    cooking = NutritionStore(per_100g_path, per_100g=True)
+    tracking = NutritionStore(per_gram_path, per_100g=False)
+
+    assert cooking.per_100g("onion") == {"calories": 537, "protein": 6.67, "carbs": 51.5, "fats": 33.3}
+    assert cooking.per_100g("rice") is None
+    assert tracking.per_100g("onion")["calories"] == 40
+
+
+def test_saved_foods_are_served_after_invalidate(tmp_path):
+    path = _write(tmp_path / "nutrition_db.json", {})
+    store = NutritionStore(path, per_100g=True, check_interval_seconds=3600)
+    assert store.per_100g("tomato") is None
+
+    _write(tmp_path / "nutrition_db.json", {
+        "tomato": {"per_100g": {"calories": 18, "protein": 0.9, "carbs": 3.9, "fats": 0.2}}
+    })
+    # Coarse filesystem clocks could otherwise keep the old mtime
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    store.invalidate()
+    assert store.per_100g("tomato") == {"calories": 18, "protein": 0.9, "carbs": 3.9, "fats": 0.2}
@@ -0,0 +1,87 @@
+import copy
+import sqlite3
+from datetime import date, timedelta
+
+from fitness_db import fetch_tracking_context, get_pool, log_set
+from tracking_llm import bulk_insert_daily_plans, insert_daily_plan
+
+PLAN = {
+    "date": "2026-10-12",
+    "user_goal": "fat_loss",
+    "daily_macros": {"calories": 2000, "protein_g": 150, "carbs_g": 200, "fats_g": 60},
+    "workout_split": "Legs",
+    "time_required_minutes": 60,
+    "diet_rationale": "",
+    "workout_rationale": "",
+    "Current_weight": 80,
+    "Workout_Intensity": "moderate",
+    "calories_burnt": 400,
+    "exercises": [
+        {"name": "Squat", "sets": 4, "reps": "8-10"},
+        {"name": "Lunge", "sets": 3, "reps": "12 each side"},
+        {"name": "Run", "distance_km": 3, "duration_mins": 20}
+    ]
+}
+
+
+def _exercises(db_name):
+    return {
+        ex["name"]: ex
+        for ex in fetch_tracking_context(PLAN["date"], db_name=db_name)["workout"]["exercises"]
+    }
+
+
+def test_regenerating_a_day_keeps_logged_sets(db_name):
+    insert_daily_plan(PLAN, db_name=db_name)
+    squat = _exercises(db_name)["Squat"]
+    log_set(squat["exercise_id"], reps=9, db_name=db_name)
+
+    regenerated = copy.deepcopy(PLAN)
+    regenerated["exercises"][0]["reps"] = "6-8"
+    insert_daily_plan(regenerated, db_name=db_name)
+
+    exercises = _exercises(db_name)
+    assert exercises["Squat"]["exercise_id"] == squat["exercise_id"]
+    assert exercises["Squat"]["reps"] == "6-8"
+    assert exercises["Squat"]["planned_reps"] == 28
+
+    with get_pool(db_name).read() as conn:
+        events = conn.execute("SELECT exercise_id, reps FROM set_events").fetchall()
+    assert events == [(squat["exercise_id"], 9)]
+
+    progress = fetch_tracking_context(PLAN["date"], db_name=db_name)["progress"]
+    assert progress["sets_logged"] == 1
+    assert progress["completed_reps"] == 9
+
+
+def test_dropped_exercises_are_kept_only_when_logged(db_name):
+    insert_daily_plan(PLAN, db_name=db_name)
+    run = _exercises(db_name)["Run"]
+    log_set(run["exercise_id"], distance_km=1.5, db_name=db_name)
+
+    regenerated = copy.deepcopy(PLAN)
+    regenerated["exercises"] = [{"name": "Deadlift", "sets": 3, "reps": "5"}]
+    insert_daily_plan(regenerated, db_name=db_name)
+
+    exercises = _exercises(db_name)
+    assert sorted(exercises) == ["Deadlift", "Run"]
+    assert fetch_tracking_context(PLAN["date"], db_name=db_name)["progress"]["distance_km"] == 1.5
+
+
+def test_bulk_ingest_batches_past_the_parameter_limit(db_name):
+    start = date(2026, 1, 1)
+    plans = [
+        dict(copy.deepcopy(PLAN), date=(start + timedelta(days=i)).isoformat())
+        for i in range(600)
+    ]
+    # Behave like an older SQLite build
+    with get_pool(db_name).write() as conn:
+        conn.setlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER, 999)
+
+    summary = bulk_insert_daily_plans(plans, db_name=db_name, batch_size=600)
+    assert summary["plans"] == 600
+
+    # Re-ingesting updates the same rows instead of adding exercises
+    bulk_insert_daily_plans(plans, db_name=db_name, batch_size=600)
+    with get_pool(db_name).read() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM exercises").fetchone()[0] == 600 * 3
@@ -0,0 +1,58 @@
+import pytest
+
+import workout_llm
+from streaming_json import StreamAborted, consume_json_stream
+
+
+def _chunks(text, size=8, read=None):
+    for start in range(0, len(text), size):
+        if read is not None:
+            read.append(start)
+        yield text[start:start + size]
+
+
+def test_complete_object_is_parsed_and_trailing_text_ignored():
+    text = 'Here you go: {"date": "12/10/2026", "note": "a } b", "exercises": []} Enjoy!'
+    received, parsed = consume_json_stream(_chunks(text), ["date", "exercises"])
+    assert parsed == {"date": "12/10/2026", "note": "a } b", "exercises": []}
+    assert received.startswith("Here you go")
+
+
+def test_missing_required_key_aborts_at_the_next_required_key():
+    text = '{"date": "12/10/2026", "exercises": [' + '{"name": "Squat"}, ' * 200 + "]}"
+    read = []
+    with pytest.raises(StreamAborted, match="user_goal"):
+        consume_json_stream(_chunks(text, read=read), ["date", "user_goal", "exercises"])
+    # Aborted right after the "exercises" key, long before the object closes
+    assert len(read) < 10
+
+
+def test_missing_required_key_aborts_when_the_object_closes():
+    with pytest.raises(StreamAborted, match="exercises"):
+        consume_json_stream(_chunks('{"date": "12/10/2026", "extra": 1}'), ["date", "exercises"])
+
+
+def test_nested_keys_do_not_count_as_top_level():
+    with pytest.raises(StreamAborted, match="exercises"):
+        consume_json_stream(
+            _chunks('{"date": "x", "plan": {"exercises": []}}'), ["date", "exercises"]
+        )
+
+
+class _Chat:
+    def __init__(self, text):
+        self.read = []
+        self.text = text
+
+    def send_message(self, prompt, stream=False):
+        return _chunks(self.text, read=self.read)
+
+
+def test_chat_stream_is_read_to_the_end(monkeypatch):
+    monkeypatch.setattr(workout_llm.Config, "STREAM_RESPONSES", True)
+    text = '{"date": "12/10/2026", "user_goal": "fat_loss", "daily_macros": {}, "exercises": []}'
+    chat = _Chat(text + " " * 100)
+
+    response = workout_llm.send_chat_message(chat, "prompt", workout_llm.EXECUTOR_REQUIRED_KEYS)
+    assert response == text
+    assert chat.read[-1] == ((len(chat.text) - 1) // 8) * 8
@@ -0,0 +1,87 @@
+import itertools
+import random
+
+from threshold_engine import THRESHOLD_METRICS, evaluate_thresholds
+
+
+def _reference(goal, m):
+    """
+    The per-goal if/elif chains evaluate_daily_thresholds used before the
+    rule table, with a metric that has no data (None) skipped.
+    """
+    flags, positives = [], []
+
+    def chain(value, branches, otherwise):
+        if value is None:
+            return
+        for matches, kind, name in branches:
+            if matches(value):
+                (flags if kind == "flag" else positives).append(name)
+                return
+        positives.append(otherwise)
+
+    if goal == "fat_loss":
+        chain(m["calorie_deficit"], [(lambda v: v <= 200, "flag", "calorie_deficit_too_low"),
+                                     (lambda v: v >= 700, "flag", "calorie_deficit_too_high")],
+              "calorie_deficit_in_optimal_range")
+        chain(m["protein_deficit"], [(lambda v: v < 0, "flag", "protein_intake_insufficient")],
+              "protein_intake_adequate")
+        chain(m["strength_completion_pct"], [(lambda v: v < 75, "flag", "low_strength_completion")],
+              "strength_training_completed_well")
+        chain(m["cardio_completion_pct"], [(lambda v: v < 70, "flag", "low_cardio_completion")],
+              "cardio_target_met")
+        chain(m["effort_score"], [(lambda v: v < 0.80, "flag", "low_overall_effort")],
+              "good_overall_effort")
+        chain(m["intensity_multiplier"], [(lambda v: v < 0.7, "flag", "training_intensity_low")],
+              "training_intensity_adequate")
+    elif goal == "muscle_gain":
+        chain(m["calorie_deficit"], [(lambda v: v > 0, "flag", "calorie_deficit_present")],
+              "calorie_intake_supports_growth")
+        chain(m["protein_deficit"], [(lambda v: v < 10, "flag", "insufficient_protein_for_growth")],
+              "protein_target_exceeded")
+        chain(m["cardio_completion_pct"], [(lambda v: v < 70, "flag", "low_cardio_completion")],
+              "cardio_target_met")
+        chain(m["strength_completion_pct"], [(lambda v: v < 85, "flag", "low_strength_completion")],
+              "strength_training_executed_well")
+        chain(m["effort_score"], [(lambda v: v < 0.8, "flag", "low_training_effort")],
+              "high_training_effort")
+        chain(m["intensity_multiplier"], [(lambda v: v < 1.0, "flag", "training_intensity_below_target"),
+                                          (lambda v: v > 1.5, "positive", "training_intensity_is_too_easy")],
+              "training_intensity_on_point")
+
+    return {
+        "goal": goal,
+        "status": "needs_adjustment" if flags else "on_track",
+        "flags": flags,
+        "positives": positives
+    }
+
+
+# Values on and around every threshold, plus missing data
+SAMPLES = {
+    "calorie_deficit": [None, -50, 0, 0.5, 200, 201, 699, 700, 900],
+    "protein_deficit": [None, -5, 0, 9.9, 10, 25],
+    "strength_completion_pct": [None, 0, 74.9, 75, 84.9, 85, 100],
+    "cardio_completion_pct": [None, 0, 69.9, 70, 120],
+    "intensity_multiplier": [None, 0.5, 0.7, 0.99, 1.0, 1.5, 1.51, 5.0],
+    "effort_score": [None, 0.2, 0.79, 0.8, 1.2]
+}
+
+
+def test_rule_table_matches_the_original_chains():
+    rng = random.Random(7)
+    rows = [{name: rng.choice(SAMPLES[name]) for name in THRESHOLD_METRICS} for _ in range(2000)]
+    rows.append({name: None for name in THRESHOLD_METRICS})
+
+    for goal, metrics in itertools.product(("fat_loss", "muscle_gain", "maintenance"), rows):
+        assert evaluate_thresholds(goal, metrics) == _reference(goal, metrics), (goal, metrics)
+
+
+def test_missing_metric_is_neither_flagged_nor_positive():
+    metrics = {
+        "calorie_deficit": 400, "protein_deficit": 5, "strength_completion_pct": None,
+        "cardio_completion_pct": 90, "intensity_multiplier": 1.0, "effort_score": 1.0
+    }
+    result = evaluate_thresholds("fat_loss", metrics)
+    assert "strength_training_completed_well" not in result["positives"]
+    assert "low_strength_completion" not in result["flags"]
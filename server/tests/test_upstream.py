@@ -0,0 +1,153 @@
+import threading
+import time
+from concurrent.futures import CancelledError
+
+import pytest
+
+import upstream
+from upstream import RateLimiter, SingleFlight, run_bounded, scoped_rate_limits
+
+
+def test_concurrent_calls_with_one_key_run_once():
+    flight = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        release.wait(5)
+        return {"items": [1]}
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(flight.do("key", fetch)))
+        for _ in range(5)
+    ]
+    for thread in threads:
+        thread.start()
+    while flight.stats()["shared"] < 4:
+        time.sleep(0.001)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert flight.stats() == {"executed": 1, "shared": 4, "in_flight": 0}
+    assert all(result == {"items": [1]} for result in results)
+    # Every caller gets its own object
+    assert len({id(result) for result in results}) == 5
+
+    flight.do("key", fetch)
+    assert len(calls) == 2
+
+
+def test_waiters_get_the_leaders_exception():
+    flight = SingleFlight()
+    release = threading.Event()
+
+    def fail():
+        release.wait(5)
+        raise ValueError("upstream down")
+
+    errors = []
+
+    def call():
+        try:
+            flight.do("key", fail)
+        except ValueError as e:
+            errors.append(str(e))
+
+    threads = [threading.Thread(target=call) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    while flight.stats()["shared"] < 2:
+        time.sleep(0.001)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert errors == ["upstream down"] * 3
+
+
+def test_token_bucket_spaces_calls_after_the_burst():
+    limiter = RateLimiter(rate_per_second=20, burst=2)
+    started = time.monotonic()
+    stamps = []
+    for _ in range(6):
+        limiter.acquire()
+        stamps.append(time.monotonic() - started)
+
+    # Two burst tokens straight away, then one every 50 ms
+    assert stamps[1] < 0.02
+    gaps = [later - earlier for earlier, later in zip(stamps[1:], stamps[2:])]
+    assert all(gap >= 0.04 for gap in gaps)
+    assert stamps[-1] < 0.5
+
+
+def test_scoped_rate_limits_restore_the_previous_limiters():
+    upstream.set_rate_limit("tavily", 2)
+    before = upstream._rate_limiters["tavily"]
+    try:
+        with scoped_rate_limits({"tavily": 50, "example": 5}):
+            assert upstream._rate_limiters["tavily"].rate_per_second == 50
+            assert "example" in upstream._rate_limiters
+        assert upstream._rate_limiters["tavily"] is before
+        assert "example" not in upstream._rate_limiters
+    finally:
+        upstream.set_rate_limit("tavily", None)
+
+
+def _on_error(name, reason):
+    return {"error": f"{name} {reason}"}
+
+
+def test_run_bounded_keeps_task_order_and_reports_failures():
+    def slow():
+        time.sleep(0.5)
+        return "late"
+
+    def boom():
+        raise RuntimeError("bad")
+
+    started = time.monotonic()
+    results = run_bounded(
+        {"slow": slow, "fast": lambda: "ok", "boom": boom},
+        max_workers=3,
+        timeout=0.1,
+        on_error=_on_error
+    )
+
+    assert list(results) == ["slow", "fast", "boom"]
+    assert results["fast"] == "ok"
+    assert results["boom"] == {"error": "boom failed: bad"}
+    assert results["slow"] == {"error": "slow timed out after 0.1s"}
+    # A timed-out task doesn't hold up the caller
+    assert time.monotonic() - started < 0.4
+
+
+def test_run_bounded_timeout_counts_from_when_a_task_starts():
+    def task():
+        time.sleep(0.06)
+        return "done"
+
+    # Two workers, four 60 ms tasks: the second pair starts after ~60 ms
+    results = run_bounded(
+        {str(i): task for i in range(4)}, max_workers=2, timeout=0.1, on_error=_on_error
+    )
+    assert set(results.values()) == {"done"}
+
+
+def test_run_bounded_raises_when_cancelled():
+    cancel = threading.Event()
+    threading.Timer(0.05, cancel.set).start()
+    started = time.monotonic()
+
+    with pytest.raises(CancelledError):
+        run_bounded(
+            {"a": lambda: time.sleep(1), "b": lambda: time.sleep(1)},
+            max_workers=1,
+            timeout=5,
+            on_error=_on_error,
+            cancel_event=cancel
+        )
+    assert time.monotonic() - started < 0.5
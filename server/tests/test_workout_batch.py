@@ -0,0 +1,36 @@
+import io
+import json
+import sys
+
+import workout_llm
+
+
+def _fake_plan(workflow_input, user_id=None):
+    print(f"progress for {user_id}")
+    if workflow_input.get("fail"):
+        raise RuntimeError("generation failed")
+    return {"user": user_id}
+
+
+def test_bad_inputs_go_to_errors_without_stopping_the_batch(monkeypatch, capsys):
+    monkeypatch.setattr(workout_llm, "generate_workout_plan", _fake_plan)
+    output, errors = io.StringIO(), io.StringIO()
+
+    summary = workout_llm.generate_workout_plans_batch(
+        [{"user_id": "a"}, "not an object", {"goal": "muscle_gain"},
+         {"user_id": "b", "fail": True}, {"user_id": "c"}],
+        output,
+        errors,
+        max_workers=2
+    )
+
+    assert summary["succeeded"] == 2
+    assert summary["failed"] == 3
+    plans = sorted(json.loads(line)["user_id"] for line in output.getvalue().splitlines())
+    assert plans == ["a", "c"]
+    failures = [json.loads(line) for line in errors.getvalue().splitlines()]
+    assert [failure["user_id"] for failure in failures] == [1, 2, "b"]
+
+    # Per-user progress is captured, and stdout is put back afterwards
+    assert "progress for" not in capsys.readouterr().out
+    assert not isinstance(sys.stdout, workout_llm._ContextStdout)
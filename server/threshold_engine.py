@@ -0,0 +1,303 @@
+import hashlib
+import json
+import time
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+
+from fitness_db import DEFAULT_DB_NAME, get_pool
+
+# Metric columns, in daily_metrics column order
+THRESHOLD_METRICS = (
+    "calorie_deficit",
+    "protein_deficit",
+    "strength_completion_pct",
+    "cardio_completion_pct",
+    "intensity_multiplier",
+    "effort_score"
+)
+
+# goal -> ordered rules. Each rule is (metric, branches, otherwise): the
+# first branch whose (comparator, threshold) matches emits its (kind, name);
+# if none match, `otherwise` is emitted. Rule order is the order flags and
+# positives are reported in.
+THRESHOLD_RULES: Dict[str, List[Tuple[str, List[Tuple[str, float, str, str]], Tuple[str, str]]]] = {
+    "fat_loss": [
+        ("calorie_deficit", [
+            ("<=", 200, "flag", "calorie_deficit_too_low"),
+            (">=", 700, "flag", "calorie_deficit_too_high")
+        ], ("positive", "calorie_deficit_in_optimal_range")),
+        ("protein_deficit", [
+            ("<", 0, "flag", "protein_intake_insufficient")
+        ], ("positive", "protein_intake_adequate")),
+        ("strength_completion_pct", [
+            ("<", 75, "flag", "low_strength_completion")
+        ], ("positive", "strength_training_completed_well")),
+        ("cardio_completion_pct", [
+            ("<", 70, "flag", "low_cardio_completion")
+        ], ("positive", "cardio_target_met")),
+        ("effort_score", [
+            ("<", 0.80, "flag", "low_overall_effort")
+        ], ("positive", "good_overall_effort")),
+        ("intensity_multiplier", [
+            ("<", 0.7, "flag", "training_intensity_low")
+        ], ("positive", "training_intensity_adequate"))
+    ],
+    "muscle_gain": [
+        ("calorie_deficit", [
+            (">", 0, "flag", "calorie_deficit_present")
+        ], ("positive", "calorie_intake_supports_growth")),
+        ("protein_deficit", [
+            ("<", 10, "flag", "insufficient_protein_for_growth")
+        ], ("positive", "protein_target_exceeded")),
+        ("cardio_completion_pct", [
+            ("<", 70, "flag", "low_cardio_completion")
+        ], ("positive", "cardio_target_met")),
+        ("strength_completion_pct", [
+            ("<", 85, "flag", "low_strength_completion")
+        ], ("positive", "strength_training_executed_well")),
+        ("effort_score", [
+            ("<", 0.8, "flag", "low_training_effort")
+        ], ("positive", "high_training_effort")),
+        ("intensity_multiplier", [
+            ("<", 1.0, "flag", "training_intensity_below_target"),
+            (">", 1.5, "positive", "training_intensity_is_too_easy")
+        ], ("positive", "training_intensity_on_point"))
+    ]
+}
+
+# Bumped when CompiledRules.evaluate changes how the same rules score a day
+# (2: metrics without data get no outcome)
+SCORING_REVISION = 2
+
+# Stored next to every threshold_results row; rows with another version are re-scored
+RULES_VERSION = hashlib.sha256(
+    json.dumps([SCORING_REVISION, THRESHOLD_RULES], sort_keys=True).encode("utf-8")
+).hexdigest()[:12]
+
+_COMPARATORS = {
+    "<": np.less,
+    "<=": np.less_equal,
+    ">": np.greater,
+    ">=": np.greater_equal,
+    "==": np.equal
+}
+
+
+class CompiledRules:
+    """
+    THRESHOLD_RULES compiled to arrays.
+
+    Every outcome gets a bit in its goal's flag or positive vocabulary (in
+    rule order), so a day's result is two integer masks and a whole batch
+    of days is scored with one vectorized pass per rule.
+    """
+
+    def __init__(self, rules: Mapping[str, Sequence[Tuple[str, Sequence[Tuple[str, float, str, str]], Tuple[str, str]]]]):
+        self.goals: List[str] = list(rules)
+        self.flag_vocab: Dict[str, List[str]] = {}
+        self.positive_vocab: Dict[str, List[str]] = {}
+        # goal -> [(metric, [(comparator, threshold)], is_flag[], bit[])]
+        self.compiled: Dict[str, List[Tuple[str, List[Tuple[Any, float]], np.ndarray, np.ndarray]]] = {}
+
+        for goal, goal_rules in rules.items():
+            flags: List[str] = []
+            positives: List[str] = []
+            compiled = []
+            for metric, branches, otherwise in goal_rules:
+                if metric not in THRESHOLD_METRICS:
+                    raise ValueError(f"Unknown threshold metric: {metric}")
+                outcomes = [(kind, name) for _, _, kind, name in branches] + [otherwise]
+                is_flag, bits = [], []
+                for kind, name in outcomes:
+                    vocab = flags if kind == "flag" else positives
+                    if name not in vocab:
+                        vocab.append(name)
+                    is_flag.append(kind == "flag")
+                    bits.append(vocab.index(name))
+                tests = [(_COMPARATORS[comparator], threshold) for comparator, threshold, _, _ in branches]
+                compiled.append((metric, tests, np.array(is_flag), np.array(bits, dtype=np.int64)))
+
+            if max(len(flags), len(positives)) > 63:
+                raise ValueError(f"Too many outcomes for goal {goal} to fit a bitmask")
+            self.flag_vocab[goal] = flags
+            self.positive_vocab[goal] = positives
+            self.compiled[goal] = compiled
+
+    def evaluate(self, goals: Sequence[str], metrics: Mapping[str, Sequence[float]]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Score many days at once.
+
+        Args:
+            goals: Goal per day
+            metrics: THRESHOLD_METRICS name -> values per day
+
+        Returns:
+            (flags_mask, positives_mask) int64 arrays, one entry per day;
+            days with a goal that has no rules get 0 / 0, and a metric
+            without data (None / NaN) adds neither a flag nor a positive
+        """
+        goals = np.asarray(goals, dtype=object)
+        columns = {name: np.asarray(values, dtype=np.float64) for name, values in metrics.items()}
+        flags_mask = np.zeros(len(goals), dtype=np.int64)
+        positives_mask = np.zeros(len(goals), dtype=np.int64)
+
+        for goal, compiled in self.compiled.items():
+            rows = np.flatnonzero(goals == goal)
+            if rows.size == 0:
+                continue
+            for metric, tests, is_flag, bits in compiled:
+                values = columns[metric][rows]
+                # Index of the first matching branch, or len(tests) for "otherwise"
+                outcome = np.select(
+                    [compare(values, threshold) for compare, threshold in tests],
+                    list(range(len(tests))),
+                    default=len(tests)
+                )
+                # NaN fails every comparison and would land on "otherwise"
+                bit_values = np.where(
+                    np.isnan(values), 0, np.left_shift(np.int64(1), bits[outcome])
+                )
+                flags_mask[rows] |= np.where(is_flag[outcome], bit_values, 0)
+                positives_mask[rows] |= np.where(is_flag[outcome], 0, bit_values)
+
+        return flags_mask, positives_mask
+
+    def decode(self, goal: str, flags_mask: int, positives_mask: int) -> Tuple[List[str], List[str]]:
+        """Flag and positive names for one day's masks, in rule order"""
+        flags = [name for bit, name in enumerate(self.flag_vocab.get(goal, [])) if int(flags_mask) >> bit & 1]
+        positives = [name for bit, name in enumerate(self.positive_vocab.get(goal, [])) if int(positives_mask) >> bit & 1]
+        return flags, positives
+
+
+_compiled_rules: Optional[CompiledRules] = None
+
+
+def get_compiled_rules() -> CompiledRules:
+    global _compiled_rules
+    if _compiled_rules is None:
+        _compiled_rules = CompiledRules(THRESHOLD_RULES)
+    return _compiled_rules
+
+
+def evaluate_thresholds(goal: str, metrics: Mapping[str, float]) -> Dict[str, Any]:
+    """
+    Score one day with the rule table.
+
+    Returns:
+        {"goal", "status", "flags", "positives"} as evaluate_daily_thresholds reports them
+    """
+    rules = get_compiled_rules()
+    flags_mask, positives_mask = rules.evaluate([goal], {name: [metrics[name]] for name in THRESHOLD_METRICS})
+    flags, positives = rules.decode(goal, flags_mask[0], positives_mask[0])
+    return {
+        "goal": goal,
+        "status": "needs_adjustment" if flags else "on_track",
+        "flags": flags,
+        "positives": positives
+    }
+
+
+# ============================================================================
+# PERSISTENCE & BACKFILL
+# ============================================================================
+def record_daily_evaluation(
+    plan_id: int,
+    metrics: Mapping[str, float],
+    db_name: str = DEFAULT_DB_NAME
+) -> None:
+    """Store a day's metrics and its scored result under the current rules"""
+    rules = get_compiled_rules()
+    with get_pool(db_name).write() as conn:
+        goal = conn.execute("SELECT user_goal FROM daily_plans WHERE id = ?", (plan_id,)).fetchone()
+        goal = goal[0] if goal else None
+        flags_mask, positives_mask = rules.evaluate([goal], {name: [metrics[name]] for name in THRESHOLD_METRICS})
+
+        conn.execute(f"""
+        INSERT INTO daily_metrics (plan_id, {", ".join(THRESHOLD_METRICS)}, recorded_at)
+        VALUES (?, {", ".join("?" for _ in THRESHOLD_METRICS)}, ?)
+        ON CONFLICT (plan_id) DO UPDATE SET
+            {", ".join(f"{name} = excluded.{name}" for name in THRESHOLD_METRICS)},
+            recorded_at = excluded.recorded_at
+        """, (plan_id, *(metrics[name] for name in THRESHOLD_METRICS), time.time()))
+
+        _upsert_results(conn, [plan_id], flags_mask, positives_mask)
+
+
+def _upsert_results(conn, plan_ids, flags_mask: np.ndarray, positives_mask: np.ndarray) -> None:
+    conn.executemany("""
+    INSERT INTO threshold_results (plan_id, rules_version, status, flags_mask, positives_mask)
+    VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT (plan_id) DO UPDATE SET
+        rules_version = excluded.rules_version,
+        status = excluded.status,
+        flags_mask = excluded.flags_mask,
+        positives_mask = excluded.positives_mask
+    """, zip(
+        plan_ids,
+        [RULES_VERSION] * len(plan_ids),
+        np.where(flags_mask != 0, "needs_adjustment", "on_track").tolist(),
+        flags_mask.tolist(),
+        positives_mask.tolist()
+    ))
+
+
+def backfill_threshold_results(db_name: str = DEFAULT_DB_NAME, chunk_size: int = 10000) -> Dict[str, Any]:
+    """
+    Re-score stored history whose results predate the current THRESHOLD_RULES.
+
+    Streams daily_metrics in plan_id order, chunk by chunk; each chunk is
+    scored in one vectorized pass and written in one transaction. Rows
+    already scored under RULES_VERSION are skipped, so running this after
+    every deploy is cheap when the rules haven't changed.
+
+    Args:
+        db_name: Database filename
+        chunk_size: Days scored per pass / transaction
+
+    Returns:
+        Summary with rescored rows, elapsed seconds and rows per second
+    """
+    pool = get_pool(db_name)
+    rules = get_compiled_rules()
+    query = f"""
+        SELECT m.plan_id, p.user_goal, {", ".join(f"m.{name}" for name in THRESHOLD_METRICS)}
+        FROM daily_metrics m
+        JOIN daily_plans p ON p.id = m.plan_id
+        LEFT JOIN threshold_results r ON r.plan_id = m.plan_id
+        WHERE m.plan_id > ? AND (r.rules_version IS NULL OR r.rules_version != ?)
+        ORDER BY m.plan_id
+        LIMIT ?
+    """
+
+    rescored = 0
+    last_plan_id = -1
+    started = time.monotonic()
+
+    while True:
+        with pool.read() as conn:
+            chunk = conn.execute(query, (last_plan_id, RULES_VERSION, chunk_size)).fetchall()
+        if not chunk:
+            break
+
+        plan_ids, goals, *columns = zip(*chunk)
+        values = np.array(columns, dtype=np.float64)
+        flags_mask, positives_mask = rules.evaluate(
+            goals, dict(zip(THRESHOLD_METRICS, values))
+        )
+
+        with pool.write() as conn:
+            _upsert_results(conn, list(plan_ids), flags_mask, positives_mask)
+
+        rescored += len(chunk)
+        last_plan_id = plan_ids[-1]
+
+    elapsed = time.monotonic() - started
+    summary = {
+        "rules_version": RULES_VERSION,
+        "rescored": rescored,
+        "elapsed_seconds": round(elapsed, 3),
+        "rows_per_second": round(rescored / elapsed, 1) if elapsed > 0 else 0.0
+    }
+    print(f"✓ Threshold backfill: {summary}")
+    return summary
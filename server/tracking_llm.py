@@ -1,21 +1,16 @@
 import os
-from dotenv import load_dotenv
-import google.generativeai as genai
+import time
 
+from upstream import upstream_calls, make_flight_key, acquire_rate_limit
+from streaming_json import consume_json_stream, StreamAborted
+from llm_backend import get_llm_backend
+from fitness_db import (
+    DEFAULT_USER_ID, day_number, ensure_schema, fetch_tracking_context, get_pool, parse_reps_spec
+)
 
-# Load .env file
-load_dotenv()
-
-# Get API key
-api_key = os.getenv("GEMINI_API_KEY3")
-if api_key is None:
-    raise ValueError("GEMINI_API_KEY not found in .env file")
-
-# Configure Gemini
-genai.configure(api_key=api_key)
-
-# Load Gemini model
-model = genai.GenerativeModel("gemini-2.5-flash")
+# LLM backend key (Gemini, or the offline stub with LLM_BACKEND=stub).
+# Models, .env and the nutrition DB are loaded on first use, not at import.
+GEMINI_API_KEY_ENV = "GEMINI_API_KEY"
 
 
 def parse_ingredients(response_text):
@@ -28,77 +23,55 @@ def parse_ingredients(response_text):
 
 import json
 
-def load_nutrition_db(path="nutrition_db2.json"):
-    try:
-        with open(path, "r") as f:
-            data = json.load(f)
-        print("Nutrition DB loaded successfully")
-        return data
-    except json.JSONDecodeError as e:
-        raise ValueError(f"Nutrition DB JSON error: {e}")
-
 def normalize_name(name):
     return name.lower().replace(" ", "_")
 
 def calculate_nutrition(ingredients, weights, nutrition_db):
-    total = {
-        "calories": 0.0,
-        "protein": 0.0,
-        "fat": 0.0,
-        "carbs": 0.0
-    }
-
-    breakdown = {}
+    # NumPy is imported on first use to keep module import cheap
+    from nutrition_engine import NutrientMatrix, matrix_for_per_gram_db, nutrients_to_dict
+    from ingredient_resolver import resolver_for
 
-    for item in ingredients:
-        if item not in nutrition_db:
-            raise ValueError(f"No nutrition data for {item}")
+    if isinstance(nutrition_db, NutrientMatrix):
+        matrix = nutrition_db
+    else:
+        matrix = matrix_for_per_gram_db(nutrition_db)
 
-        w = weights[item]
-        data = nutrition_db[item]
+    # Spelling variants and aliases map onto known rows; unknown names still raise
+    resolver = resolver_for(matrix)
+    rows = [resolver.resolve(item) or item for item in ingredients]
+    totals, per_item = matrix.totals(rows, [weights[item] for item in ingredients])
 
-        calories = w * data["calories_per_gram"]
-        protein = w * data["protein_g_per_gram"]
-        fat = w * data["fat_g_per_gram"]
-        carbs = w * data["carbs_g_per_gram"]
+    breakdown = {
+        item: nutrients_to_dict(row)
+        for item, row in zip(ingredients, per_item)
+    }
 
-        breakdown[item] = {
-            "calories": calories,
-            "protein": protein,
-            "fat": fat,
-            "carbs": carbs
-        }
+    return nutrients_to_dict(totals), breakdown
 
-        total["calories"] += calories
-        total["protein"] += protein
-        total["fat"] += fat
-        total["carbs"] += carbs
-
-    return total, breakdown
-
-nutrition_db = load_nutrition_db()
-
-gemini_output_text = """[
-  "raw_chicken",
-  "rice_raw",
-  "onion",
-  "tomato",
-  "potato",
-  "carrot",
-  "banana",
-  "apple",
-  "egg_whole",
-  "oil_generic",
-  "milk_full_fat",
-  "bread_white"
-]
-"""
+def calculate_nutrition_batch(food_logs, nutrition_db):
+    """
+    Totals for many food logs ({ingredient: grams} each) in one matrix product.
+    Returns one {"calories", "protein", "fat", "carbs"} dict per log.
+    """
+    from nutrition_engine import NutrientMatrix, matrix_for_per_gram_db, nutrients_to_dict
+    from ingredient_resolver import resolver_for
 
-ingredients = parse_ingredients(gemini_output_text)
-ingredients = [normalize_name(i) for i in ingredients]
+    if isinstance(nutrition_db, NutrientMatrix):
+        matrix = nutrition_db
+    else:
+        matrix = matrix_for_per_gram_db(nutrition_db)
 
+    resolver = resolver_for(matrix)
+    resolved_logs = []
+    for log in food_logs:
+        resolved = {}
+        for item, grams in log.items():
+            row = resolver.resolve(item) or item
+            resolved[row] = resolved.get(row, 0.0) + grams
+        resolved_logs.append(resolved)
 
-nutrition_db = load_nutrition_db()
+    totals = matrix.totals_batch(resolved_logs)
+    return [nutrients_to_dict(row) for row in totals]
 
 # weights = get_weights(ingredients)
 
@@ -128,121 +101,245 @@ nutrition_db = load_nutrition_db()
 import sqlite3
 
 def create_database(db_name="fitness.db"):
-    conn = sqlite3.connect(db_name)
-    cursor = conn.cursor()
-    cursor.execute("PRAGMA foreign_keys = ON;")
-
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS daily_plans (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        date TEXT NOT NULL UNIQUE,
-        user_goal TEXT,
-        calories REAL,
-        protein_g REAL,
-        carbs_g REAL,
-        fats_g REAL,
-        workout_split TEXT,
-        time_required_minutes INTEGER,
-        diet_rationale TEXT,
-        workout_rationale TEXT,
-        current_weight REAL,
-        workout_intensity TEXT,
-        calories_to_burn REAL
+    # Tables and indexes are created by the fitness_db schema migrations
+    ensure_schema(db_name)
+
+# create_database()
+
+PLAN_UPSERT_SQL = """
+INSERT INTO daily_plans (
+    user_id, date, user_goal, calories, protein_g, carbs_g, fats_g,
+    workout_split, time_required_minutes,
+    diet_rationale, workout_rationale,
+    current_weight, workout_intensity, calories_to_burn, day_number
+) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (user_id, day_number) DO UPDATE SET
+    date = excluded.date,
+    user_goal = excluded.user_goal,
+    calories = excluded.calories,
+    protein_g = excluded.protein_g,
+    carbs_g = excluded.carbs_g,
+    fats_g = excluded.fats_g,
+    workout_split = excluded.workout_split,
+    time_required_minutes = excluded.time_required_minutes,
+    diet_rationale = excluded.diet_rationale,
+    workout_rationale = excluded.workout_rationale,
+    current_weight = excluded.current_weight,
+    workout_intensity = excluded.workout_intensity,
+    calories_to_burn = excluded.calories_to_burn
+"""
+
+EXERCISE_INSERT_SQL = """
+INSERT INTO exercises (
+    daily_plan_id, name, exercise_type, sets, reps, distance_km, time_minutes,
+    reps_low, reps_high, planned_reps, hold_seconds
+) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+EXERCISE_UPDATE_SQL = """
+UPDATE exercises SET
+    exercise_type = ?, sets = ?, reps = ?, distance_km = ?, time_minutes = ?,
+    reps_low = ?, reps_high = ?, planned_reps = ?, hold_seconds = ?
+WHERE id = ?
+"""
+
+def _plan_row(plan, user_id, day):
+    return (
+        user_id,
+        plan["date"],
+        plan["user_goal"],
+        plan["daily_macros"]["calories"],
+        plan["daily_macros"]["protein_g"],
+        plan["daily_macros"]["carbs_g"],
+        plan["daily_macros"]["fats_g"],
+        plan["workout_split"],
+        plan["time_required_minutes"],
+        plan["diet_rationale"],
+        plan["workout_rationale"],
+        plan["Current_weight"],
+        plan["Workout_Intensity"],
+        plan["calories_burnt"],
+        day
     )
-    """)
-
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS exercises (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        daily_plan_id INTEGER,
-        name TEXT NOT NULL,
-        exercise_type TEXT NOT NULL,   -- 'strength' or 'cardio'
-
-        -- strength fields
-        sets INTEGER,
-        reps TEXT,
-
-        -- cardio fields
-        distance_km REAL,
-        time_minutes TEXT,
-
-        FOREIGN KEY (daily_plan_id)
-            REFERENCES daily_plans(id)
-            ON DELETE CASCADE
+
+def _exercise_rows(daily_plan_id, plan):
+    rows = []
+    for ex in plan["exercises"]:
+
+        # STRENGTH
+        # Rep schemes are parsed once here so reads never re-parse free text
+        if "sets" in ex and "reps" in ex:
+            spec = parse_reps_spec(ex["reps"], ex["sets"])
+            rows.append((
+                daily_plan_id, ex["name"], "strength", ex["sets"], ex["reps"], None, None,
+                spec["reps_low"], spec["reps_high"], spec["planned_reps"], spec["hold_seconds"]
+            ))
+
+        # CARDIO
+        elif "distance_km" in ex:
+            rows.append((
+                daily_plan_id, ex["name"], "cardio", None, None, ex["distance_km"], ex.get("duration_mins"),
+                None, None, None, None
+            ))
+
+    return rows
+
+# Older SQLite builds allow at most 999 bound parameters per statement
+_MAX_LOOKUP_PAIRS = 499
+
+def _upsert_plan_batch(conn, keyed_plans):
+    """
+    Upsert one batch of plans and sync their exercises.
+
+    `keyed_plans` maps (user_id, day_number) -> plan, so each plan appears
+    once per batch. Exercises are matched to the stored ones by (name,
+    occurrence of that name) and updated in place, so their ids, logged
+    sets and progress survive regenerating the day. New exercises are
+    inserted; stored ones the new plan drops are deleted unless sets were
+    already logged against them. Returns the number of exercise rows written.
+    """
+    conn.executemany(
+        PLAN_UPSERT_SQL,
+        [_plan_row(plan, user_id, day) for (user_id, day), plan in keyed_plans.items()]
     )
-    """)
 
-    conn.commit()
-    conn.close()
+    # Resolve plan ids with indexed lookups instead of per-row lastrowid,
+    # chunked to stay under SQLite's bound-parameter limit
+    keys = list(keyed_plans)
+    plan_ids = {}
+    for start in range(0, len(keys), _MAX_LOOKUP_PAIRS):
+        chunk = keys[start:start + _MAX_LOOKUP_PAIRS]
+        placeholders = ", ".join(["(?, ?)"] * len(chunk))
+        for plan_id, user_id, day in conn.execute(
+            f"SELECT id, user_id, day_number FROM daily_plans "
+            f"WHERE (user_id, day_number) IN (VALUES {placeholders})",
+            [value for key in chunk for value in key]
+        ):
+            plan_ids[(user_id, day)] = plan_id
+
+    # Stored exercises per plan, in plan order, with whether sets were logged
+    stored = {}
+    ids = list(plan_ids.values())
+    for start in range(0, len(ids), _MAX_LOOKUP_PAIRS):
+        chunk = ids[start:start + _MAX_LOOKUP_PAIRS]
+        placeholders = ", ".join(["?"] * len(chunk))
+        for exercise_id, plan_id, name, logged in conn.execute(
+            f"SELECT e.id, e.daily_plan_id, e.name, "
+            f"EXISTS (SELECT 1 FROM exercise_progress ep WHERE ep.exercise_id = e.id) "
+            f"FROM exercises e WHERE e.daily_plan_id IN ({placeholders}) "
+            f"ORDER BY e.daily_plan_id, e.id",
+            chunk
+        ):
+            stored.setdefault(plan_id, {}).setdefault(name, []).append((exercise_id, logged))
+
+    inserts, updates, deletes, refresh = [], [], [], []
+    for key, plan in keyed_plans.items():
+        by_name = stored.get(plan_ids[key], {})
+        for row in _exercise_rows(plan_ids[key], plan):
+            matches = by_name.get(row[1])
+            if matches:
+                exercise_id, logged = matches.pop(0)
+                updates.append(row[2:] + (exercise_id,))
+                if logged:
+                    refresh.append((exercise_id,))
+            else:
+                inserts.append(row)
+        deletes.extend(
+            (exercise_id,)
+            for matches in by_name.values()
+            for exercise_id, logged in matches
+            if not logged
+        )
 
-# create_database()
+    conn.executemany("DELETE FROM exercises WHERE id = ?", deletes)
+    conn.executemany(EXERCISE_UPDATE_SQL, updates)
+    conn.executemany(EXERCISE_INSERT_SQL, inserts)
+    # Cardio completion is measured against the planned distance
+    conn.executemany("""
+    UPDATE exercise_progress
+    SET planned_distance_km = (SELECT distance_km FROM exercises WHERE id = exercise_id)
+    WHERE exercise_id = ?
+    """, refresh)
 
-def insert_daily_plan(plan, db_name="fitness.db"):
-    try:
-        conn = sqlite3.connect(db_name)
-        cursor = conn.cursor()
-        cursor.execute("PRAGMA foreign_keys = ON;")
-
-        cursor.execute("""
-        INSERT INTO daily_plans (
-            date, user_goal, calories, protein_g, carbs_g, fats_g,
-            workout_split, time_required_minutes,
-            diet_rationale, workout_rationale,
-            current_weight, workout_intensity, calories_to_burn
-        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (
-            plan["date"],
-            plan["user_goal"],
-            plan["daily_macros"]["calories"],
-            plan["daily_macros"]["protein_g"],
-            plan["daily_macros"]["carbs_g"],
-            plan["daily_macros"]["fats_g"],
-            plan["workout_split"],
-            plan["time_required_minutes"],
-            plan["diet_rationale"],
-            plan["workout_rationale"],
-            plan["Current_weight"],
-            plan["Workout_Intensity"],
-            plan["calories_burnt"]
-        ))
-
-        daily_plan_id = cursor.lastrowid
-
-        for ex in plan["exercises"]:
-
-            # STRENGTH
-            if "sets" in ex and "reps" in ex:
-                cursor.execute("""
-                INSERT INTO exercises (
-                    daily_plan_id, name, exercise_type, sets, reps
-                ) VALUES (?, ?, 'strength', ?, ?)
-                """, (
-                    daily_plan_id,
-                    ex["name"],
-                    ex["sets"],
-                    ex["reps"]
-                ))
-
-            # CARDIO
-            elif "distance_km" in ex:
-                cursor.execute("""
-                INSERT INTO exercises (
-                    daily_plan_id, name, exercise_type, distance_km, time_minutes
-                ) VALUES (?, ?, 'cardio', ?, ?)
-                """, (
-                    daily_plan_id,
-                    ex["name"],
-                    ex["distance_km"],
-                    ex.get("duration_mins")
-                ))
-
-        conn.commit()
-
-    except sqlite3.IntegrityError:
-        print(f"⚠️ Workout already exists for date {plan['date']}")
-
-    finally:
-        conn.close()
+    return len(updates) + len(inserts)
+
+def bulk_insert_daily_plans(plans, db_name="fitness.db", user_id=DEFAULT_USER_ID, batch_size=500):
+    """
+    Ingest many normalized plans with batched, upserting transactions.
+
+    A plan for a (user, day) that already exists is updated in place, and
+    its exercises are synced by name and occurrence like insert_daily_plan:
+    matching ones are updated (keeping their logged sets), new ones
+    inserted, and dropped ones deleted unless sets were logged against
+    them. Plans whose date can't be parsed are skipped.
+
+    Args:
+        plans: Iterable of normalized plans (insert_daily_plan schema); a plan
+            may carry its own "user_id", otherwise `user_id` is used
+        db_name: Database filename
+        user_id: Default owner of the plans
+        batch_size: Plans per transaction
+
+    Returns:
+        Summary with plans/exercises written, skipped plans, elapsed seconds
+        and rows per second
+    """
+    pool = get_pool(db_name)
+    written_plans = 0
+    written_exercises = 0
+    skipped = 0
+    started = time.monotonic()
+
+    def flush(batch):
+        nonlocal written_plans, written_exercises
+        with pool.write() as conn:
+            written_exercises += _upsert_plan_batch(conn, batch)
+        written_plans += len(batch)
+
+    batch = {}
+    for plan in plans:
+        day = day_number(plan.get("date"))
+        if day is None:
+            skipped += 1
+            print(f"⚠️ Skipping plan with unparseable date {plan.get('date')!r}")
+            continue
+
+        # Later plans for the same user and day win, as they would row by row
+        batch[(str(plan.get("user_id", user_id)), day)] = plan
+        if len(batch) >= batch_size:
+            flush(batch)
+            batch = {}
+
+    if batch:
+        flush(batch)
+
+    elapsed = time.monotonic() - started
+    rows = written_plans + written_exercises
+    summary = {
+        "plans": written_plans,
+        "exercises": written_exercises,
+        "skipped": skipped,
+        "elapsed_seconds": round(elapsed, 3),
+        "rows_per_second": round(rows / elapsed, 1) if elapsed > 0 else 0.0
+    }
+    print(f"✓ Ingested plans: {summary}")
+    return summary
+
+def insert_daily_plan(plan, db_name="fitness.db", user_id=DEFAULT_USER_ID):
+    """
+    Insert or update one user's plan for its day.
+
+    Plans are keyed by (user, day_number), so the date must be in one of
+    fitness_db.PLAN_DATE_FORMATS; an unparseable date raises ValueError
+    instead of storing a plan no day lookup could find. Exercises are synced
+    by name and occurrence, keeping the ids and logged sets of matches.
+    """
+    day = day_number(plan["date"])
+    if day is None:
+        raise ValueError(f"Unparseable plan date: {plan['date']!r}")
+
+    with get_pool(db_name).write() as conn:
+        _upsert_plan_batch(conn, {(user_id, day): plan})
 
 from datetime import date
 
@@ -298,21 +395,27 @@ REQUIRED OUTPUT FORMAT:
 import os
 import json
 import re
-from dotenv import load_dotenv
-import google.generativeai as genai
 
-# Load env
-load_dotenv()
+MODEL_NAME = "gemma-3-27b-it"
 
-api_key = os.getenv("GEMINI_API_KEY")
-if not api_key:
-    raise ValueError("GEMINI_API_KEY not found")
 
-# Configure Gemini (OLD SDK)
-genai.configure(api_key=api_key)
+def get_normalization_model():
+    return get_llm_backend(GEMINI_API_KEY_ENV).model(model_name=MODEL_NAME)
 
-MODEL_NAME = "gemma-3-27b-it"
-model = genai.GenerativeModel(model_name=MODEL_NAME)
+# Stream LLM responses and abort malformed ones early
+STREAM_RESPONSES = True
+NORMALIZATION_MAX_RETRIES = 2
+
+NORMALIZED_PLAN_REQUIRED_KEYS = [
+    "date",
+    "user_goal",
+    "daily_macros",
+    "workout_split",
+    "exercises",
+    "Current_weight",
+    "Workout_Intensity",
+    "calories_burnt"
+]
 
 def extract_json(text: str) -> dict:
     """
@@ -324,7 +427,136 @@ def extract_json(text: str) -> dict:
 
     return json.loads(match.group())
 
+# ============================================================================
+# DETERMINISTIC NORMALIZATION
+# ============================================================================
+def _as_text(value):
+    if not isinstance(value, str):
+        raise ValueError(f"expected a string, got {type(value).__name__}")
+    return value
+
+def _as_number(value):
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise ValueError(f"expected a number, got {value!r}")
+    return value
+
+def _as_optional_number(value):
+    return None if value is None else _as_number(value)
+
+def _as_macros(value):
+    if not isinstance(value, dict):
+        raise ValueError("daily_macros must be an object")
+    macros = {}
+    for key, aliases in (
+        ("calories", ("calories", "kcal")),
+        ("protein_g", ("protein_g", "protein")),
+        ("carbs_g", ("carbs_g", "carbs")),
+        ("fats_g", ("fats_g", "fat_g", "fats", "fat"))
+    ):
+        macros[key] = _as_number(_pick(value, aliases, f"daily_macros.{key}"))
+    return macros
+
+def _as_split_name(value):
+    if isinstance(value, dict):
+        return _as_text(value.get("name"))
+    return _as_text(value)
+
+def _pick(source, aliases, field, required=True):
+    for key in aliases:
+        if key in source:
+            return source[key]
+    if required:
+        raise ValueError(f"missing {field}")
+    return None
+
+# Normalized field -> (accepted source keys, coercion, required), in output order.
+# "exercises" is assembled separately since cardio lives in workout_split.
+NORMALIZED_PLAN_FIELDS = {
+    "date": (("date",), _as_text, True),
+    "user_goal": (("user_goal", "goal"), _as_text, True),
+    "daily_macros": (("daily_macros",), _as_macros, True),
+    "workout_split": (("workout_split",), _as_split_name, True),
+    "time_required_minutes": (("time_required_minutes",), _as_number, True),
+    "diet_rationale": (("diet_rationale",), _as_text, True),
+    "workout_rationale": (("workout_rationale",), _as_text, True),
+    "Current_weight": (("Current_weight", "current_weight"), _as_optional_number, False),
+    "Workout_Intensity": (("Workout_Intensity", "workout_intensity"), _as_text, True),
+    "calories_burnt": (("calories_burnt",), _as_number, True)
+}
+
+def _normalize_cardio(cardio):
+    name = cardio.get("name") or cardio.get("type")
+    return {
+        "name": _as_text(name),
+        "distance_km": _as_optional_number(cardio.get("distance_km")),
+        "duration_mins": _as_optional_number(
+            cardio.get("duration_mins", cardio.get("duration_minutes", cardio.get("time_minutes")))
+        )
+    }
+
+def _normalize_exercises(raw_plan):
+    exercises = raw_plan.get("exercises")
+    if not isinstance(exercises, list):
+        raise ValueError("exercises must be a list")
+
+    normalized = []
+    for ex in exercises:
+        if not isinstance(ex, dict):
+            raise ValueError("exercise entries must be objects")
+        if "sets" in ex and "reps" in ex:
+            normalized.append({
+                "name": _as_text(ex.get("name")),
+                "sets": _as_number(ex["sets"]),
+                "reps": ex["reps"] if isinstance(ex["reps"], str) else _as_number(ex["reps"])
+            })
+        elif "distance_km" in ex or "duration_mins" in ex or "duration_minutes" in ex:
+            normalized.append(_normalize_cardio(ex))
+        else:
+            raise ValueError(f"cannot classify exercise {ex.get('name')!r}")
+
+    split = raw_plan.get("workout_split")
+    if isinstance(split, dict) and split.get("cardio"):
+        normalized.append(_normalize_cardio(split["cardio"]))
+
+    return normalized
+
+def normalize_plan(raw_plan: dict) -> dict:
+    """
+    Map executor output onto the insert_daily_plan schema without an LLM.
+
+    Same contract as FORMAT_NORMALIZATION_SYSTEM_PROMPT: workout_split is
+    flattened to its name, the split's cardio becomes a
+    {name, distance_km, duration_mins} exercise, weight and intensity are
+    renamed, and no value is invented or changed.
+
+    Raises:
+        ValueError: If the plan has a shape this mapping doesn't cover
+    """
+    if not isinstance(raw_plan, dict):
+        raise ValueError("plan must be an object")
+
+    normalized = {}
+    for field, (aliases, coerce, required) in NORMALIZED_PLAN_FIELDS.items():
+        value = _pick(raw_plan, aliases, field, required)
+        try:
+            normalized[field] = coerce(value)
+        except ValueError as e:
+            raise ValueError(f"{field}: {e}")
+
+        if field == "workout_split":
+            normalized["exercises"] = _normalize_exercises(raw_plan)
+
+    return normalized
+
 def normalize_plan_with_llm(raw_plan: dict) -> dict:
+    # Deterministic (temperature 0): identical plans in flight share one call
+    return upstream_calls.do(
+        make_flight_key("gemini:normalize", raw_plan),
+        _normalize_plan_with_llm,
+        raw_plan
+    )
+
+def _normalize_plan_with_llm(raw_plan: dict) -> dict:
     prompt = f"""
 {FORMAT_NORMALIZATION_SYSTEM_PROMPT}
 
@@ -336,7 +568,27 @@ INPUT DATA:
 {json.dumps(raw_plan)}
 """
 
-    response = model.generate_content(
+    if STREAM_RESPONSES:
+        for attempt in range(1, NORMALIZATION_MAX_RETRIES + 1):
+            acquire_rate_limit("gemini")
+            try:
+                _, normalized = consume_json_stream(
+                    get_normalization_model().generate_content(
+                        prompt,
+                        generation_config={
+                            "temperature": 0.0
+                        },
+                        stream=True
+                    ),
+                    NORMALIZED_PLAN_REQUIRED_KEYS
+                )
+                return normalized
+            except StreamAborted as e:
+                if attempt == NORMALIZATION_MAX_RETRIES:
+                    raise ValueError(f"Normalization LLM output rejected: {e.reason}")
+
+    acquire_rate_limit("gemini")
+    response = get_normalization_model().generate_content(
         prompt,
         generation_config={
             "temperature": 0.0
@@ -442,44 +694,12 @@ from datetime import datetime
 import sqlite3
 from datetime import datetime
 
-def fetch_targets_for_today(db_name="fitness.db"):
-    today = datetime.now().strftime("%d/%m/%y")
-
-    conn = sqlite3.connect(db_name)
-    cursor = conn.cursor()
-
-    cursor.execute("""
-        SELECT
-            calories,
-            protein_g,
-            carbs_g,
-            fats_g,
-            calories_to_burn,
-            time_required_minutes,
-            workout_intensity
-        FROM daily_plans
-        WHERE date = ?
-    """, (today,))
-
-    row = cursor.fetchone()
-    conn.close()
-
-    if not row:
+def fetch_targets_for_today(db_name="fitness.db", user_id=DEFAULT_USER_ID):
+    context = fetch_tracking_context(db_name=db_name, user_id=user_id)
+    if not context:
         return None
 
-    return {
-        "required_macros": {
-            "calories": row[0],
-            "protein": row[1],
-            "carbs": row[2],
-            "fat": row[3]
-        },
-        "workout": {
-            "calories_burnt": row[4],
-            "time_required_minutes": row[5],
-            "intensity": row[6]
-        }
-    }
+    return context["targets"]
 
 def calculate_daily_deficits(required, consumed):
     """
@@ -528,75 +748,16 @@ def calculate_daily_deficits(required, consumed):
 import sqlite3
 from datetime import datetime
 
-def fetch_workout_for_today(db_name="fitness.db"):
-    today = datetime.now().strftime("%d/%m/%y")
-
-    conn = sqlite3.connect(db_name)
-    cursor = conn.cursor()
-
-    # Fetch today's plan
-    cursor.execute("""
-        SELECT id, time_required_minutes, workout_intensity, calories_to_burn
-        FROM daily_plans
-        WHERE date = ?
-    """, (today,))
-
-    plan = cursor.fetchone()
-    if not plan:
-        conn.close()
+def fetch_workout_for_today(db_name="fitness.db", user_id=DEFAULT_USER_ID):
+    context = fetch_tracking_context(db_name=db_name, user_id=user_id)
+    if not context:
         return None
 
-    daily_plan_id, planned_time, intensity, calories_burnt = plan
-
-    # Fetch exercises (NEW SCHEMA)
-    cursor.execute("""
-        SELECT
-            name,
-            exercise_type,
-            sets,
-            reps,
-            distance_km,
-            time_minutes
-        FROM exercises
-        WHERE daily_plan_id = ?
-    """, (daily_plan_id,))
-
-    rows = cursor.fetchall()
-    conn.close()
-
-    exercises = []
-
-    for row in rows:
-        name, ex_type, sets, reps, dist, time = row
-
-        if ex_type == "strength":
-            exercises.append({
-                "name": name,
-                "exercise_type": "strength",
-                "sets": sets,
-                "reps": reps
-            })
-
-        elif ex_type == "cardio":
-            exercises.append({
-                "name": name,
-                "exercise_type": "cardio",
-                "distance_km": dist,
-                "time_minutes": time
-            })
-
-    return {
-        "planned_time": planned_time,
-        "planned_intensity": intensity,
-        "calories_burnt": calories_burnt,
-        "exercises": exercises
-    }
+    return context["workout"]
 
 def parse_reps(reps_str):
-    if "-" in reps_str:
-        low, high = reps_str.split("-")
-        return int((int(low) + int(high)) / 2)  # average
-    return int(reps_str)
+    # Reps per set ("8-10" -> 9); 0 for holds, AMRAP and anything unparseable
+    return parse_reps_spec(reps_str, 1)["planned_reps"] or 0
 
 def calculate_planned_reps(exercises):
     total = 0
@@ -604,8 +765,11 @@ def calculate_planned_reps(exercises):
     for ex in exercises:
         # Only strength exercises have reps
         if ex.get("exercise_type") == "strength":
-            reps_per_set = parse_reps(ex["reps"])
-            total += ex["sets"] * reps_per_set
+            # Stored plans carry planned_reps parsed at write time
+            if ex.get("planned_reps") is not None:
+                total += ex["planned_reps"]
+            elif "planned_reps" not in ex:
+                total += (parse_reps_spec(ex["reps"], ex["sets"])["planned_reps"] or 0)
 
     return total
 
@@ -691,7 +855,8 @@ def calculate_workout_effort_with_cardio(
     strength_completed_reps,
     planned_time,
     actual_time,
-    cardio_data
+    cardio_data=None,
+    cardio_completion=None
 ):
     # Strength completion
     if strength_planned_reps > 0:
@@ -701,15 +866,18 @@ def calculate_workout_effort_with_cardio(
     else:
         strength_completion = 1.0
 
-    # Cardio completion
-    cardio_completion = calculate_cardio_completion(cardio_data)
+    # Cardio completion (precomputed when it comes from logged sets)
+    if cardio_completion is None:
+        cardio_completion = calculate_cardio_completion(cardio_data)
 
     # Combine (simple average for now)
     completion_ratio = (strength_completion + cardio_completion) / 2
 
-    # Time-based intensity
-    time_ratio = planned_time / actual_time
-    intensity_multiplier = max(0, time_ratio)
+    # Time-based intensity (neutral when either time is unknown)
+    if planned_time and actual_time:
+        intensity_multiplier = max(0, planned_time / actual_time)
+    else:
+        intensity_multiplier = 1.0
 
     effort_score = completion_ratio * intensity_multiplier
 
@@ -720,10 +888,46 @@ def calculate_workout_effort_with_cardio(
         "effort_score": round(effort_score, 3)
     }
 
-workout = fetch_workout_for_today()
+def summarize_logged_workout(workout, progress):
+    """
+    Effort inputs from the running totals of streamed sets.
+
+    Args:
+        workout: "workout" section of the tracking context
+        progress: "progress" section of the tracking context
 
-if not workout:
-    print("❌ No workout found for today")
+    Returns:
+        {"planned_reps", "completed_reps", "actual_time", "cardio_completion"}
+        ready for calculate_workout_effort_with_cardio
+    """
+    cardio_planned = sum(1 for ex in workout["exercises"] if ex["exercise_type"] == "cardio")
+
+    # Wall-clock time from the first to the last set (it includes rest, which
+    # the planned time does too); summed set durations only without a span
+    first_event_at, last_event_at = progress["first_event_at"], progress["last_event_at"]
+    if first_event_at is not None and last_event_at is not None and last_event_at > first_event_at:
+        actual_time = (last_event_at - first_event_at) / 60
+    elif progress["active_seconds"] > 0:
+        actual_time = progress["active_seconds"] / 60
+    else:
+        actual_time = workout["planned_time"]
+
+    return {
+        "planned_reps": calculate_planned_reps(workout["exercises"]),
+        # Reps logged against cardio exercises aren't strength volume
+        "completed_reps": sum(
+            ex.get("completed_reps", 0)
+            for ex in workout["exercises"] if ex["exercise_type"] == "strength"
+        ),
+        "actual_time": actual_time,
+        # Cardio exercises with nothing logged count as 0, none planned is neutral
+        "cardio_completion": progress["cardio_ratio_sum"] / cardio_planned if cardio_planned else 1.0
+    }
+
+# workout = fetch_workout_for_today()
+
+# if not workout:
+#     print("❌ No workout found for today")
 
 
 # print("\n📋 TODAY'S WORKOUT")
@@ -739,7 +943,7 @@ if not workout:
 #         print(f" - {ex['name']}: {ex['distance_km']} km (time {ex.get('duration_mins', 'N/A')})")
 
 
-planned_reps = calculate_planned_reps(workout["exercises"])
+# planned_reps = calculate_planned_reps(workout["exercises"])
 
 # user_input = get_user_workout_input_per_exercise(
 #     workout["exercises"],
@@ -774,104 +978,17 @@ def evaluate_daily_thresholds(
     intensity_multiplier,
     effort_score
 ):
-    results = {
-        "goal": user_goal,
-        "status": "on_track",
-        "flags": [],              # things that need attention
-        "positives": [],          # things that went well
-        "metrics": {}
-    }
-
-    # =======================
-    # FAT LOSS
-    # =======================
-    if user_goal == "fat_loss":
-
-        # ---- Calorie deficit ----
-        if calorie_deficit <= 200:
-            results["flags"].append("calorie_deficit_too_low")
-        elif calorie_deficit >= 700:
-            results["flags"].append("calorie_deficit_too_high")
-        else:
-            results["positives"].append("calorie_deficit_in_optimal_range")
-
-        # ---- Protein ----
-        if macro_deficits["protein"] < 0:
-            results["flags"].append("protein_intake_insufficient")
-        else:
-            results["positives"].append("protein_intake_adequate")
+    # Rules live in threshold_engine.THRESHOLD_RULES (NumPy is imported on first use)
+    from threshold_engine import evaluate_thresholds
 
-        # ---- Strength ----
-        if strength_completion_pct < 75:
-            results["flags"].append("low_strength_completion")
-        else:
-            results["positives"].append("strength_training_completed_well")
-
-        # ---- Cardio ----
-        if cardio_completion_pct < 70:
-            results["flags"].append("low_cardio_completion")
-        else:
-            results["positives"].append("cardio_target_met")
-
-        # ---- Effort ----
-        if effort_score < 0.80:
-            results["flags"].append("low_overall_effort")
-        else:
-            results["positives"].append("good_overall_effort")
-
-        # ---- Intensity ----
-        if intensity_multiplier < 0.7:
-            results["flags"].append("training_intensity_low")
-        else:
-            results["positives"].append("training_intensity_adequate")
-
-    # =======================
-    # MUSCLE GAIN
-    # =======================
-    elif user_goal == "muscle_gain":
-
-        # ---- Calories ----
-        if calorie_deficit > 0:
-            results["flags"].append("calorie_deficit_present")
-        else:
-            results["positives"].append("calorie_intake_supports_growth")
-
-        # ---- Protein ----
-        if macro_deficits["protein"] < 10:
-            results["flags"].append("insufficient_protein_for_growth")
-        else:
-            results["positives"].append("protein_target_exceeded")
-         # ---- Cardio ----
-        if cardio_completion_pct < 70:
-            results["flags"].append("low_cardio_completion")
-        else:
-            results["positives"].append("cardio_target_met")
-
-        # ---- Strength ----
-        if strength_completion_pct < 85:
-            results["flags"].append("low_strength_completion")
-        else:
-            results["positives"].append("strength_training_executed_well")
-
-        # ---- Effort ----
-        if effort_score < 0.8:
-            results["flags"].append("low_training_effort")
-        else:
-            results["positives"].append("high_training_effort")
-
-        # ---- Intensity ----
-        if intensity_multiplier < 1.0:
-            results["flags"].append("training_intensity_below_target")
-        elif intensity_multiplier > 1.5:
-            results["positives"].append("training_intensity_is_too_easy")
-        else:
-            results["positives"].append("training_intensity_on_point")
-
-    # =======================
-    # FINAL STATUS
-    # =======================
-    if results["flags"]:
-        results["status"] = "needs_adjustment"
+    results = evaluate_thresholds(user_goal, {
+        "calorie_deficit": calorie_deficit,
+        "protein_deficit": macro_deficits["protein"],
+        "strength_completion_pct": strength_completion_pct,
+        "cardio_completion_pct": cardio_completion_pct,
+        "intensity_multiplier": intensity_multiplier,
+        "effort_score": effort_score
+    })
 
     # =======================
     # METRICS SNAPSHOT
@@ -890,28 +1007,15 @@ def evaluate_daily_thresholds(
 import sqlite3
 from datetime import datetime
 
-def fetch_user_goal_for_today(db_name="fitness.db"):
-    today = datetime.now().strftime("%d/%m/%y")
-
-    conn = sqlite3.connect(db_name)
-    cursor = conn.cursor()
-
-    cursor.execute("""
-        SELECT user_goal
-        FROM daily_plans
-        WHERE date = ?
-    """, (today,))
-
-    row = cursor.fetchone()
-    conn.close()
-
-    if not row:
+def fetch_user_goal_for_today(db_name="fitness.db", user_id=DEFAULT_USER_ID):
+    context = fetch_tracking_context(db_name=db_name, user_id=user_id)
+    if not context:
         return None
 
-    return row[0]   # 'fat_loss' or 'muscle_gain'
+    return context["goal"]   # 'fat_loss' or 'muscle_gain'
 
 # Fetch goal from DB
-user_goal = fetch_user_goal_for_today()
+# user_goal = fetch_user_goal_for_today()
 
 # if not user_goal:
 #     print("❌ Could not fetch user goal for today")
@@ -945,16 +1049,11 @@ user_goal = fetch_user_goal_for_today()
 import os
 import json
 import re
-from dotenv import load_dotenv
-import google.generativeai as genai
-
-# Load environment variables
-load_dotenv()
 
-genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
 
-# Use a fast, reliable model
-tracker_model = genai.GenerativeModel("gemma-3-27b-it")
+def get_tracker_model():
+    # Use a fast, reliable model
+    return get_llm_backend(GEMINI_API_KEY_ENV).model("gemma-3-27b-it")
 
 WORKOUT_ADJUSTMENT_SYSTEM_PROMPT = """
 You are a Workout Adjustment & Summary Agent in a fitness optimization system.
@@ -996,16 +1095,192 @@ You are NOT a planner.
 You are a structured interpreter and adjustment summarizer.
 """
 
+import hashlib
+import uuid
+
+from kv_cache import PersistentCache
+
+# Adjustment reports depend on (goal, flags, positives, intensity) plus the
+# rough size of each metric, so reports are cached per signature and reused
+# with the current metrics refilled into their fields by name.
+ADJUSTMENT_CACHE_DB_NAME = "search_cache.db"
+ADJUSTMENT_CACHE_TTL_SECONDS = 30 * 24 * 3600
+ADJUSTMENT_CACHE_MAX_ENTRIES = 2000
+
+# Bucket width per tracker metric in the cache signature. The flags and
+# positives already carry every threshold crossing, so the buckets only
+# need to tell a near miss from a large one.
+ADJUSTMENT_METRIC_BUCKETS = {
+    "calorie_deficit": 250,
+    "protein_deficit": 25,
+    "strength_completion_pct": 25,
+    "cardio_completion_pct": 25,
+    "intensity_multiplier": 0.25,
+    "effort_score": 0.25
+}
+
+# Cached reports are invalidated whenever the prompt changes
+ADJUSTMENT_PROMPT_VERSION = hashlib.sha256(
+    WORKOUT_ADJUSTMENT_SYSTEM_PROMPT.encode("utf-8")
+).hexdigest()[:12]
+
+adjustment_cache = PersistentCache(
+    ADJUSTMENT_CACHE_DB_NAME,
+    table="workout_adjustments",
+    ttl_seconds=ADJUSTMENT_CACHE_TTL_SECONDS,
+    max_entries=ADJUSTMENT_CACHE_MAX_ENTRIES
+)
+
+# Stands in for a metric-named field in a cached report template
+_METRIC_MARKER = "$metric"
+
+# Bumped when the template format changes, so old entries are never read
+ADJUSTMENT_TEMPLATE_FORMAT = 3
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and value == value
+
+def metric_bucket(name, value):
+    """Round a tracker metric to its ADJUSTMENT_METRIC_BUCKETS width (as a bucket index), or None if not numeric"""
+    width = ADJUSTMENT_METRIC_BUCKETS.get(name)
+    if width is None or not _is_number(value):
+        return None
+    return int(round(value / width))
+
+def adjustment_signature(tracker_decision_json):
+    """Cache key for a tracker decision: goal, sorted flags/positives, intensity, metric buckets"""
+    metrics = tracker_decision_json.get("Metrics", {}) or {}
+    return "|".join([
+        ADJUSTMENT_PROMPT_VERSION,
+        str(ADJUSTMENT_TEMPLATE_FORMAT),
+        str(tracker_decision_json.get("goal")),
+        str(tracker_decision_json.get("status")),
+        ",".join(sorted(tracker_decision_json.get("Negatives", []))),
+        ",".join(sorted(tracker_decision_json.get("Positives", []))),
+        str(tracker_decision_json.get("Intensity")),
+        ",".join(
+            f"{name}={metric_bucket(name, metrics.get(name))}"
+            for name in sorted(ADJUSTMENT_METRIC_BUCKETS)
+        )
+    ])
+
+# A standalone number in prose: not part of a word, a longer number, a
+# date ("2026-10-12", "12/10") or a range ("10-12")
+_PROSE_NUMBER = re.compile(r"(?<![\w./-])-?\d+(?:\.(\d+))?(?![\w/]|[.-]\d)")
+
+def _mentions_metric(text, values):
+    """True if `text` quotes one of `values`, to the precision it is written with"""
+    for match in _PROSE_NUMBER.finditer(text):
+        number = float(match.group(0))
+        decimals = len(match.group(1) or "")
+        # Small whole numbers ("3 sets") are too common to tell apart from metrics
+        if decimals == 0 and abs(number) < 10:
+            continue
+        tolerance = 0.5 * 10 ** -decimals
+        if any(abs(value - number) <= tolerance for value in values):
+            return True
+    return False
+
+class _NotReusable(Exception):
+    pass
+
+def make_adjustment_template(report, metrics):
+    """
+    Turn a report into a reusable template, or None if it can't be reused.
+
+    Fields named after a metric (at any depth, e.g. metrics_reference.*)
+    store that metric's name and are refilled from it when rendered.
+    Nothing else is rewritten: a report that quotes one of this user's
+    metric values anywhere else (a number in prose, or under another key)
+    is specific to them and isn't cached.
+    """
+    numeric = {name: value for name, value in metrics.items() if _is_number(value)}
+    names = {name.lower(): name for name in numeric}
+    values = list(numeric.values())
+
+    def walk(value, key=None):
+        if key is not None and key.lower() in names and _is_number(value):
+            return {_METRIC_MARKER: names[key.lower()]}
+        if isinstance(value, dict):
+            return {k: walk(v, k) for k, v in value.items() if k != "report_id"}
+        if isinstance(value, list):
+            return [walk(v) for v in value]
+        if isinstance(value, str) and _mentions_metric(value, values):
+            raise _NotReusable()
+        if _is_number(value) and value in values:
+            raise _NotReusable()
+        return value
+
+    try:
+        return walk(report)
+    except _NotReusable:
+        return None
+
+def render_adjustment_template(template, metrics):
+    """Fill the current metrics into a cached template by name and give it a fresh report_id"""
+    def walk(value):
+        if isinstance(value, dict):
+            if set(value) == {_METRIC_MARKER}:
+                metric = metrics[value[_METRIC_MARKER]]
+                if not _is_number(metric):
+                    raise TypeError(f"metric {value[_METRIC_MARKER]!r} is not numeric")
+                return metric
+            return {k: walk(v) for k, v in value.items()}
+        if isinstance(value, list):
+            return [walk(v) for v in value]
+        return value
+
+    report = walk(template)
+    report["report_id"] = f"adj_{uuid.uuid4().hex[:12]}"
+    return report
+
+def invalidate_adjustment_cache():
+    adjustment_cache.clear()
+
+
 
 def run_workout_adjustment_llm(tracker_decision_json):
     """
     Converts tracker decisions into workout modification instructions.
     Returns a dict (parsed JSON).
+    Decisions with a cached signature are served from the stored report
+    template; identical tracker decisions in flight share one call.
     """
+    signature = adjustment_signature(tracker_decision_json)
+    metrics = tracker_decision_json.get("Metrics", {}) or {}
+
+    try:
+        template = adjustment_cache.get(signature)
+    except sqlite3.Error as e:
+        print(f"⚠️ Adjustment cache unavailable: {e}")
+        template = None
+
+    if template is not None:
+        try:
+            return render_adjustment_template(template, metrics)
+        except (KeyError, TypeError, AttributeError):
+            adjustment_cache.delete(signature)
+
+    report = upstream_calls.do(
+        make_flight_key("gemini:adjustment", tracker_decision_json),
+        _run_workout_adjustment_llm,
+        tracker_decision_json
+    )
+
+    template = make_adjustment_template(report, metrics)
+    if template is not None:
+        try:
+            adjustment_cache.set(signature, template)
+        except sqlite3.Error as e:
+            print(f"⚠️ Could not cache adjustment report: {e}")
 
+    return report
+
+def _run_workout_adjustment_llm(tracker_decision_json):
     user_message = json.dumps(tracker_decision_json, indent=2)
 
-    response = tracker_model.generate_content(
+    acquire_rate_limit("gemini")
+    response = get_tracker_model().generate_content(
         [
             WORKOUT_ADJUSTMENT_SYSTEM_PROMPT,
             user_message
@@ -1023,13 +1298,18 @@ def run_workout_adjustment_llm(tracker_decision_json):
         raise ValueError(f"Workout Adjustment LLM output is not valid JSON: {e}")
 
 # workout_adjustments = run_workout_adjustment_llm(tracker_decision_output)
-def store_workout_plan(raw_plan: dict) -> dict:
+def store_workout_plan(raw_plan: dict, user_id: str = DEFAULT_USER_ID) -> dict:
     """
-    Normalizes and stores workout plan from Stage 1.
+    Normalizes and stores workout plan from Stage 1 for `user_id`.
+    The LLM normalizer is only used for plans normalize_plan can't map.
     Returns normalized plan.
     """
-    normalized = normalize_plan_with_llm(raw_plan)
-    insert_daily_plan(normalized)
+    try:
+        normalized = normalize_plan(raw_plan)
+    except ValueError as e:
+        print(f"⚠️ Falling back to LLM normalization: {e}")
+        normalized = normalize_plan_with_llm(raw_plan)
+    insert_daily_plan(normalized, user_id=user_id)
     return normalized
 
 # print(json.dumps(workout_adjustments, indent=2))
@@ -1037,40 +1317,44 @@ def generate_workout_adjustments(
     *,
     date_str: str,
     food_consumed: dict,
-    workout_feedback: dict,
-    db_name="fitness.db"
+    workout_feedback: dict = None,
+    db_name="fitness.db",
+    user_id: str = DEFAULT_USER_ID
 ) -> dict:
     """
     Stage 3 API-safe entry point.
-    - Reads today's workout from DB
-    - Computes deficits & effort
+    - Reads the user's workout for today from DB
+    - Computes deficits & effort (from workout_feedback, or from the sets
+      logged with fitness_db.log_sets when no feedback is passed)
     - Updates DB if needed
     - Returns workout_adjustments JSON
     """
 
     # -----------------------------
-    # 1️⃣ Fetch plan from DB
+    # 1️⃣ Fetch plan from DB (plan, targets, goal and exercises in one query)
     # -----------------------------
-    workout = fetch_workout_for_today(db_name)
-    if not workout:
+    context = fetch_tracking_context(db_name=db_name, user_id=user_id)
+    if not context:
         raise ValueError("No workout found for today")
 
-    targets = fetch_targets_for_today(db_name)
-    if not targets:
-        raise ValueError("No targets found for today")
+    workout = context["workout"]
+    targets = context["targets"]
 
-    user_goal = fetch_user_goal_for_today(db_name)
+    user_goal = context["goal"]
     if not user_goal:
         raise ValueError("Could not fetch user goal")
 
     # -----------------------------
     # 2️⃣ Nutrition calculation
     # -----------------------------
+    from nutrition_engine import PER_GRAM_DB_PATH, get_nutrition_store
+
+    # In-memory nutrition_db2.json, reloaded only when the file changes
     total_nutrition, _ = calculate_nutrition(
         ingredients=list(food_consumed.keys()), 
         # here note that you need to check the top
         weights=food_consumed,
-        nutrition_db=load_nutrition_db()
+        nutrition_db=get_nutrition_store(PER_GRAM_DB_PATH).matrix()
     )
 
     deficits = calculate_daily_deficits(
@@ -1081,13 +1365,27 @@ def generate_workout_adjustments(
     # -----------------------------
     # 3️⃣ Workout effort
     # -----------------------------
-    effort = calculate_workout_effort_with_cardio(
-        strength_planned_reps=workout_feedback["planned_reps"],
-        strength_completed_reps=workout_feedback["completed_reps"],
-        planned_time=workout["planned_time"],
-        actual_time=workout_feedback["actual_time"],
-        cardio_data=workout_feedback.get("cardio", [])
-    )
+    if workout_feedback is not None:
+        effort = calculate_workout_effort_with_cardio(
+            strength_planned_reps=workout_feedback["planned_reps"],
+            strength_completed_reps=workout_feedback["completed_reps"],
+            planned_time=workout["planned_time"],
+            actual_time=workout_feedback["actual_time"],
+            cardio_data=workout_feedback.get("cardio", [])
+        )
+    else:
+        if not context["progress"]:
+            raise ValueError("No workout feedback or logged sets for today")
+
+        # Running totals maintained as sets were logged
+        logged = summarize_logged_workout(workout, context["progress"])
+        effort = calculate_workout_effort_with_cardio(
+            strength_planned_reps=logged["planned_reps"],
+            strength_completed_reps=logged["completed_reps"],
+            planned_time=workout["planned_time"],
+            actual_time=logged["actual_time"],
+            cardio_completion=logged["cardio_completion"]
+        )
 
     # -----------------------------
     # 4️⃣ Threshold evaluation
@@ -1102,6 +1400,13 @@ def generate_workout_adjustments(
         effort_score=effort["effort_score"]
     )
 
+    try:
+        from threshold_engine import record_daily_evaluation
+
+        record_daily_evaluation(context["plan_id"], threshold_result["metrics"], db_name=db_name)
+    except sqlite3.Error as e:
+        print(f"⚠️ Could not record daily evaluation: {e}")
+
     tracker_decision_output = {
         "goal": threshold_result["goal"],
         "status": threshold_result["status"],
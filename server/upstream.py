@@ -0,0 +1,269 @@
+import contextvars
+import copy
+import hashlib
+import json
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, CancelledError, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Mapping, Optional
+
+
+def make_flight_key(namespace: str, *parts: Any) -> str:
+    """
+    Build a stable key for an upstream call from its namespace and arguments.
+
+    Args:
+        namespace: Upstream service / call site, e.g. "tavily" or "gemini:semantic"
+        parts: JSON-serializable call arguments
+
+    Returns:
+        Key string suitable for SingleFlight.do
+    """
+    payload = json.dumps(parts, sort_keys=True, default=str)
+    digest = hashlib.sha256(payload.encode("utf-8")).hexdigest()
+    return f"{namespace}:{digest}"
+
+
+class _Call:
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.shared_result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Collapse concurrent identical upstream calls into one.
+
+    The first caller for a key runs the function; callers arriving while it
+    is in flight wait for it and share its result (or its exception). Each
+    waiter gets its own deep copy of the result, so no caller can mutate
+    what another one sees. Once the call finishes the key is forgotten, so
+    later calls go upstream again.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[str, _Call] = {}
+        self.executed = 0
+        self.shared = 0
+
+    def do(self, key: str, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                self.shared += 1
+                leader = False
+            else:
+                call = _Call()
+                self._calls[key] = call
+                self.executed += 1
+                leader = True
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return copy.deepcopy(call.shared_result)
+
+        try:
+            call.result = fn(*args, **kwargs)
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+                has_waiters = call.waiters > 0
+            # Snapshot before waking waiters, so the leader mutating its
+            # result afterwards can't race with their copies
+            if has_waiters and call.error is None:
+                call.shared_result = copy.deepcopy(call.result)
+            call.event.set()
+
+        return call.result
+
+    def stats(self) -> Dict[str, int]:
+        """Return how many calls went upstream and how many were shared."""
+        with self._lock:
+            return {
+                "executed": self.executed,
+                "shared": self.shared,
+                "in_flight": len(self._calls)
+            }
+
+
+class RateLimiter:
+    """
+    Thread-safe token bucket.
+
+    acquire() blocks until a token is available, so callers are spread out
+    to at most `rate_per_second` calls per second with bursts up to `burst`.
+    """
+
+    def __init__(self, rate_per_second: float, burst: Optional[int] = None):
+        self.rate_per_second = rate_per_second
+        self.burst = burst if burst is not None else max(1, int(rate_per_second))
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(
+                    self.burst,
+                    self._tokens + (now - self._updated) * self.rate_per_second
+                )
+                self._updated = now
+
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait_for = (1 - self._tokens) / self.rate_per_second
+
+            time.sleep(wait_for)
+
+
+# Process-wide group shared by the Tavily, Gemini and Open Food Facts call sites
+upstream_calls = SingleFlight()
+
+# Per-upstream rate limits; upstreams without a limiter are not throttled
+_rate_limiters: Dict[str, RateLimiter] = {}
+_rate_limiters_lock = threading.Lock()
+
+
+def set_rate_limit(upstream: str, rate_per_second: Optional[float], burst: Optional[int] = None) -> None:
+    """
+    Limit calls to an upstream service, or remove the limit with None.
+
+    Args:
+        upstream: Upstream name, e.g. "tavily" or "gemini"
+        rate_per_second: Sustained calls per second
+        burst: Maximum burst size (defaults to the per-second rate)
+    """
+    with _rate_limiters_lock:
+        if rate_per_second is None:
+            _rate_limiters.pop(upstream, None)
+        else:
+            _rate_limiters[upstream] = RateLimiter(rate_per_second, burst)
+
+
+@contextmanager
+def scoped_rate_limits(rate_limits: Optional[Dict[str, Optional[float]]]) -> Iterator[None]:
+    """
+    Apply rate limits for the duration of a `with` block, then put back
+    whatever limiters (or lack of them) were in place before.
+
+    Args:
+        rate_limits: Calls per second per upstream (None removes a limit)
+    """
+    rate_limits = rate_limits or {}
+    with _rate_limiters_lock:
+        previous = {upstream: _rate_limiters.get(upstream) for upstream in rate_limits}
+    for upstream, rate in rate_limits.items():
+        set_rate_limit(upstream, rate)
+    try:
+        yield
+    finally:
+        with _rate_limiters_lock:
+            for upstream, limiter in previous.items():
+                if limiter is None:
+                    _rate_limiters.pop(upstream, None)
+                else:
+                    _rate_limiters[upstream] = limiter
+
+
+def acquire_rate_limit(upstream: str) -> None:
+    """Block until a call to `upstream` is allowed by its rate limit, if any."""
+    limiter = _rate_limiters.get(upstream)
+    if limiter is not None:
+        limiter.acquire()
+
+
+def run_bounded(
+    tasks: Mapping[str, Callable[[], Any]],
+    max_workers: int,
+    timeout: float,
+    on_error: Callable[[str, str], Any],
+    thread_name_prefix: str = "upstream",
+    cancel_event: Optional[threading.Event] = None
+) -> Dict[str, Any]:
+    """
+    Run independent upstream calls concurrently on a bounded thread pool.
+
+    Each call gets its own timeout, measured from when it starts running.
+    A call that raises or times out is replaced by
+    `on_error(name, reason)`, where reason reads "failed: <error>" or
+    "timed out after <timeout>s"; the other calls are unaffected.
+
+    Args:
+        tasks: Mapping of task name to a zero-argument callable
+        max_workers: Pool size
+        timeout: Per-call timeout in seconds
+        on_error: Builds the result of a failed or timed-out call
+        thread_name_prefix: Name prefix of the pool's threads
+        cancel_event: Set it to stop waiting; calls that haven't started
+            are cancelled and CancelledError is raised
+
+    Returns:
+        Mapping of task name to its result, in `tasks` order
+    """
+    if not tasks:
+        return {}
+
+    started_at: Dict[str, float] = {}
+
+    def timed(name: str, fn: Callable[[], Any]) -> Any:
+        started_at[name] = time.monotonic()
+        return fn()
+
+    results: Dict[str, Any] = {}
+    executor = ThreadPoolExecutor(
+        max_workers=min(max_workers, len(tasks)),
+        thread_name_prefix=thread_name_prefix
+    )
+    try:
+        # Each call runs in a copy of the caller's context (e.g. its output capture)
+        futures = {
+            executor.submit(contextvars.copy_context().run, timed, name, fn): name
+            for name, fn in tasks.items()
+        }
+        pending = set(futures)
+
+        while pending:
+            if cancel_event is not None and cancel_event.is_set():
+                raise CancelledError()
+
+            now = time.monotonic()
+            deadlines = [started_at[futures[f]] + timeout for f in pending if futures[f] in started_at]
+            wait_for = max(0.0, min(deadlines) - now) if deadlines else timeout
+            if cancel_event is not None:
+                # Wake up regularly to notice cancellation
+                wait_for = min(wait_for, 0.1)
+            done, pending = wait(pending, timeout=wait_for, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                name = futures[future]
+                try:
+                    results[name] = future.result()
+                except Exception as e:
+                    results[name] = on_error(name, f"failed: {e}")
+
+            now = time.monotonic()
+            for future in list(pending):
+                name = futures[future]
+                if name in started_at and now - started_at[name] >= timeout:
+                    results[name] = on_error(name, f"timed out after {timeout}s")
+                    future.cancel()
+                    pending.discard(future)
+    finally:
+        # Don't block on calls that timed out or were cancelled; their results are discarded
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    return {name: results[name] for name in tasks}
@@ -1,41 +1,94 @@
 import os
+import contextvars
+import hashlib
+import io
 import sqlite3
 import json
 import re
+import time
+import threading
+import sys
+from concurrent.futures import ThreadPoolExecutor, wait, as_completed, FIRST_COMPLETED
+from contextlib import contextmanager
 from datetime import datetime
-from typing import Dict, Optional, List, Any
-from tavily import TavilyClient
-import google.generativeai as genai
+from typing import Dict, Optional, List, Any, Callable, Iterable, Iterator, TextIO, Tuple
 
-from dotenv import load_dotenv
+from fitness_db import DEFAULT_USER_ID, get_pool
+from kv_cache import PersistentCache
+from upstream import upstream_calls, make_flight_key, scoped_rate_limits, acquire_rate_limit, run_bounded
+from streaming_json import consume_json_stream, StreamAborted
+from exercise_catalog import load_exercise_catalog
+from llm_backend import get_llm_backend, load_environment
 
-# Load the .env file
-load_dotenv()
-
-g_api_key = os.getenv("GEMINI_API_KEY")
-if g_api_key is None:
-    raise ValueError("GEMINI_API_KEY not found in .env file")
-    
-t_api_key = os.getenv("TAVILY_API_KEY")
-if t_api_key is None:
-    raise ValueError("TAVILY_API_KEY not found in .env file")
 # ============================================================================
 # CONFIGURATION
 # ============================================================================
 class Config:
     """Configuration constants"""
-    TAVILY_API_KEY = t_api_key
-    GEMINI_API_KEY = g_api_key
+    GEMINI_API_KEY_ENV = "GEMINI_API_KEY"
+    TAVILY_API_KEY_ENV = "TAVILY_API_KEY"
     MODEL_NAME = "gemini-2.5-flash"
     DEFAULT_DB_NAME = "fitness.db"
     WORKOUT_DURATION_MINUTES = 60
     MAX_RETRIES = 2
-
-# Configure Gemini
-genai.configure(api_key=Config.GEMINI_API_KEY)
-
-# Initialize Tavily
-tavily_client = TavilyClient(api_key=Config.TAVILY_API_KEY)
+    RESEARCH_MAX_WORKERS = 4
+    RESEARCH_TIMEOUT_SECONDS = 15
+    SEARCH_CACHE_DB_NAME = "search_cache.db"
+    SEARCH_CACHE_TTL_SECONDS = 7 * 24 * 3600
+    SEARCH_CACHE_MAX_ENTRIES = 5000
+    ORCHESTRATOR_MEMO_TTL_SECONDS = 30 * 24 * 3600
+    ORCHESTRATOR_MEMO_MAX_ENTRIES = 1000
+    WEIGHT_BUCKET_KG = 5
+    STREAM_RESPONSES = True
+    BATCH_MAX_WORKERS = 8
+    ORCHESTRATOR_CONTEXT_TOKEN_BUDGET = 2500
+    EXECUTOR_CONTEXT_TOKEN_BUDGET = 2500
+    RESEARCH_RESULTS_PER_QUERY = 2
+    RESEARCH_SNIPPET_CHARS = 400
+    CATALOG_EXERCISES_PER_MUSCLE = 5
+
+# Clients are created on first use so importing this module does no I/O
+_tavily_client = None
+_tavily_lock = threading.Lock()
+
+
+def get_tavily_client():
+    """Return the shared Tavily client, creating it on first use"""
+    global _tavily_client
+    if _tavily_client is None:
+        with _tavily_lock:
+            if _tavily_client is None:
+                load_environment()
+                api_key = os.getenv(Config.TAVILY_API_KEY_ENV)
+                if api_key is None:
+                    raise ValueError("TAVILY_API_KEY not found in .env file")
+
+                from tavily import TavilyClient
+
+                _tavily_client = TavilyClient(api_key=api_key)
+    return _tavily_client
+
+
+def get_workout_llm_backend():
+    """LLM backend for the orchestrator and executor (Gemini, or the stub with LLM_BACKEND=stub)"""
+    return get_llm_backend(Config.GEMINI_API_KEY_ENV)
+
+
+# Web search results cache (shared by all workers on this machine)
+search_cache = PersistentCache(
+    Config.SEARCH_CACHE_DB_NAME,
+    table="web_search",
+    ttl_seconds=Config.SEARCH_CACHE_TTL_SECONDS,
+    max_entries=Config.SEARCH_CACHE_MAX_ENTRIES
+)
+
+# Orchestrator output for new users, keyed by (goal, experience, weight bucket)
+orchestrator_memo = PersistentCache(
+    Config.SEARCH_CACHE_DB_NAME,
+    table="orchestrator_memo",
+    ttl_seconds=Config.ORCHESTRATOR_MEMO_TTL_SECONDS,
+    max_entries=Config.ORCHESTRATOR_MEMO_MAX_ENTRIES
+)
 
 
 def detect_input_type(user_input: Dict) -> str:
@@ -178,33 +231,68 @@ def normalize_input_to_report(user_input: Dict) -> Dict:
 # ============================================================================
 # SHARED TOOLS
 # ============================================================================
-def web_search(query: str) -> Dict[str, Any]:
+def normalize_search_query(query: str) -> str:
+    """Lowercase and collapse whitespace so equivalent queries share a cache entry"""
+    return " ".join(query.lower().split())
+
+
+def web_search(query: str, max_results: int = 5) -> Dict[str, Any]:
     """
     Performs a live web search to find up-to-date information.
 
+    Results are cached on disk by normalized query and max_results, so
+    repeat queries are served locally without spending Tavily quota.
+
     Args:
         query: Search query string
+        max_results: Maximum number of results to request
 
     Returns:
         Search results dictionary or error dictionary
     """
     print(f"  🔍 [Web Search] Query: {query}")
+
+    cache_key = f"{normalize_search_query(query)}|{max_results}"
     try:
-        search_result = tavily_client.search(query=query, max_results=5)
-        print(f"  ✓ Found {len(search_result.get('results', []))} results")
+        cached = search_cache.get(cache_key)
+    except sqlite3.Error as e:
+        print(f"  ⚠ Search cache unavailable: {str(e)}")
+        cached = None
+
+    if cached is not None:
+        print(f"  ✓ Cache hit ({len(cached.get('results', []))} results)")
+        return cached
+
+    def search_and_cache() -> Dict[str, Any]:
+        acquire_rate_limit("tavily")
+        search_result = get_tavily_client().search(query=query, max_results=max_results)
+        try:
+            search_cache.set(cache_key, search_result)
+        except sqlite3.Error as e:
+            print(f"  ⚠ Could not cache search result: {str(e)}")
         return search_result
+
+    try:
+        # Identical in-flight searches share a single Tavily request
+        search_result = upstream_calls.do(
+            make_flight_key("tavily", cache_key), search_and_cache
+        )
+        print(f"  ✓ Found {len(search_result.get('results', []))} results")
     except Exception as e:
         error_msg = f"Web search failed: {str(e)}"
         print(f"  ✗ [Error] {error_msg}")
         return {"error": error_msg}
 
+    return search_result
+
 
-def get_fitness_plan_by_latest_date(db_name: str = None) -> Dict[str, Any]:
+def get_fitness_plan_by_latest_date(db_name: str = None, user_id: str = DEFAULT_USER_ID) -> Dict[str, Any]:
     """
-    Retrieves the most recent daily workout plan from the database.
+    Retrieves a user's most recent daily workout plan from the database.
 
     Args:
         db_name: Database filename (defaults to fitness.db)
+        user_id: Owner of the plans
 
     Returns:
         Dictionary containing plan data and exercises, or error dictionary
@@ -215,33 +303,31 @@ def get_fitness_plan_by_latest_date(db_name: str = None) -> Dict[str, Any]:
     print(f"  💾 [Database] Fetching latest plan from {db_name}")
 
     try:
-        conn = sqlite3.connect(db_name)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
+        with get_pool(db_name).read() as conn:
+            cursor = conn.cursor()
+            cursor.row_factory = sqlite3.Row
 
-        # Get most recent plan
-        plan_query = "SELECT * FROM daily_plans ORDER BY date DESC LIMIT 1"
-        cursor.execute(plan_query)
-        plan_row = cursor.fetchone()
+            # Get most recent plan
+            plan_query = "SELECT * FROM daily_plans WHERE user_id = ? ORDER BY day_number DESC LIMIT 1"
+            cursor.execute(plan_query, (user_id,))
+            plan_row = cursor.fetchone()
 
-        if not plan_row:
-            conn.close()
-            print("  ⚠ No previous plans found (likely a new user)")
-            return {"message": "No previous plans found in database - this is a new user"}
+            if not plan_row:
+                print("  ⚠ No previous plans found (likely a new user)")
+                return {"message": "No previous plans found in database - this is a new user"}
 
-        plan_data = dict(plan_row)
-        plan_id = plan_data['id']
-        print(f"  ✓ Found plan ID {plan_id} from {plan_data.get('date', 'unknown date')}")
+            plan_data = dict(plan_row)
+            plan_id = plan_data['id']
+            print(f"  ✓ Found plan ID {plan_id} from {plan_data.get('date', 'unknown date')}")
 
-        # Get associated exercises
-        exercise_query = "SELECT * FROM exercises WHERE daily_plan_id = ?"
-        cursor.execute(exercise_query, (plan_id,))
-        exercise_rows = cursor.fetchall()
+            # Get associated exercises
+            exercise_query = "SELECT * FROM exercises WHERE daily_plan_id = ?"
+            cursor.execute(exercise_query, (plan_id,))
+            exercise_rows = cursor.fetchall()
 
         plan_data['exercises'] = [dict(ex) for ex in exercise_rows]
         print(f"  ✓ Loaded {len(plan_data['exercises'])} exercises")
 
-        conn.close()
         return plan_data
 
     except sqlite3.Error as e:
@@ -250,6 +336,45 @@ def get_fitness_plan_by_latest_date(db_name: str = None) -> Dict[str, Any]:
         return {"error": error_msg}
 
 
+def run_research_tasks(
+    tasks: Dict[str, Callable[[], Dict[str, Any]]],
+    max_workers: int = None,
+    timeout: float = None
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Run independent research lookups concurrently on a bounded thread pool.
+
+    Each lookup gets its own timeout, measured from when it starts running.
+    Lookups that time out or raise are reported as error dictionaries, the
+    same shape web_search and get_fitness_plan_by_latest_date use for failures.
+
+    Args:
+        tasks: Mapping of task name to a zero-argument callable
+        max_workers: Pool size (defaults to Config.RESEARCH_MAX_WORKERS)
+        timeout: Per-lookup timeout in seconds (defaults to Config.RESEARCH_TIMEOUT_SECONDS)
+
+    Returns:
+        Mapping of task name to its result dictionary
+    """
+    if max_workers is None:
+        max_workers = Config.RESEARCH_MAX_WORKERS
+    if timeout is None:
+        timeout = Config.RESEARCH_TIMEOUT_SECONDS
+
+    def failed(name: str, reason: str) -> Dict[str, Any]:
+        error_msg = f"Research task '{name}' {reason}"
+        print(f"  ✗ [Error] {error_msg}")
+        return {"error": error_msg}
+
+    return run_bounded(
+        tasks,
+        max_workers=max_workers,
+        timeout=timeout,
+        on_error=failed,
+        thread_name_prefix="research"
+    )
+
+
 # ============================================================================
 # RESPONSE PARSING UTILITIES
 # ============================================================================
@@ -293,6 +418,199 @@ def extract_json_from_text(text: str) -> Optional[Dict]:
     return None
 
 
+def send_chat_message(chat, prompt: str, required_keys: List[str]) -> str:
+    """
+    Send a message and return the response text.
+
+    With Config.STREAM_RESPONSES the response is streamed through an
+    incremental JSON check, so malformed output or a JSON object missing
+    required keys raises StreamAborted without waiting for the rest of
+    the generation. A usable response is read to the end so the chat can
+    take the next message.
+
+    Args:
+        chat: Chat session
+        prompt: Message to send
+        required_keys: Top-level keys the JSON response must contain
+
+    Returns:
+        Response text
+    """
+    acquire_rate_limit("gemini")
+
+    if not Config.STREAM_RESPONSES:
+        return chat.send_message(prompt).text.strip()
+
+    # On StreamAborted the chat holds a half-read response; callers start a new chat
+    response = chat.send_message(prompt, stream=True)
+    response_text, _ = consume_json_stream(response, required_keys)
+
+    # Finish reading the stream so the chat session can take another message
+    resolve = getattr(response, "resolve", None)
+    if resolve is not None:
+        resolve()
+    else:
+        for _ in response:
+            pass
+    return response_text.strip()
+
+
+# ============================================================================
+# PROMPT CONTEXT BUILDER
+# ============================================================================
+# Fields that never help the agents plan and only cost input tokens
+PROMPT_STRIP_FIELDS = {
+    "diet_rationale",
+    "workout_rationale",
+    "raw_content",
+    "images",
+    "favicon",
+    "follow_up_questions",
+    "response_time"
+}
+
+HTML_TAG_PATTERN = re.compile(r"<[^>]+>")
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token)"""
+    return (len(text) + 3) // 4
+
+
+def minify_json(value: Any) -> str:
+    """Serialize without indentation or padding"""
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False)
+
+
+def strip_fields(value: Any, fields: set = PROMPT_STRIP_FIELDS) -> Any:
+    """Recursively drop unused fields from dictionaries"""
+    if isinstance(value, dict):
+        return {k: strip_fields(v, fields) for k, v in value.items() if k not in fields}
+    if isinstance(value, list):
+        return [strip_fields(v, fields) for v in value]
+    return value
+
+
+def compact_search_results(
+    search_result: Dict[str, Any],
+    limit: int = None,
+    snippet_chars: int = None
+) -> List[Dict[str, Any]]:
+    """
+    Rank Tavily results by score and keep short, HTML-free snippets.
+
+    Args:
+        search_result: Raw web_search output
+        limit: Results to keep (defaults to Config.RESEARCH_RESULTS_PER_QUERY)
+        snippet_chars: Max snippet length (defaults to Config.RESEARCH_SNIPPET_CHARS)
+
+    Returns:
+        List of {"title", "url", "content"} dictionaries
+    """
+    if limit is None:
+        limit = Config.RESEARCH_RESULTS_PER_QUERY
+    if snippet_chars is None:
+        snippet_chars = Config.RESEARCH_SNIPPET_CHARS
+
+    results = sorted(
+        search_result.get('results', []),
+        key=lambda r: r.get('score', 0),
+        reverse=True
+    )
+
+    compacted = []
+    for result in results[:limit]:
+        content = HTML_TAG_PATTERN.sub(" ", result.get('content', ''))
+        content = " ".join(content.split())
+        if len(content) > snippet_chars:
+            content = content[:snippet_chars].rsplit(" ", 1)[0] + "…"
+        compacted.append({
+            "title": result.get('title', ''),
+            "url": result.get('url', ''),
+            "content": content
+        })
+    return compacted
+
+
+def _shrink(value: Any) -> Tuple[Any, bool]:
+    """
+    Trim a section a little. Lists lose their last item, dictionaries trim
+    their largest value (or lose their last key), strings are halved.
+
+    Returns:
+        Tuple of (trimmed value, whether anything changed)
+    """
+    if isinstance(value, list) and value:
+        if len(value) > 1:
+            return value[:-1], True
+        inner, changed = _shrink(value[0])
+        return ([inner], True) if changed else ([], True)
+    if isinstance(value, dict) and value:
+        largest = max(value, key=lambda k: len(minify_json(value[k])))
+        inner, changed = _shrink(value[largest])
+        if changed:
+            return {**value, largest: inner}, True
+        return dict(list(value.items())[:-1]), True
+    if isinstance(value, str) and len(value) > 16:
+        return value[:len(value) // 2] + "…", True
+    return value, False
+
+
+def build_prompt_context(
+    sections: List[Tuple[str, Any]],
+    token_budget: int,
+    required: Iterable[str] = ()
+) -> Tuple[Dict[str, str], Dict[str, int]]:
+    """
+    Render prompt sections as minified JSON within a token budget.
+
+    Sections are given most important first. While the total is over
+    budget, the least important section that can still shrink is trimmed.
+    Required sections are never trimmed; if they alone exceed the budget a
+    warning is logged and they are sent whole.
+
+    Args:
+        sections: (name, value) pairs in priority order
+        token_budget: Maximum estimated tokens across all sections
+        required: Names of sections that must reach the model intact
+
+    Returns:
+        Tuple of (rendered text per section, estimated tokens per section)
+    """
+    values = {name: strip_fields(value) for name, value in sections}
+    order = [name for name, _ in sections]
+    required = set(required)
+    trimmable = [name for name in order if name not in required]
+
+    def render(value: Any) -> str:
+        return value if isinstance(value, str) else minify_json(value)
+
+    rendered = {name: render(values[name]) for name in order}
+    tokens = {name: estimate_tokens(rendered[name]) for name in order}
+
+    while sum(tokens.values()) > token_budget:
+        for name in reversed(trimmable):
+            shrunk, changed = _shrink(values[name])
+            if changed:
+                values[name] = shrunk
+                rendered[name] = render(shrunk)
+                tokens[name] = estimate_tokens(rendered[name])
+                break
+        else:
+            break
+
+    required_tokens = sum(tokens[name] for name in required if name in tokens)
+    if required_tokens > token_budget:
+        print(
+            f"  ⚠️ Required prompt sections need {required_tokens} tokens, "
+            f"over the {token_budget} budget; sending them untrimmed"
+        )
+
+    report = ", ".join(f"{name}={count}" for name, count in tokens.items())
+    print(f"  📏 Prompt context tokens (budget {token_budget}): {report}, total={sum(tokens.values())}")
+    return rendered, tokens
+
+
 # ============================================================================
 # ORCHESTRATOR AGENT (ENHANCED)
 # ============================================================================
@@ -405,9 +723,79 @@ You MUST output ONLY valid JSON. Start with { and end with }. NO other text befo
 '''
 
 
+# Memo entries are keyed on this, so editing the prompt invalidates them
+ORCHESTRATOR_PROMPT_VERSION = hashlib.sha256(
+    ORCHESTRATOR_SYSTEM_PROMPT.encode("utf-8")
+).hexdigest()[:12]
+
+
+def weight_bucket(weight: Any) -> Optional[int]:
+    """Round a weight in kg to the nearest Config.WEIGHT_BUCKET_KG, or None if not numeric"""
+    try:
+        weight_kg = float(weight)
+    except (TypeError, ValueError):
+        return None
+    return int(round(weight_kg / Config.WEIGHT_BUCKET_KG) * Config.WEIGHT_BUCKET_KG)
+
+
+def orchestrator_memo_key(adjustment_report: Dict) -> Optional[str]:
+    """
+    Build the memo key for a new-user report.
+
+    Args:
+        adjustment_report: Normalized adjustment report
+
+    Returns:
+        Key string, or None if the report is not memoizable
+    """
+    if adjustment_report.get('user_type') != 'new_registration':
+        return None
+
+    bucket = weight_bucket(adjustment_report.get('user_info', {}).get('weight_kg'))
+    if bucket is None:
+        return None
+
+    return "|".join([
+        ORCHESTRATOR_PROMPT_VERSION,
+        adjustment_report.get('goal', 'maintenance'),
+        adjustment_report.get('experience_level', 'beginner'),
+        str(bucket)
+    ])
+
+
+def personalize_memoized_instructions(memoized_output: str, adjustment_report: Dict) -> str:
+    """
+    Fill user-specific fields into memoized orchestrator output.
+
+    Args:
+        memoized_output: Orchestrator output stored for the user's bucket
+        adjustment_report: The current user's normalized report
+
+    Returns:
+        Orchestrator output for this user
+    """
+    instructions = extract_json_from_text(memoized_output)
+    if not instructions:
+        return memoized_output
+
+    user = instructions.setdefault('user', {})
+    user['date'] = datetime.now().strftime("%d/%m/%Y")
+    user['weight_kg'] = adjustment_report.get('user_info', {}).get('weight_kg', user.get('weight_kg'))
+
+    return json.dumps(instructions, indent=2)
+
+
+def invalidate_orchestrator_memo() -> None:
+    """Drop every memoized orchestrator output"""
+    orchestrator_memo.clear()
+
+
+ORCHESTRATOR_REQUIRED_KEYS = ['user', 'today_plan']
+
+
 def create_orchestrator_model():
     """Create and configure the Orchestrator model"""
-    return genai.GenerativeModel(
+    return get_workout_llm_backend().model(
         model_name=Config.MODEL_NAME,
         system_instruction=ORCHESTRATOR_SYSTEM_PROMPT,
         generation_config={
@@ -561,9 +949,12 @@ CRITICAL RULES
 '''
 
 
+EXECUTOR_REQUIRED_KEYS = ['date', 'user_goal', 'daily_macros', 'exercises']
+
+
 def create_executor_model():
     """Create and configure the Executor model"""
-    return genai.GenerativeModel(
+    return get_workout_llm_backend().model(
         model_name=Config.MODEL_NAME,
         system_instruction=EXECUTOR_SYSTEM_PROMPT,
         generation_config={
@@ -577,13 +968,18 @@ def create_executor_model():
 # ============================================================================
 # MAIN WORKFLOW WITH FUNCTION CALLING
 # ============================================================================
-def run_orchestrator_phase(adjustment_report: Dict, max_retries: int) -> Optional[str]:
+def run_orchestrator_phase(
+    adjustment_report: Dict,
+    max_retries: int,
+    user_id: str = DEFAULT_USER_ID
+) -> Optional[str]:
     """
     Phase 1: Orchestrator analyzes report and creates instructions.
 
     Args:
         adjustment_report: User's fitness adjustment report (normalized)
         max_retries: Number of retry attempts
+        user_id: Whose previous workout to load
 
     Returns:
         Raw orchestrator output string or None
@@ -603,53 +999,74 @@ def run_orchestrator_phase(adjustment_report: Dict, max_retries: int) -> Optiona
         print(f"\n⚠️  NEW USER DETECTED - {experience.upper()} level")
         print("    Applying conservative programming protocols...")
 
+    # New-user instructions only depend on goal, experience and weight bucket
+    memo_key = orchestrator_memo_key(adjustment_report)
+    if memo_key:
+        try:
+            memoized_output = orchestrator_memo.get(memo_key)
+        except sqlite3.Error as e:
+            print(f"  ⚠ Orchestrator memo unavailable: {str(e)}")
+            memoized_output = None
+
+        if memoized_output:
+            print("\n  ✓ Using memoized orchestrator instructions (phase 1 skipped)")
+            return personalize_memoized_instructions(memoized_output, adjustment_report)
+
     for attempt in range(max_retries):
         print(f"\n🔄 Attempt {attempt + 1}/{max_retries}")
 
         try:
             print("\n  🔧 Gathering context for Orchestrator...")
 
-            # 1. Search for experience-appropriate training
+            # Training research, previous workout and safety/recovery research
+            # are independent, so fan them out concurrently.
             if is_new_user:
                 print(f"\n  → Searching for {experience} training guidelines...")
-                training_search = web_search(
-                    f"{experience} {adjustment_report['goal']} workout plan first time gym"
-                )
+                training_query = f"{experience} {adjustment_report['goal']} workout plan first time gym"
+                print("\n  → Searching for beginner safety guidelines...")
+                safety_query = f"{experience} gym mistakes to avoid first workout"
             else:
                 print("\n  → Searching for training recommendations...")
-                training_search = web_search(
-                    f"{adjustment_report['goal']} workout best practices progressive overload"
-                )
-
-            # 2. Get previous workout
+                training_query = f"{adjustment_report['goal']} workout best practices progressive overload"
+                print("\n  → Searching for muscle recovery times...")
+                safety_query = f"{adjustment_report['goal']} muscle recovery time days"
             print("\n  → Fetching previous workout...")
-            previous_workout = get_fitness_plan_by_latest_date()
 
-            # 3. Search for recovery/beginner info
-            if is_new_user:
-                print("\n  → Searching for beginner safety guidelines...")
-                safety_search = web_search(f"{experience} gym mistakes to avoid first workout")
-            else:
-                print("\n  → Searching for muscle recovery times...")
-                safety_search = web_search(
-                    f"{adjustment_report['goal']} muscle recovery time days"
-                )
+            research = run_research_tasks({
+                "training": lambda: web_search(training_query),
+                "previous_workout": lambda: get_fitness_plan_by_latest_date(user_id=user_id),
+                "safety": lambda: web_search(safety_query)
+            })
+            training_search = research["training"]
+            previous_workout = research["previous_workout"]
+            safety_search = research["safety"]
 
             # Build context prompt
+            context, _ = build_prompt_context(
+                [
+                    ("adjustment_report", adjustment_report),
+                    ("previous_workout", previous_workout),
+                    ("training_research", compact_search_results(training_search)),
+                    ("safety_research", compact_search_results(safety_search))
+                ],
+                Config.ORCHESTRATOR_CONTEXT_TOKEN_BUDGET,
+                required=("adjustment_report",)
+            )
+
             context_prompt = f"""
 Based on your research:
 
 PREVIOUS WORKOUT DATA:
-{json.dumps(previous_workout, indent=2)}
+{context["previous_workout"]}
 
 TRAINING RESEARCH:
-{json.dumps(training_search.get('results', [])[:2], indent=2)}
+{context["training_research"]}
 
 SAFETY/RECOVERY RESEARCH:
-{json.dumps(safety_search.get('results', [])[:2], indent=2)}
+{context["safety_research"]}
 
 USER ADJUSTMENT REPORT:
-{json.dumps(adjustment_report, indent=2)}
+{context["adjustment_report"]}
 
 {"⚠️ CRITICAL: This is a NEW USER - Apply all conservative programming protocols!" if is_new_user else ""}
 
@@ -657,8 +1074,7 @@ Now generate your JSON instructions for the Executor Agent.
 Remember: ONLY output valid JSON. Start with {{ and end with }}.
 """
 
-            response = chat.send_message(context_prompt)
-            response_text = response.text.strip()
+            response_text = send_chat_message(chat, context_prompt, ORCHESTRATOR_REQUIRED_KEYS)
 
             print(f"\n  📥 Orchestrator Output ({len(response_text)} chars):")
             print("  " + "-" * 76)
@@ -680,12 +1096,22 @@ Remember: ONLY output valid JSON. Start with {{ and end with }}.
                     user_type = test_json.get('user', {}).get('user_type')
                     if user_type == 'new_registration':
                         print("  ✓ New user status correctly propagated")
+
+                if memo_key:
+                    try:
+                        orchestrator_memo.set(memo_key, response_text)
+                    except sqlite3.Error as e:
+                        print(f"  ⚠ Could not memoize orchestrator output: {str(e)}")
             else:
                 print("\n  ⚠ Could not extract valid JSON, but passing to Executor anyway")
 
             print("\n  ✓ Orchestrator phase complete")
             return response_text
 
+        except StreamAborted as e:
+            print(f"  ✗ Orchestrator output aborted early: {e.reason}")
+            chat = model.start_chat(history=[])
+
         except Exception as e:
             print(f"  ✗ Orchestrator error: {str(e)}")
             import traceback
@@ -734,7 +1160,11 @@ def run_executor_phase(orchestrator_output: str, max_retries: int) -> Optional[D
                 else:
                     print(f"\n  🔧 Searching for exercises...")
 
-                exercise_searches = []
+                # Candidate exercises come from the local catalog; Tavily is
+                # only used for muscles the catalog has nothing for.
+                catalog = load_exercise_catalog()
+                catalog_matches = {}
+                search_queries = {}
 
                 for muscle_obj in muscles[:3]:
                     if isinstance(muscle_obj, dict):
@@ -742,26 +1172,69 @@ def run_executor_phase(orchestrator_output: str, max_retries: int) -> Optional[D
                     else:
                         muscle = str(muscle_obj)
 
-                    if muscle:
-                        if is_new_user:
-                            search_query = f"{experience} beginner safe {muscle} exercises proper form"
-                        else:
-                            search_query = f"best {training_style} exercises for {muscle}"
-
-                        print(f"\n  → Searching: {search_query}")
-                        search_result = web_search(search_query)
-                        exercise_searches.append({
-                            "muscle": muscle,
-                            "exercises": search_result.get('results', [])[:2]
-                        })
+                    if not muscle or muscle in catalog_matches or muscle in search_queries:
+                        continue
+
+                    candidates = catalog.query(
+                        muscle,
+                        experience=experience,
+                        training_style=training_style,
+                        compound_only=is_new_user and experience == 'beginner',
+                        limit=Config.CATALOG_EXERCISES_PER_MUSCLE
+                    )
+                    if candidates:
+                        print(f"\n  → Catalog: {len(candidates)} {muscle} exercises")
+                        catalog_matches[muscle] = [
+                            {
+                                "name": ex["name"],
+                                "equipment": ex["equipment"],
+                                "compound": ex["compound"],
+                                "cues": ex["cues"]
+                            }
+                            for ex in candidates
+                        ]
+                        continue
+
+                    if is_new_user:
+                        search_query = f"{experience} beginner safe {muscle} exercises proper form"
+                    else:
+                        search_query = f"best {training_style} exercises for {muscle}"
+
+                    print(f"\n  → Catalog miss, searching: {search_query}")
+                    search_queries[muscle] = search_query
+
+                research = run_research_tasks({
+                    muscle: (lambda q=query: web_search(q))
+                    for muscle, query in search_queries.items()
+                })
+                exercise_searches = [
+                    {"muscle": muscle, "source": "catalog", "exercises": exercises}
+                    for muscle, exercises in catalog_matches.items()
+                ] + [
+                    {
+                        "muscle": muscle,
+                        "source": "web_search",
+                        "exercises": compact_search_results(research[muscle])
+                    }
+                    for muscle in search_queries
+                ]
 
                 # Build context with exercise research
+                context, _ = build_prompt_context(
+                    [
+                        ("orchestrator_instructions", orch_json),
+                        ("exercise_research", exercise_searches)
+                    ],
+                    Config.EXECUTOR_CONTEXT_TOKEN_BUDGET,
+                    required=("orchestrator_instructions",)
+                )
+
                 context_prompt = f"""
 ORCHESTRATOR INSTRUCTIONS:
-{orchestrator_output}
+{context["orchestrator_instructions"]}
 
 EXERCISE RESEARCH:
-{json.dumps(exercise_searches, indent=2)}
+{context["exercise_research"]}
 
 {"⚠️ CRITICAL: This is a NEW USER - Apply all safety protocols and conservative programming!" if is_new_user else ""}
 
@@ -769,7 +1242,7 @@ Now generate the complete workout plan in JSON format.
 Remember: ONLY output valid JSON. Start with {{ and end with }}.
 """
 
-                response = chat.send_message(context_prompt)
+                response_text = send_chat_message(chat, context_prompt, EXECUTOR_REQUIRED_KEYS)
             else:
                 # Fallback if can't parse orchestrator output
                 prompt = f"""
@@ -780,9 +1253,7 @@ The Orchestrator has created these instructions for you:
 Generate a complete workout plan following all safety protocols.
 Remember: ONLY output valid JSON. Start with {{ and end with }}.
 """
-                response = chat.send_message(prompt)
-
-            response_text = response.text.strip()
+                response_text = send_chat_message(chat, prompt, EXECUTOR_REQUIRED_KEYS)
 
             print(f"\n  📥 Executor Output ({len(response_text)} chars):")
             print("  " + "-" * 76)
@@ -797,8 +1268,7 @@ Remember: ONLY output valid JSON. Start with {{ and end with }}.
                 print(f"  📋 Keys found: {', '.join(workout_plan.keys())}")
 
                 # Validate required fields
-                required_fields = ['date', 'user_goal', 'daily_macros', 'exercises']
-                missing_fields = [f for f in required_fields if f not in workout_plan]
+                missing_fields = [f for f in EXECUTOR_REQUIRED_KEYS if f not in workout_plan]
 
                 if missing_fields:
                     print(f"  ⚠ Missing fields: {', '.join(missing_fields)}")
@@ -812,6 +1282,10 @@ Remember: ONLY output valid JSON. Start with {{ and end with }}.
             else:
                 print(f"  ✗ Failed to parse JSON from response")
 
+        except StreamAborted as e:
+            print(f"  ✗ Executor output aborted early: {e.reason}")
+            chat = model.start_chat(history=[])
+
         except Exception as e:
             print(f"  ✗ Executor error: {str(e)}")
             import traceback
@@ -822,7 +1296,8 @@ Remember: ONLY output valid JSON. Start with {{ and end with }}.
 
 def run_two_llm_workflow(
     user_input: Dict,
-    max_retries: int = None
+    max_retries: int = None,
+    user_id: str = DEFAULT_USER_ID
 ) -> Optional[Dict]:
     """
     Main workflow orchestrating both agents with input normalization.
@@ -830,6 +1305,7 @@ def run_two_llm_workflow(
     Args:
         user_input: Raw user input (either new user or adjustment report)
         max_retries: Number of retry attempts (defaults to Config.MAX_RETRIES)
+        user_id: User the plan is generated for
 
     Returns:
         Complete workout plan dictionary or None if failed
@@ -849,7 +1325,7 @@ def run_two_llm_workflow(
     adjustment_report = normalize_input_to_report(user_input)
 
     # Phase 1: Orchestrator
-    orchestrator_output = run_orchestrator_phase(adjustment_report, max_retries)
+    orchestrator_output = run_orchestrator_phase(adjustment_report, max_retries, user_id)
 
     if not orchestrator_output:
         print("\n" + "=" * 80)
@@ -913,6 +1389,46 @@ def create_sample_adjustment_report() -> Dict:
     }
 
 
+def warm_orchestrator_memo(
+    goals: List[str] = ("fat_loss", "muscle_gain", "maintenance"),
+    experiences: List[str] = ("beginner", "intermediate", "advanced"),
+    weights_kg: List[float] = tuple(range(50, 130, Config.WEIGHT_BUCKET_KG)),
+    max_retries: int = None
+) -> int:
+    """
+    Precompute orchestrator instructions for new-user onboarding.
+
+    Args:
+        goals: Goals to warm
+        experiences: Experience levels to warm
+        weights_kg: Representative weights, one per bucket
+        max_retries: Number of retry attempts per combination
+
+    Returns:
+        Number of memo entries created
+    """
+    if max_retries is None:
+        max_retries = Config.MAX_RETRIES
+
+    warmed = 0
+    for goal in goals:
+        for experience in experiences:
+            for weight in weights_kg:
+                report = normalize_input_to_report({
+                    "weight": weight,
+                    "experience": experience,
+                    "goal": goal
+                })
+                memo_key = orchestrator_memo_key(report)
+                if not memo_key or orchestrator_memo.get(memo_key):
+                    continue
+                if run_orchestrator_phase(report, max_retries):
+                    warmed += 1
+
+    print(f"\n  ✓ Warmed {warmed} orchestrator memo entries")
+    return warmed
+
+
 def create_sample_new_user() -> Dict:
     """Create a sample new user registration (minimal format)"""
     user_weight = input("Enter your weight in Kg's: ")
@@ -925,10 +1441,11 @@ def create_sample_new_user() -> Dict:
     }
 def generate_workout_plan(
     user_input: Dict,
-    workout_adjustments: Optional[Dict] = None
+    workout_adjustments: Optional[Dict] = None,
+    user_id: str = DEFAULT_USER_ID
 ) -> Dict:
     """
-    Entry point for Stage 1 workflow.
+    Entry point for Stage 1 workflow for one user.
 
     Priority:
     1. If workout_adjustments exists → use it
@@ -940,7 +1457,7 @@ def generate_workout_plan(
     else:
         workflow_input = user_input
 
-    plan = run_two_llm_workflow(workflow_input)
+    plan = run_two_llm_workflow(workflow_input, user_id=user_id)
 
     if not plan:
         raise RuntimeError("Workout plan generation failed")
@@ -953,6 +1470,153 @@ def generate_workout_plan(
 
 
 
+# Per-user progress output of the batch worker running in this context
+_captured_output: contextvars.ContextVar[Optional[io.StringIO]] = contextvars.ContextVar(
+    "captured_output", default=None
+)
+
+
+class _ContextStdout:
+    """sys.stdout stand-in that sends writes to the current context's capture, if any"""
+
+    def __init__(self, stream: TextIO):
+        self.stream = stream
+
+    def write(self, text: str) -> int:
+        buffer = _captured_output.get()
+        return (buffer if buffer is not None else self.stream).write(text)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.stream, name)
+
+
+_stdout_capture_lock = threading.Lock()
+_stdout_capture_users = 0
+
+
+@contextmanager
+def _capture_context_stdout() -> Iterator[None]:
+    # Installed once for any number of overlapping batches; other threads'
+    # output passes straight through
+    global _stdout_capture_users
+    with _stdout_capture_lock:
+        if _stdout_capture_users == 0:
+            sys.stdout = _ContextStdout(sys.stdout)
+        _stdout_capture_users += 1
+    try:
+        yield
+    finally:
+        with _stdout_capture_lock:
+            _stdout_capture_users -= 1
+            if _stdout_capture_users == 0 and isinstance(sys.stdout, _ContextStdout):
+                sys.stdout = sys.stdout.stream
+
+
+def _run_batch_user(workflow_input: Dict, user_id: str, verbose: bool) -> Dict:
+    buffer = io.StringIO()
+    _captured_output.set(buffer)
+    try:
+        return generate_workout_plan(workflow_input, user_id=user_id)
+    finally:
+        _captured_output.set(None)
+        if verbose:
+            # One block per user, so concurrent users don't interleave
+            with _stdout_capture_lock:
+                sys.stdout.write(f"\n===== user {user_id} =====\n{buffer.getvalue()}")
+
+
+def generate_workout_plans_batch(
+    user_inputs: Iterable[Dict],
+    output: TextIO,
+    errors: TextIO,
+    max_workers: int = None,
+    rate_limits: Optional[Dict[str, float]] = None,
+    verbose: bool = False
+) -> Dict[str, Any]:
+    """
+    Generate workout plans for many users with bounded concurrency.
+
+    Plans are written to `output` as JSONL as soon as they finish, and
+    per-user failures (including malformed inputs) to `errors`. Inputs are
+    pulled from the iterable lazily, so arbitrarily large batches use
+    bounded memory. Per-user progress output is captured instead of
+    interleaving on stdout.
+
+    Args:
+        user_inputs: Iterable of user inputs (new user or adjustment report),
+            each with a "user_id" that selects whose history is read and is
+            echoed back in the output
+        output: Text stream for successful plans
+        errors: Text stream for failures
+        max_workers: Concurrent users in flight (defaults to Config.BATCH_MAX_WORKERS)
+        rate_limits: Calls per second per upstream for this batch only,
+            e.g. {"gemini": 5, "tavily": 10}; earlier limits are restored after
+        verbose: Print each user's captured progress as one block when it finishes
+
+    Returns:
+        Summary with succeeded/failed counts, elapsed seconds and plans per second
+    """
+    if max_workers is None:
+        max_workers = Config.BATCH_MAX_WORKERS
+
+    succeeded = 0
+    failed = 0
+    started = time.monotonic()
+
+    def write_result(future, user_id) -> None:
+        nonlocal succeeded, failed
+        try:
+            plan = future.result()
+        except Exception as e:
+            failed += 1
+            errors.write(json.dumps({"user_id": user_id, "error": str(e)}) + "\n")
+            return
+        succeeded += 1
+        output.write(json.dumps({"user_id": user_id, "plan": plan}) + "\n")
+
+    with scoped_rate_limits(rate_limits), _capture_context_stdout(), \
+            ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="batch") as executor:
+        in_flight = {}
+
+        for index, user_input in enumerate(user_inputs):
+            try:
+                if not isinstance(user_input, dict):
+                    raise ValueError(f"User input must be an object, got {type(user_input).__name__}")
+                # Without an id, unrelated users would share one plan history
+                if user_input.get("user_id") in (None, ""):
+                    raise ValueError("User input has no user_id")
+                user_id = user_input["user_id"]
+                workflow_input = {k: v for k, v in user_input.items() if k != "user_id"}
+            except Exception as e:
+                failed += 1
+                errors.write(json.dumps({"user_id": index, "error": str(e)}) + "\n")
+                continue
+
+            in_flight[executor.submit(
+                contextvars.copy_context().run,
+                _run_batch_user, workflow_input, str(user_id), verbose
+            )] = user_id
+
+            # Keep at most 2x max_workers submitted so the input stays lazy
+            if len(in_flight) >= max_workers * 2:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    write_result(future, in_flight.pop(future))
+
+        for future in as_completed(list(in_flight)):
+            write_result(future, in_flight.pop(future))
+
+    elapsed = time.monotonic() - started
+    summary = {
+        "succeeded": succeeded,
+        "failed": failed,
+        "elapsed_seconds": round(elapsed, 2),
+        "plans_per_second": round(succeeded / elapsed, 3) if elapsed > 0 else 0.0
+    }
+    print(f"\n  ✓ Batch complete: {summary}")
+    return summary
+
+
 # def main():
 
     